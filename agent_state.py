@@ -0,0 +1,121 @@
+"""
+Estado compartilhado pelos grafos de tarefas (fire_collab, news_collab, news_collab_llm, mathcollab).
+
+TaskLoopState reúne os canais do laço planner -> especialista -> collect_and_advance;
+cada grafo só acrescenta a sua entrada e os seus campos. A tarefa da vez fica em um
+único canal (current_task) em vez de três campos soltos, e as tarefas do plano são
+TaskSpec: dataclass congelada com __slots__ e strings curtas internadas.
+
+Nós registrados com instrument(nome, fn, Estado) passam por checked(): escrever em
+um canal que não existe no estado (ex.: "specialist_ result") levanta
+UnknownChannelError em vez de ser ignorado pelo LangGraph.
+
+lazy_workflow(...) gera o __getattr__ de módulo que compila o grafo no primeiro
+acesso, uma única vez mesmo com várias threads.
+
+Serialização: os checkpointers do LangGraph (JsonPlusSerializer, msgpack) gravam
+TaskSpec como dataclass e a reconstroem na leitura, sem hook próprio (ver
+tests/test_agent_state.py). __reduce__ cobre pickle/copy, to_dict/from_dict os
+formatos em dicionário e json_default serve de default= para json.dumps de estados.
+"""
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Mapping, TypedDict, get_type_hints
+
+
+@dataclass(frozen=True, slots=True)
+class TaskSpec:
+    """Uma sub-tarefa do plano."""
+
+    task_id: str
+    specialist_type: str
+    description: str
+    priority: str = "medium"
+
+    def __post_init__(self):
+        # Ids, tipos e prioridades se repetem em todos os resultados e execuções: uma cópia só
+        object.__setattr__(self, "task_id", sys.intern(str(self.task_id)))
+        object.__setattr__(self, "specialist_type", sys.intern(str(self.specialist_type)))
+        object.__setattr__(self, "priority", sys.intern(str(self.priority)))
+
+    @classmethod
+    def from_dict(cls, data: "TaskSpec | Mapping[str, Any]") -> "TaskSpec":
+        if isinstance(data, TaskSpec):
+            return data
+        return cls(
+            task_id=data["task_id"],
+            specialist_type=data["specialist_type"],
+            description=data["description"],
+            priority=data.get("priority") or "medium",
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "task_id": self.task_id,
+            "specialist_type": self.specialist_type,
+            "description": self.description,
+            "priority": self.priority,
+        }
+
+    def __reduce__(self):
+        return (TaskSpec, (self.task_id, self.specialist_type, self.description, self.priority))
+
+
+class TaskLoopState(TypedDict):
+    plan: List[TaskSpec] | None
+    current_task_idx: int
+    current_task: TaskSpec | None
+    intermediate_results: Dict[str, str]
+    specialist_result: str | None
+    final_response: str | None
+    error: str | None
+
+
+class UnknownChannelError(KeyError):
+    """Um nó devolveu uma chave que não é canal do estado do grafo."""
+
+
+def json_default(value: Any) -> Any:
+    """default= para json.dumps de estados: TaskSpec vira dict, o resto vira texto."""
+    if isinstance(value, TaskSpec):
+        return value.to_dict()
+    return str(value)
+
+
+def make_plan(tasks: List[Mapping[str, Any]]) -> List[TaskSpec]:
+    return [TaskSpec.from_dict(task) for task in tasks]
+
+
+def checked(node_name: str, fn: Callable, state_schema: type) -> Callable:
+    """Envolve um nó: falha se a atualização devolvida tiver chaves fora de state_schema."""
+    channels = frozenset(get_type_hints(state_schema))
+
+    def node(state):
+        update = fn(state)
+        if isinstance(update, dict) and not channels.issuperset(update):
+            unknown = ", ".join(sorted(repr(key) for key in set(update) - channels))
+            raise UnknownChannelError(f"O nó {node_name} escreveu em canais inexistentes no estado: {unknown}")
+        return update
+
+    node.__name__ = getattr(fn, "__name__", node_name)
+    node.__doc__ = fn.__doc__
+    return node
+
+
+def lazy_workflow(module_name: str, attribute: str, build: Callable[[], Any]) -> Callable[[str], Any]:
+    """__getattr__ de módulo que compila o grafo (build) no primeiro acesso a attribute."""
+    module = sys.modules[module_name]
+    lock = threading.Lock()
+
+    def __getattr__(name):
+        # Compilação adiada: importar o módulo não monta o grafo
+        if name == attribute:
+            with lock:
+                # Outra thread pode ter compilado enquanto esta esperava o lock
+                if attribute not in module.__dict__:
+                    setattr(module, attribute, build())
+            return module.__dict__[attribute]
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+    return __getattr__
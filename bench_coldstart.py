@@ -0,0 +1,106 @@
+"""
+Benchmark de cold start dos módulos de grafo.
+
+Cada medição roda em um processo Python novo e registra:
+    import_s      importar o módulo
+    compile_s     primeiro acesso ao grafo (compilação)
+    first_node_s  até o primeiro nó terminar (LLMs e Firecrawl com dublês sem latência)
+    sdk_load_s    criar os clientes reais dos provedores usados pelo módulo (import dos SDKs)
+
+Exemplo:
+    python bench_coldstart.py --repeat 5 --output coldstart.json
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# módulo -> (atributo do grafo, estado inicial, chaves de models usadas)
+MODULES: Dict[str, tuple] = {
+    "mathcollab": ("simple_workflow", {"original_query": "2 + 2 * 3"}, []),
+    "mathcollab2": ("simple_workflow", {"original_query": "2 + 2 * 3"}, ["gpt_4o"]),
+    "news_collab": ("news_workflow", {"original_news": "Texto de notícia para o benchmark."}, []),
+    "news_collab_llm": ("news_workflow", {"original_news": "Texto de notícia para o benchmark."}, ["gpt_4o"]),
+    "fire_collab": ("collaborative_workflow", {"original_query": "Relatório sobre a empresa Google"}, ["gpt_4o"]),
+}
+
+
+def measure(module_name: str) -> Dict[str, Any]:
+    """Mede um cold start do módulo no processo atual (que deve ser novo)."""
+    attr, graph_input, model_keys = MODULES[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+    graph = getattr(module, attr)
+    compiled = time.perf_counter()
+
+    import loadtest
+    loadtest.install_standins(lambda: 0.0, lambda: 0.0)
+    first_node_start = time.perf_counter()
+    for _ in graph.stream(graph_input, stream_mode="updates"):
+        break
+    first_node = time.perf_counter()
+
+    import models
+    sdk_start = time.perf_counter()
+    for key in model_keys:
+        limited = models.models[key]
+        models._create_chat_model(limited.model_name, limited.provider, limited.temperature)
+    sdk_loaded = time.perf_counter()
+
+    return {
+        "import_s": imported - start,
+        "compile_s": compiled - imported,
+        "first_node_s": first_node - first_node_start,
+        "sdk_load_s": sdk_loaded - sdk_start,
+    }
+
+
+def run_child(module_name: str) -> Dict[str, Any]:
+    env = dict(os.environ)
+    # Os clientes reais exigem alguma chave para serem construídos (nenhuma chamada é feita)
+    for var in ("OPENAI_API_KEY", "GOOGLE_API_KEY"):
+        env.setdefault(var, "benchmark")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", module_name],
+        capture_output=True, text=True, check=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: List[str] | None = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark de cold start dos módulos de grafo")
+    parser.add_argument("modules", nargs="*", default=list(MODULES), help="módulos a medir (padrão: todos)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="arquivo do relatório JSON (padrão: stdout)")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.child)))
+        return {}
+
+    report: Dict[str, Any] = {}
+    for module_name in args.modules:
+        samples = [run_child(module_name) for _ in range(args.repeat)]
+        report[module_name] = {
+            metric: round(statistics.median(sample[metric] for sample in samples), 4)
+            for metric in samples[0]
+        }
+    output = json.dumps({"repeat": args.repeat, "median_s": report}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
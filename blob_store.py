@@ -0,0 +1,130 @@
+"""
+Armazenamento local endereçado por conteúdo para textos grandes do estado.
+
+Textos acima de BLOB_THRESHOLD caracteres são gravados uma única vez em
+BLOB_DIR/<2 primeiros hex>/<sha256> e o estado passa a carregar apenas uma
+referência curta ("blob:sha256:<hex>"). Conteúdos iguais geram a mesma
+referência (dedup). Os nós resolvem a referência só quando precisam do texto,
+lendo o arquivo via mmap.
+
+A idade de um blob para prune() é o mtime, renovado a cada put() repetido e a
+cada resolve() (o atime não serve: leituras do cache em memória não tocam o
+arquivo e muitos sistemas montam com noatime/relatime). Uma referência cujo blob
+já foi removido por prune() resolve para uma mensagem de erro, não para exceção.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+from functools import lru_cache
+from typing import Any, Dict
+
+BLOB_DIR = os.getenv("BLOB_DIR", ".blobs")
+BLOB_THRESHOLD = int(os.getenv("BLOB_THRESHOLD", "2048"))
+REF_PREFIX = "blob:sha256:"
+
+
+def _path(digest: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], digest)
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def put(text: str) -> str:
+    """Grava o texto (se ainda não existir) e devolve a referência."""
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest)
+    if not _touch(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escrita atômica: outro processo pode estar gravando o mesmo blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Disco cheio ou interrupção: não deixa o temporário órfão (prune não o removeria logo)
+            _discard(tmp_path)
+            raise
+    return REF_PREFIX + digest
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _touch(path: str) -> bool:
+    """Renova o mtime do blob (ainda em uso); False se ele não existe."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def offload(value: Any, threshold: int | None = None) -> Any:
+    """Troca textos grandes por referências; outros valores passam inalterados."""
+    limit = BLOB_THRESHOLD if threshold is None else threshold
+    if isinstance(value, str) and len(value) > limit and not is_ref(value):
+        return put(value)
+    return value
+
+
+@lru_cache(maxsize=64)
+def _read(digest: str) -> str:
+    with open(_path(digest), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+            return segment[:].decode("utf-8")
+
+
+def exists(ref: str) -> bool:
+    """Indica se o blob de uma referência ainda está no disco (prune pode tê-lo removido)."""
+    return is_ref(ref) and os.path.exists(_path(ref[len(REF_PREFIX):]))
+
+
+def resolve(value: Any) -> Any:
+    """Devolve o texto de uma referência; outros valores passam inalterados."""
+    if is_ref(value):
+        digest = value[len(REF_PREFIX):]
+        _touch(_path(digest))
+        try:
+            return _read(digest)
+        except FileNotFoundError:
+            # prune() removeu o blob entre a gravação da referência e a leitura
+            logging.warning(f"Blob {digest} não está mais em {BLOB_DIR} (removido por prune?).")
+            return f"Erro: conteúdo intermediário indisponível (blob {digest[:12]} removido)."
+    return value
+
+
+def resolve_results(results: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Resolve as referências de um dicionário de resultados intermediários."""
+    return {key: resolve(value) for key, value in (results or {}).items()}
+
+
+def prune(older_than_seconds: float) -> int:
+    """Remove blobs não gravados nem lidos há mais de older_than_seconds; devolve quantos saíram."""
+    removed = 0
+    cutoff = time.time() - older_than_seconds
+    if not os.path.isdir(BLOB_DIR):
+        return 0
+    for root, _, files in os.walk(BLOB_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+    _read.cache_clear()
+    return removed
@@ -0,0 +1,132 @@
+"""
+Orçamento por execução do fire_collab: prazo (wall-clock), tokens e chamadas ao Firecrawl.
+
+O planner atribui uma prioridade ("high", "medium", "low") a cada tarefa. Antes de
+cada tarefa o executor compara o custo estimado das tarefas pendentes com o que
+resta do orçamento (descontada a reserva da síntese) e decide:
+
+    run      executa normalmente (pesquisador: buscas das variantes da consulta + raspagem)
+    reduced  executa com orçamento menor de Firecrawl (pesquisador: uma busca, sem raspagem)
+    skip     não executa; a tarefa entra em skipped_tasks
+
+A síntese sempre roda, com o que foi coletado. O orçamento pode vir no estado
+inicial (chave "budget") ou das variáveis BUDGET_DEADLINE_S, BUDGET_MAX_TOKENS e
+BUDGET_MAX_FIRECRAWL_CALLS; 0 desativa o limite correspondente.
+"""
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from agent_state import TaskSpec
+import deadline
+from query_expansion import MAX_QUERY_VARIANTS
+
+# Sem variável de ambiente nem "budget" no estado, nenhum limite é aplicado (0 = desativado)
+DEFAULT_BUDGET = {
+    "deadline_s": float(os.getenv("BUDGET_DEADLINE_S", "0")),
+    "max_tokens": int(os.getenv("BUDGET_MAX_TOKENS", "0")),
+    "max_firecrawl_calls": int(os.getenv("BUDGET_MAX_FIRECRAWL_CALLS", "0")),
+}
+
+# Reservado para a síntese, que sempre roda
+SYNTHESIS_RESERVE = {"seconds": 20.0, "tokens": 6000}
+
+# Chamadas ao Firecrawl permitidas ao pesquisador: uma busca por variante da consulta + raspagem, ou só uma busca
+FULL_SCRAPE_BUDGET = MAX_QUERY_VARIANTS + 1
+REDUCED_SCRAPE_BUDGET = 1
+
+# Custo estimado de uma tarefa por tipo de especialista, antes de haver medições
+DEFAULT_TASK_COST = {
+    "researcher": {"seconds": 20.0, "tokens": 5000, "firecrawl_calls": FULL_SCRAPE_BUDGET},
+    "writer": {"seconds": 15.0, "tokens": 4000, "firecrawl_calls": 0},
+}
+
+PRIORITIES = ("high", "medium", "low")
+DEFAULT_PRIORITY = "medium"
+
+
+def resolve_budget(state: Dict[str, Any]) -> Dict[str, float]:
+    """Orçamento da execução: valores do estado sobre os padrões do ambiente."""
+    return {**DEFAULT_BUDGET, **(state.get("budget") or {})}
+
+
+def empty_usage() -> Dict[str, float]:
+    return {"tokens": 0, "firecrawl_calls": 0, "seconds": 0.0, "tasks": 0}
+
+
+def add_usage(used: Dict[str, float] | None, usage: Dict[str, float] | None) -> Dict[str, float]:
+    """Soma o consumo de uma tarefa ao acumulado da execução."""
+    total = {**empty_usage(), **(used or {})}
+    for key, value in (usage or {}).items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def priority_of(task: TaskSpec) -> str:
+    priority = str(task.priority or DEFAULT_PRIORITY).lower()
+    return priority if priority in PRIORITIES else DEFAULT_PRIORITY
+
+
+def remaining(state: Dict[str, Any]) -> Dict[str, float]:
+    """Quanto resta do orçamento, já descontada a reserva da síntese (inf = sem limite)."""
+    budget = resolve_budget(state)
+    used = {**empty_usage(), **(state.get("budget_used") or {})}
+    started = state.get("run_started_at") or time.time()
+    left = {"seconds": float("inf"), "tokens": float("inf"), "firecrawl_calls": float("inf")}
+    if budget["deadline_s"]:
+        left["seconds"] = budget["deadline_s"] - (time.time() - started) - SYNTHESIS_RESERVE["seconds"]
+    if budget["max_tokens"]:
+        left["tokens"] = budget["max_tokens"] - used["tokens"] - SYNTHESIS_RESERVE["tokens"]
+    if budget["max_firecrawl_calls"]:
+        left["firecrawl_calls"] = budget["max_firecrawl_calls"] - used["firecrawl_calls"]
+    # O prazo da execução (deadline.py), quando houver, também limita o tempo
+    hard_remaining = deadline.remaining()
+    if hard_remaining is not None:
+        left["seconds"] = min(left["seconds"], hard_remaining - SYNTHESIS_RESERVE["seconds"])
+    return left
+
+
+def estimate_task_cost(task: TaskSpec, used: Dict[str, float] | None = None, scrape_budget: int | None = None) -> Dict[str, float]:
+    """Custo estimado de uma tarefa; o tempo usa a média medida nas tarefas já executadas."""
+    cost = dict(DEFAULT_TASK_COST.get(task.specialist_type, DEFAULT_TASK_COST["writer"]))
+    if used and used.get("tasks"):
+        cost["seconds"] = used["seconds"] / used["tasks"]
+    if scrape_budget is not None and cost["firecrawl_calls"]:
+        # Sem raspagem o contexto enviado ao LLM é bem menor
+        ratio = scrape_budget / cost["firecrawl_calls"]
+        cost["firecrawl_calls"] = scrape_budget
+        cost["tokens"] = cost["tokens"] * max(ratio, 0.5)
+    return cost
+
+
+def _fits(cost: Dict[str, float], left: Dict[str, float]) -> bool:
+    return all(cost[key] <= left[key] for key in left)
+
+
+def decide_task(state: Dict[str, Any], pending: List[TaskSpec]) -> Tuple[str, int]:
+    """
+    Decide a próxima tarefa (pending[0]) dado o restante do plano.
+    Devolve ("run" | "reduced" | "skip", chamadas ao Firecrawl permitidas).
+    """
+    task = pending[0]
+    used = state.get("budget_used")
+    left = remaining(state)
+    if left["seconds"] <= 0 or left["tokens"] <= 0:
+        return "skip", 0
+
+    full_calls = 0
+    if task.specialist_type == "researcher":
+        full_calls = int(min(FULL_SCRAPE_BUDGET, max(left["firecrawl_calls"], 0)))
+    reduced_calls = min(full_calls, REDUCED_SCRAPE_BUDGET)
+    full = estimate_task_cost(task, used, full_calls)
+    reduced = estimate_task_cost(task, used, reduced_calls)
+    pending_cost = {key: sum(estimate_task_cost(t, used)[key] for t in pending) for key in left}
+
+    priority = priority_of(task)
+    if _fits(pending_cost, left) or (priority == "high" and _fits(full, left)):
+        return "run", int(full["firecrawl_calls"])
+    if priority == "low":
+        return "skip", 0
+    if _fits(reduced, left):
+        return "reduced", int(reduced["firecrawl_calls"])
+    return "skip", 0
@@ -0,0 +1,220 @@
+"""
+Gravação e reprodução (cassetes) do tráfego com os LLMs e o Firecrawl.
+
+Em modo "record" cada chamada de models[...] e cada busca/raspagem do Firecrawl
+é gravada com a latência observada em um arquivo JSON Lines comprimido (gzip).
+Em modo "replay" as mesmas chamadas são respondidas a partir do cassete, de forma
+determinística, com a latência original ou instantaneamente. Chamadas que não
+estão no cassete levantam CassetteMiss. Cancelamentos e prazos estourados
+(RunCancelled, DeadlineExceeded) não são gravados.
+
+O cassete fica dentro do single-flight (LLM e Firecrawl): chamadores coalescidos
+recebem a resposta da chamada real, gravada uma vez só.
+
+Variáveis de ambiente:
+    GRAPH_CASSETTE           caminho do cassete (ex.: traces/relatorio.jsonl.gz)
+    GRAPH_CASSETTE_MODE      record | replay
+    GRAPH_CASSETTE_LATENCY   original | instant (apenas no replay, padrão original)
+
+Em código:
+
+    with cassette.use("trace.jsonl.gz", mode="replay", latency="instant"):
+        collaborative_workflow.invoke(state)
+
+Resumo de um cassete: python cassette.py trace.jsonl.gz
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List
+
+import deadline
+
+CASSETTE_ENV = "GRAPH_CASSETTE"
+CASSETTE_MODE_ENV = "GRAPH_CASSETTE_MODE"
+CASSETTE_LATENCY_ENV = "GRAPH_CASSETTE_LATENCY"
+MODES = ("record", "replay")
+LATENCIES = ("original", "instant")
+
+
+class CassetteMiss(LookupError):
+    """A chamada não foi encontrada no cassete em modo replay."""
+
+
+class ReplayedError(Exception):
+    """Erro gravado no cassete, levantado novamente no replay."""
+
+
+class Cassette:
+    """Um arquivo de cassete aberto para gravação ou reprodução."""
+
+    def __init__(self, path: str, mode: str = "replay", latency: str = "original"):
+        if mode not in MODES:
+            raise ValueError(f"Modo de cassete inválido: {mode}. Use um de {MODES}")
+        if latency not in LATENCIES:
+            raise ValueError(f"Latência de replay inválida: {latency}. Use uma de {LATENCIES}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # chave -> trocas gravadas, servidas em ordem (a última se repete)
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        if mode == "replay":
+            for entry in read_entries(path):
+                self._exchanges[entry["key"]].append(entry)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            # Cada linha vira um membro gzip: o cassete continua legível se o processo cair
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def _next(self, kind: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._exchanges.get(key)
+            if not entries:
+                raise CassetteMiss(f"Chamada {kind} ({key[:12]}) não está no cassete {self.path}")
+            idx = min(self._served[key], len(entries) - 1)
+            self._served[key] += 1
+            return entries[idx]
+
+    def _entry(self, kind: str, key: str, request: Any, started: float, latency: float) -> Dict[str, Any]:
+        return {
+            "kind": kind,
+            "key": key,
+            "request": request,
+            "offset_s": round(started - self.started_at, 4),
+            "latency_s": round(latency, 4),
+        }
+
+    def _replayed(self, entry: Dict[str, Any], decode: Callable[[Any], Any] | None) -> Any:
+        if entry.get("error") is not None:
+            raise ReplayedError(entry["error"])
+        response = entry["response"]
+        return decode(response) if decode else response
+
+    def exchange(self, kind: str, key: str, fn: Callable[[], Any], request: Any = None,
+                 encode: Callable[[Any], Any] | None = None, decode: Callable[[Any], Any] | None = None) -> Any:
+        """Executa e grava (record) ou reproduz (replay) uma troca identificada por key."""
+        if self.mode == "replay":
+            entry = self._next(kind, key)
+            if self.latency == "original":
+                deadline.sleep(entry["latency_s"])
+            return self._replayed(entry, decode)
+
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            response = fn()
+        except (deadline.RunCancelled, deadline.DeadlineExceeded):
+            # Desistência da execução, não resposta do provedor: no replay viraria um erro falso
+            raise
+        except Exception as e:
+            entry = self._entry(kind, key, request, started, time.perf_counter() - start)
+            self._append({**entry, "error": f"{type(e).__name__}: {e}"})
+            raise
+        entry = self._entry(kind, key, request, started, time.perf_counter() - start)
+        self._append({**entry, "response": encode(response) if encode else response})
+        return response
+
+    async def aexchange(self, kind: str, key: str, fn: Callable[[], Awaitable[Any]], request: Any = None,
+                        encode: Callable[[Any], Any] | None = None, decode: Callable[[Any], Any] | None = None) -> Any:
+        """Versão asyncio de exchange; fn deve retornar um awaitable."""
+        if self.mode == "replay":
+            entry = self._next(kind, key)
+            if self.latency == "original":
+                await asyncio.sleep(entry["latency_s"])
+            return self._replayed(entry, decode)
+
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            response = await fn()
+        except (deadline.RunCancelled, deadline.DeadlineExceeded):
+            # Desistência da execução, não resposta do provedor: no replay viraria um erro falso
+            raise
+        except Exception as e:
+            entry = self._entry(kind, key, request, started, time.perf_counter() - start)
+            self._append({**entry, "error": f"{type(e).__name__}: {e}"})
+            raise
+        entry = self._entry(kind, key, request, started, time.perf_counter() - start)
+        self._append({**entry, "response": encode(response) if encode else response})
+        return response
+
+
+def read_entries(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_active: ContextVar[Cassette | None] = ContextVar("cassette", default=None)
+_env_cassette: Cassette | None = None
+_env_lock = threading.Lock()
+
+
+def active() -> Cassette | None:
+    """Cassete em uso: o de use() ou, na falta dele, o configurado pelo ambiente."""
+    cassette = _active.get()
+    if cassette is not None:
+        return cassette
+    path = os.getenv(CASSETTE_ENV)
+    if not path:
+        return None
+    global _env_cassette
+    with _env_lock:
+        if _env_cassette is None or _env_cassette.path != path:
+            _env_cassette = Cassette(
+                path,
+                mode=os.getenv(CASSETTE_MODE_ENV, "replay"),
+                latency=os.getenv(CASSETTE_LATENCY_ENV, "original"),
+            )
+        return _env_cassette
+
+
+@contextmanager
+def use(path: str, mode: str = "replay", latency: str = "original"):
+    """Grava ou reproduz as chamadas feitas dentro do bloco."""
+    token = _active.set(Cassette(path, mode=mode, latency=latency))
+    try:
+        yield _active.get()
+    finally:
+        _active.reset(token)
+
+
+def exchange(kind: str, key: str, fn: Callable[[], Any], **kwargs) -> Any:
+    """Passa a chamada pelo cassete ativo; sem cassete, apenas executa fn."""
+    cassette = active()
+    return fn() if cassette is None else cassette.exchange(kind, key, fn, **kwargs)
+
+
+async def aexchange(kind: str, key: str, fn: Callable[[], Awaitable[Any]], **kwargs) -> Any:
+    cassette = active()
+    return await fn() if cassette is None else await cassette.aexchange(kind, key, fn, **kwargs)
+
+
+def summary(path: str) -> Dict[str, Dict[str, Any]]:
+    """Quantidade de trocas, erros e latência total/máxima por tipo."""
+    report: Dict[str, Dict[str, Any]] = {}
+    for entry in read_entries(path):
+        item = report.setdefault(entry["kind"], {"calls": 0, "errors": 0, "total_latency_s": 0.0, "max_latency_s": 0.0})
+        item["calls"] += 1
+        item["errors"] += entry.get("error") is not None
+        item["total_latency_s"] = round(item["total_latency_s"] + entry["latency_s"], 4)
+        item["max_latency_s"] = max(item["max_latency_s"], entry["latency_s"])
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(summary(sys.argv[1]), indent=2))
@@ -0,0 +1,207 @@
+"""
+Prazo e cancelamento de uma execução, propagados até as chamadas ao LLM e ao Firecrawl.
+
+O escopo da execução fica em um contextvar, que o LangGraph copia para as threads
+dos nós; dentro dele:
+
+    - cada chamada bloqueante recebe um timeout derivado do tempo restante (call_timeout)
+    - esperas (rate limiter, backoff, single-flight) são interrompidas por cancel()
+    - call() roda a chamada em uma thread auxiliar e devolve o controle ao nó assim que
+      a execução é cancelada ou o prazo vence; a requisição abandonada termina pelo
+      próprio timeout. acall() faz o mesmo com corrotinas, cancelando a task
+    - RunCancelled deve ser propagado pelos nós, nunca virar um resultado "Erro..."
+
+Uso:
+
+    with run_scope(deadline_s=120) as scope:
+        workflow.invoke(state)        # scope.cancel() (de outra thread) interrompe
+
+Sem escopo ativo, os nós também respeitam config={"configurable": {"deadline": <epoch>}}.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable
+
+from langchain_core.runnables.config import ensure_config
+
+# Margem para a resposta chegar e ser processada antes do prazo
+TIMEOUT_MARGIN_SECONDS = 0.5
+_POLL_SECONDS = 0.1
+MAX_CALL_THREADS = 64
+
+
+class DeadlineExceeded(TimeoutError):
+    """O prazo da execução venceu."""
+
+
+class RunCancelled(Exception):
+    """A execução foi cancelada pelo cliente."""
+
+
+class RunScope:
+    """Prazo absoluto (epoch) e sinal de cancelamento de uma execução."""
+
+    def __init__(self, deadline: float | None = None, parent: "RunScope | None" = None):
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+        self.parent = parent
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise RunCancelled("Execução cancelada")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Prazo da execução esgotado")
+
+    def wait(self, event: threading.Event | None = None, seconds: float | None = None) -> bool:
+        """Espera o evento (ou os segundos) verificando prazo e cancelamento; devolve se o evento ocorreu."""
+        end = None if seconds is None else time.monotonic() + seconds
+        while True:
+            self.check()
+            step = _POLL_SECONDS
+            if end is not None:
+                step = min(step, end - time.monotonic())
+                if step <= 0:
+                    return False
+            remaining = self.remaining()
+            if remaining is not None:
+                step = min(step, max(remaining, 0))
+            if event is None:
+                self._cancelled.wait(step)
+            elif event.wait(step):
+                return True
+
+
+_scope: ContextVar[RunScope | None] = ContextVar("run_scope", default=None)
+_executor = ThreadPoolExecutor(max_workers=MAX_CALL_THREADS, thread_name_prefix="deadline-call")
+
+
+def current_scope() -> RunScope | None:
+    return _scope.get()
+
+
+@contextmanager
+def run_scope(deadline_s: float | None = None, deadline: float | None = None):
+    """Abre um escopo com prazo relativo (deadline_s) ou absoluto (deadline, epoch)."""
+    if deadline_s is not None:
+        deadline = time.time() + deadline_s if deadline is None else min(deadline, time.time() + deadline_s)
+    scope = RunScope(deadline, parent=_scope.get())
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def remaining() -> float | None:
+    """Segundos até o prazo da execução atual (None = sem prazo)."""
+    scope = _scope.get()
+    return scope.remaining() if scope is not None else None
+
+
+def check() -> None:
+    """Levanta RunCancelled / DeadlineExceeded se a execução atual não deve continuar."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+
+
+def call_timeout(default: float | None = None) -> float | None:
+    """Timeout para a próxima chamada: o menor entre default e o tempo restante."""
+    check()
+    left = remaining()
+    if left is None:
+        return default
+    left = max(left - TIMEOUT_MARGIN_SECONDS, _POLL_SECONDS)
+    return left if default is None else min(default, left)
+
+
+def sleep(seconds: float) -> None:
+    """time.sleep interrompível pelo cancelamento ou pelo prazo."""
+    scope = _scope.get()
+    if scope is None:
+        time.sleep(seconds)
+    else:
+        scope.wait(seconds=seconds)
+
+
+def wait_event(event: threading.Event) -> None:
+    """event.wait() interrompível pelo cancelamento ou pelo prazo."""
+    scope = _scope.get()
+    if scope is None:
+        event.wait()
+    else:
+        scope.wait(event)
+
+
+def call(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Executa uma chamada bloqueante respeitando o escopo atual. Com escopo ativo, a
+    chamada roda em uma thread auxiliar e o chamador é liberado assim que a execução
+    é cancelada ou o prazo vence.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return fn(*args, **kwargs)
+    scope.check()
+    context = copy_context()
+    future = _executor.submit(context.run, fn, *args, **kwargs)
+    while True:
+        try:
+            return future.result(timeout=_POLL_SECONDS)
+        except FutureTimeout:
+            try:
+                scope.check()
+            except BaseException:
+                future.cancel()
+                raise
+
+
+async def acall(fn: Callable, *args, **kwargs) -> Any:
+    """Versão asyncio de call: fn devolve um awaitable, que é cancelado se a execução for cancelada ou o prazo vencer."""
+    scope = _scope.get()
+    if scope is None:
+        return await fn(*args, **kwargs)
+    scope.check()
+    task = asyncio.ensure_future(fn(*args, **kwargs))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=_POLL_SECONDS)
+            if done:
+                return task.result()
+            scope.check()
+    except BaseException:
+        task.cancel()
+        raise
+
+
+def bounded(node_name: str, fn: Callable) -> Callable:
+    """Envolve um nó: aplica o prazo de config["configurable"]["deadline"] e recusa execuções canceladas."""
+
+    def node(state):
+        deadline = ensure_config().get("configurable", {}).get("deadline")
+        if deadline is None and _scope.get() is None:
+            return fn(state)
+        with run_scope(deadline=deadline):
+            check()
+            return fn(state)
+
+    node.__name__ = getattr(fn, "__name__", node_name)
+    node.__doc__ = fn.__doc__
+    return node
@@ -1,42 +1,105 @@
 import os
-import json
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain.agents import Tool
-
+import time
+from typing import List, Dict, Any
+from langchain_core.tools import Tool
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from agent_state import TaskLoopState, lazy_workflow, make_plan
+from blob_store import offload, resolve_results
+from budget import FULL_SCRAPE_BUDGET, add_usage, decide_task, priority_of
+import cassette
+from deadline import RunCancelled, call_timeout
 from models import models
-from langchain_community.document_loaders.firecrawl import FireCrawlLoader
-from firecrawl import FirecrawlApp
+from plan_estimator import admission_error, estimate_plan, record_task
+from plan_schema import PLAN_JSON_SCHEMA, parse_plan
+from prompts import SYSTEM_PROMPT, build_messages
+from query_expansion import expand_queries, expansion_mode, fuse_results
+from sectioned_writer import use_sectioned, write_sectioned
+from rate_limiter import call_with_limits
+from single_flight import flight, make_key
+from instrumentation import instrument
+from usage import total_tokens, track_usage
+import task_cache
 
 import logging
 
-class CollaborativeAgentState(TypedDict) :
+SEARCH_RESULTS_PER_QUERY = 5
+SEARCH_SNIPPET_CHARS = 200
+# Resultados da busca combinada mostrados ao LLM além da página raspada
+SEARCH_CONTEXT_RESULTS = 5
+NO_WEB_CONTENT = "Nenhum conteúdo web pôde ser obtido."
+
+# Modelo (chave de models) usado por cada especialista; também orienta as estimativas (ver plan_estimator.py)
+SPECIALIST_MODELS = {"planner": "gpt_4o", "researcher": "gpt_4o", "writer": "gpt_4o", "synthesis": "gpt_4o"}
+
+# SDK do Firecrawl e loader do langchain_community são pesados: carregados na primeira busca/raspagem
+FirecrawlApp = None
+FireCrawlLoader = None
+
+def _firecrawl_app_class():
+    global FirecrawlApp
+    if FirecrawlApp is None:
+        from firecrawl import FirecrawlApp as app_class
+        FirecrawlApp = app_class
+    return FirecrawlApp
+
+def _firecrawl_loader_class():
+    global FireCrawlLoader
+    if FireCrawlLoader is None:
+        from langchain_community.document_loaders.firecrawl import FireCrawlLoader as loader_class
+        FireCrawlLoader = loader_class
+    return FireCrawlLoader
+
+class CollaborativeAgentState(TaskLoopState) :
     original_query: str
-    plan: List[Dict[str, str]] | None
-    intermediate_results: Dict[str, str]
-    current_task_idx: int
-    final_response: str | None
-    error: str | None
 
-    current_task_description: str | None
-    current_specialist_type: str | None
-    current_task_id: str | None
-    specialist_result: str | None
+    # Orçamento da execução (ver budget.py)
+    budget: Dict[str, float] | None
+    budget_used: Dict[str, float] | None
+    run_started_at: float | None
+    skipped_tasks: List[str] | None
+    current_scrape_budget: int | None
+    specialist_usage: Dict[str, float] | None
+    # False quando o resultado não deve ir para o cache de tarefas (pesquisa sem conteúdo web)
+    specialist_cacheable: bool | None
+
+    # Tarefas reaproveitadas do task_cache nesta execução
+    task_cache_hits: List[str] | None
+
+    # Estimativa de tempo, tokens e custo feita logo após o planejamento
+    plan_estimate: Dict[str, Any] | None
 
 # Firecrawl tools
+def _search_item(res) -> Dict[str, str]:
+    # O SDK devolve documentos pydantic; dublês e cassetes antigos, dicionários
+    get = res.get if isinstance(res, dict) else lambda key: getattr(res, key, None)
+    metadata = get("metadata") or {}
+    description = get("description") or (metadata.get("description") if isinstance(metadata, dict) else None)
+    return {
+        "title": get("title") or "",
+        "url": get("url") or "",
+        "description": description or (get("markdown") or "")[:SEARCH_SNIPPET_CHARS],
+    }
+
 def create_firecrawl_search_tool():
-    def search_func (query: str) -> str:
-        app = FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY"))
-        result = app.search (
+    def search_func(query: str) -> List[Dict[str, str]]:
+        # Como nos LLMs (models.py): cassete dentro do single-flight, uma troca gravada por chamada real
+        key = make_key("firecrawl", "search", query)
+        return flight.do(key, lambda: cassette.exchange("firecrawl.search", key, lambda: _search(query), request={"query": query}))
+
+    def _search(query: str) -> List[Dict[str, str]]:
+        app = _firecrawl_app_class()(api_key=os.getenv("FIRECRAWL_API_KEY"))
+        # Timeout (ms) derivado do prazo restante da execução
+        timeout = call_timeout()
+        timeout_kwargs = {} if timeout is None else {"timeout": int(timeout * 1000)}
+        # Só metadados (título, URL, descrição): a raspagem é feita depois, na URL escolhida
+        result = call_with_limits(
+            "firecrawl", "search", app.search,
             query=query,
-            Limit=10,
-            scrape_options={"formats": ["markdown"]}
+            limit=SEARCH_RESULTS_PER_QUERY,
+            **timeout_kwargs
         )
-        return "\n\n".join([
-            f"**{res['title']}**\n{res['url']}\n{res['markdown'][:200]}..."
-            for res in result.data
-        ])
+        return [_search_item(res) for res in result.data]
 
     return Tool(
         name="Web Search",
@@ -46,14 +109,22 @@ def create_firecrawl_search_tool():
 
 def create_firecrawl_scrape_tool():
     def scrape_func(url: str) -> str:
-        loader = FireCrawlLoader(
-            api_key=os.getenv("'FIRECRAWL_API_KEY"),
+        key = make_key("firecrawl", "scrape", url)
+        return flight.do(key, lambda: cassette.exchange("firecrawl.scrape", key, lambda: _scrape(url), request={"url": url}))
+
+    def _scrape(url: str) -> str:
+        params = {"formats": ["markdown"]}
+        timeout = call_timeout()
+        if timeout is not None:
+            params["timeout"] = int(timeout * 1000)
+        loader = _firecrawl_loader_class()(
+            api_key=os.getenv("FIRECRAWL_API_KEY"),
             url=url,
             mode="scrape",
-            params={"formats": ["markdown"]}
+            params=params
         )
-        docs = loader.load()
-        return docs[0].page_content if docs else "Nenhum conteúdo web pôde ser obtido."
+        docs = call_with_limits("firecrawl", "scrape", loader.load)
+        return docs[0].page_content if docs else NO_WEB_CONTENT
 
     return Tool(
         name="scrape_website",
@@ -67,183 +138,265 @@ def planner_node(state: CollaborativeAgentState) -> Dict[str, Any]:
     atribuindo um tipo de especialista para cada uma.
     """
     query = state["original_query"]
+    started_at = time.time()
 
-    system_message_planner = SystemMessage(
-        content=f"""
-        Você é um planejador especialista em um sistema multi-agente.
-        Sua função é decompor uma consulta complexa do usuário em uma sequência de sub-tarefas executáveis.
-        Para cada sub-tarefa, você deve especificar:
-            1. task_id: Um identificador único para a tarefa (e.g., "task_1", "task_2").
-            2. "specialist_type*: O tipo de especialista necessário. Tipos válidos são: "researcher", "writer".
-            3. "description: Uma descrição clara e concisa da sub-tarefa para o especialista.
-        A ordem das tarefas no plano é importante.
-        Por exemplo, uma tarefa de 'writer' que depende de pesquisa deve vir depois da tarefa de 'researcher"
-        Responda APENAS com um objeto JSON contendo uma lista chamada "plan" com as sub-tarefas.
-        
-        Exemplo de Consulta: "Escreva um breve resumo sobre os avanços recentes em carros autônomos. "
-        Exemplo de Resposta JSON:
-        {{
-            "plan": [
-                {{
-                    "task_id": "research_autonomous_cars",
-                    "specialist_type": "researcher",
-                    "description": "Pesquise os avanços mais recentes e significativos na tecnologia de carros autônomos
-                }},
-                {{
-                    "task_id": "write_summary_autonomous_cars",
-                    "specialist_type": "writer",
-                    "description": "Com base na pesquisa sobre carros autônomos (especialmente os resultados de 'research_autonomous_cars')
-                }},
-            ]        
-        }} 
-        """
+    messages = build_messages(
+        "planner",
+        original_query=query,
+        task="Crie o plano de sub-tarefas para a consulta original."
     )
-    human_message = HumanMessage(content=query)
 
     try:
-        response = models["gpt_4o"].invoke([system_message_planner, human_message])
-        plan_json = json.loads(response.content)
-        plan = plan_json.get("plan", [])
+        planner_model = models[SPECIALIST_MODELS["planner"]]
+        with track_usage() as call_usage:
+            # Saída estruturada quando o provedor suporta; o reparo local cobre o resto sem replanejar
+            response = planner_model.invoke(messages, **planner_model.structured_output_kwargs("plan", PLAN_JSON_SCHEMA))
+        plan = make_plan(parse_plan(response.content))
+        estimate = estimate_plan(plan, SPECIALIST_MODELS)
+        rejection = admission_error(estimate)
+        if rejection:
+            logging.warning(f"Plano recusado pela estimativa: {rejection}")
+            return {"error": f"Erro: execução recusada, {rejection}", "plan": plan, "plan_estimate": estimate, "specialist_result": None}
         return {
             "plan": plan,
             "current_task_idx": 0,
             "intermediate_results": {},
             "error": None,
-            "specialist_result": None
+            "specialist_result": None,
+            "run_started_at": state.get("run_started_at") or started_at,
+            "budget_used": add_usage(None, {"tokens": total_tokens(call_usage)}),
+            "skipped_tasks": [],
+            "task_cache_hits": [],
+            "plan_estimate": estimate,
         }
+    except RunCancelled:
+        raise
     except Exception as e:
         return {"error": f"Erro ao gerar plano: {str(e)}", "plan": [], "specialist_result": None}
 
 def prepare_next_task_node(state: CollaborativeAgentState) -> Dict[str, Any]:
     """
     Prepara os detalhes da tarefa atual para serem passados ao roteador de especialistas.
+    Tarefas que não cabem no orçamento restante são puladas ou rodam com menos raspagem.
     """
     plan = state.get("plan", [])
     current_task_idx = state.get("current_task_idx", 0)
+    skipped_tasks = list(state.get("skipped_tasks") or [])
+
+    while plan and current_task_idx < len(plan):
+        current_task = plan[current_task_idx]
+        decision, scrape_budget = decide_task(state, plan[current_task_idx:])
+        if decision != "skip":
+            if decision == "reduced":
+                logging.warning(f"Orçamento apertado: tarefa {current_task.task_id} roda com {scrape_budget} chamada(s) ao Firecrawl.")
+            return {
+                "current_task_idx": current_task_idx,
+                "current_task": current_task,
+                "current_scrape_budget": scrape_budget,
+                "skipped_tasks": skipped_tasks,
+            }
+        logging.warning(f"Orçamento insuficiente: pulando a tarefa {current_task.task_id} (prioridade {priority_of(current_task)}).")
+        skipped_tasks.append(current_task.task_id)
+        current_task_idx += 1
 
-    if not plan or current_task_idx >= len(plan):
-        return {"current_task_id": None, "current_task_description": None, "current_specialist_type": None}
-
-    current_task = plan[current_task_idx]
     return {
-        "current_task_id": current_task["task_id"],
-        "current_task_description": current_task["description"],
-        "current_specialist_type": current_task["specialist_type"],
+        "current_task_idx": current_task_idx,
+        "current_task": None,
+        "skipped_tasks": skipped_tasks,
     }
 
-def researcher_node(state: CollaborativeAgentState) -> Dict[str, str]:
+def measured_specialist(specialist):
+    """Mede tokens e tempo de um nó especialista e os devolve em specialist_usage."""
+
+    def node(state: CollaborativeAgentState) -> Dict[str, Any]:
+        started_at = time.perf_counter()
+        with track_usage() as call_usage:
+            result = specialist(state)
+        seconds = time.perf_counter() - started_at
+        usage = add_usage(result.get("specialist_usage"), {
+            "tokens": total_tokens(call_usage),
+            "seconds": seconds,
+            "tasks": 1,
+        })
+        current_task = state["current_task"]
+        specialist_type = current_task.specialist_type
+        output = result.get("specialist_result")
+        # Erros não entram no histórico das estimativas
+        if not (isinstance(output, str) and output.startswith("Erro")):
+            record_task(
+                specialist_type, SPECIALIST_MODELS.get(specialist_type, "gpt_4o"), seconds, call_usage,
+                firecrawl_calls=usage["firecrawl_calls"],
+                cache_hit=current_task.task_id in (result.get("task_cache_hits") or []),
+            )
+        return {**result, "specialist_usage": usage}
+
+    node.__name__ = specialist.__name__
+    node.__doc__ = specialist.__doc__
+    return node
+
+# Especialistas cujo resultado depende dos resultados intermediários anteriores
+_CONSUMES_RESULTS = {"writer"}
+
+def memoized_specialist(specialist):
+    """Reaproveita o resultado de uma tarefa idêntica já executada (ver task_cache.py)."""
+
+    def node(state: CollaborativeAgentState) -> Dict[str, Any]:
+        if not task_cache.cache_enabled():
+            return specialist(state)
+        current_task = state["current_task"]
+        specialist_type = current_task.specialist_type
+        consumed = state.get("intermediate_results") if specialist_type in _CONSUMES_RESULTS else None
+        key = task_cache.task_key(
+            specialist_type,
+            current_task.description,
+            consumed,
+            # A consulta original entra nos prompts (e nas buscas): a mesma tarefa genérica muda de resposta
+            task_cache.normalize_description(state.get("original_query")),
+            SPECIALIST_MODELS.get(specialist_type),
+            # Pesquisa com menos raspagem não substitui uma completa; prompts novos invalidam o cache
+            state.get("current_scrape_budget") if specialist_type == "researcher" else None,
+            expansion_mode() if specialist_type == "researcher" else None,
+            SYSTEM_PROMPT,
+        )
+        cached = task_cache.get(key)
+        if cached is not None:
+            logging.info(f"Tarefa {current_task.task_id} reaproveitada do cache de tarefas.")
+            hits = list(state.get("task_cache_hits") or []) + [current_task.task_id]
+            return {"specialist_result": cached, "task_cache_hits": hits}
+
+        result = specialist(state)
+        output = result.get("specialist_result")
+        # Erros e pesquisas sem conteúdo web (respondidas só com conhecimento geral) não são memoizados
+        if isinstance(output, str) and not output.startswith("Erro") and result.get("specialist_cacheable") is not False:
+            task_cache.put(key, output, task_id=current_task.task_id, specialist_type=specialist_type)
+        return result
+
+    node.__name__ = specialist.__name__
+    node.__doc__ = specialist.__doc__
+    return node
+
+@measured_specialist
+@memoized_specialist
+def researcher_node(state: CollaborativeAgentState) -> Dict[str, Any]:
     """Executa uma sub-tarefa de pesquisa."""
-    task_description = state.get("current_task_description")
+    task_description = state["current_task"].description
     original_query_for_llm = state.get("original_query")  # Pode ser útil para dar mais contexto ao LLM final
+    # Chamadas ao Firecrawl liberadas pelo orçamento: N-1 buscas + raspagem, 1 = uma busca, 0 = nenhuma
+    scrape_budget = state.get("current_scrape_budget")
+    if scrape_budget is None:
+        scrape_budget = FULL_SCRAPE_BUDGET
+    firecrawl_calls = 0
 
     if not task_description:
         return {"specialist_result": "Erro: Descrição da tarefa não encontrada ou vazia."}
 
-    search_tool = create_firecrawl_search_tool()
-    scraped_content_for_llm = "Nenhum conteúdo web pôde ser obtido."
+    scraped_content_for_llm = NO_WEB_CONTENT
+    fused_results = []
 
     try:
-        search_results = search_tool.run(task_description)
+        if scrape_budget < 1:
+            raise RuntimeError("orçamento de chamadas ao Firecrawl esgotado")
+        # Uma chamada fica para a raspagem; com orçamento reduzido, só a primeira consulta
+        queries = expand_queries(task_description, original_query_for_llm)[:max(1, scrape_budget - 1)]
+        search_tool = create_firecrawl_search_tool()
 
-        search_results_list = []
-        if isinstance(search_results, str):
+        def search(query: str) -> List[Dict[str, str]]:
             try:
-                loaded_json = json.loads(search_results)
-                if isinstance(loaded_json, list):
-                    search_results_list = loaded_json
-                elif isinstance(loaded_json, dict) and "data" in loaded_json and isinstance(loaded_json["data"], list):
-                    search_results_list = loaded_json["data"]
-                elif isinstance(loaded_json, dict) and loaded_json.get('success') is True and "data" in loaded_json and isinstance(loaded_json["data"], list):
-                    search_results_list = loaded_json["data"]
-            except json.JSONDecodeError:
-                search_results_list = []
-        elif isinstance(search_results, list):
-            search_results_list = search_results
-        elif isinstance(search_results, dict):
-            if "data" in search_results and isinstance(search_results["data"], list):
-                search_results_list = search_results["data"]
-            elif search_results.get('success') is True and "data" in search_results and isinstance(search_results["data"], list):
-                search_results_list = search_results["data"]
-            else:
-                search_results_list = []
+                return search_tool.run(query)
+            except RunCancelled:
+                raise
+            except Exception as e:
+                logging.warning(f"Busca Firecrawl falhou para '{query}': {e}")
+                return []
+
+        firecrawl_calls += len(queries)
+        # ContextThreadPoolExecutor mantém o contexto do nó (prazo, cassete, contabilidade)
+        with ContextThreadPoolExecutor(max_workers=len(queries)) as executor:
+            fused_results = fuse_results(list(executor.map(search, queries)))
+
+        if not fused_results:
+            logging.error("Nenhuma URL utilizável encontrada nas buscas Firecrawl.")
+        elif scrape_budget <= len(queries):
+            logging.warning("Orçamento reduzido: raspagem da URL omitida.")
         else:
-            search_results_list = []
-
-        if not search_results_list:
-            logging.error("Nenhuma URL utilizável encontrada após processar resultados da busca Firecrawl.")
-        else:
-            first_url = None
-            for item in search_results_list:
-                if isinstance(item, dict) and item.get("url"):
-                    first_url = item.get("ur]")
-                    break
-
-            if first_url:
-                scrape_tool = create_firecrawl_scrape_tool()
-                scraped_data = scrape_tool.run(first_url)
-
-                if isinstance(scraped_data, dict) and "markdown" in scraped_data:
-                    scraped_content_for_llm = scraped_data["markdown"]
-                elif isinstance(scraped_data, str):
-                    scraped_content_for_llm = scraped_data
-                else:
-                    logging.error(f"Não foi possível extrair o conteúdo markdown da URL. Retorno: {scraped_data}")
+            scrape_tool = create_firecrawl_scrape_tool()
+            firecrawl_calls += 1
+            scraped_data = scrape_tool.run(fused_results[0]["url"])
+
+            if isinstance(scraped_data, dict) and "markdown" in scraped_data:
+                scraped_content_for_llm = scraped_data["markdown"]
+            elif isinstance(scraped_data, str):
+                scraped_content_for_llm = scraped_data
             else:
-                logging.error("Nenhuma URL válida encontrada dentro dos resultados da busca processados.")
+                logging.error(f"Não foi possível extrair o conteúdo markdown da URL. Retorno: {scraped_data}")
 
+    except RunCancelled:
+        raise
     except Exception as e:
         scraped_content_for_llm = f"Erro ao tentar obter conteúdo da web: {str(e)}. Usarei meu conhecimento geral."
 
-    system_message_researcher = SystemMessage(
-        content="""
-        Você é um agente de pesquisa especialista.
-        Sua tarefa é responder à pergunta/descrição fornecida.
-        Se um conteúdo da web foi fornecido, baseie sua resposta PRIMARIAMENTE nesse conteúdo.
-        Se não, use seu conhecimento geral.
-        Forneça uma resposta concisa e informativa com os principais achados.
-        """
+    has_web_content = bool(scraped_content_for_llm) and scraped_content_for_llm != NO_WEB_CONTENT \
+        and "Erro ao tentar obter conteúdo da web" not in scraped_content_for_llm
+    context_sections = []
+    if has_web_content:
+        context_sections.append(f"## Contexto Obtido da Web (use isso como fonte principal)\n{scraped_content_for_llm}")
+    if fused_results:
+        context_sections.append("## Outros resultados da busca\n" + "\n".join(
+            f"- **{item['title']}** ({item['url']}): {item['description']}"
+            for item in fused_results[:SEARCH_CONTEXT_RESULTS]
+        ))
+    web_context = "\n\n".join(context_sections) or (
+        "## Contexto Obtido da Web\nNão foi possível obter conteúdo da web para esta tarefa ou ocorreu um erro. Por favor, responda usando seu conhecimento geral."
     )
 
-    llm_prompt_content = f"Descrição da Tarefa de Pesquisa {task_description}\n\n"
-    if scraped_content_for_llm and "Erro ao tentar obter conteúdo da web" not in scraped_content_for_llm and "Nenhum conteúdo web pode ser obtido" not in scraped_content_for_llm:
-        llm_prompt_content += f"Contexto Obtido da Web (use isso como fonte principal): \n{scraped_content_for_llm}\n\n"
-    else:
-        llm_prompt_content += "Não foi possível obter conteúdo da web para esta tarefa ou ocorreu um erro. Por favor, responda usando seu conhecimento geral.\n\n"
-    llm_prompt_content += "Com base no contexto acima (se disponível) e na descrição da tarefa, forneça sua pesquisa:"
-
-    human_message = HumanMessage(content=llm_prompt_content)
+    messages = build_messages(
+        "researcher",
+        original_query=original_query_for_llm,
+        task=f"Descrição da Tarefa de Pesquisa: {task_description}\n\nCom base no contexto acima (se disponível) e na descrição da tarefa, forneça sua pesquisa:",
+        call_context=web_context
+    )
 
+    usage = {"firecrawl_calls": firecrawl_calls}
     try:
-        response = models["gpt_4o"].invoke([system_message_researcher, human_message])
-        return {"specialist_result": response.content}
+        response = models[SPECIALIST_MODELS["researcher"]].invoke(messages)
+        # Resultados longos vão para o blob_store; o estado guarda só a referência
+        return {"specialist_result": offload(response.content), "specialist_usage": usage, "specialist_cacheable": has_web_content}
+    except RunCancelled:
+        raise
     except Exception as e:
         logging.error(f"Erro no LLM do pesquisador: {e}")
-        return {"specialist_result": f"Erro no LLM da pesquisa: {str(e)}"}
-
-def writer_node(state: CollaborativeAgentState) -> Dict[str, str]:
+        return {"specialist_result": f"Erro no LLM da pesquisa: {str(e)}", "specialist_usage": usage}
+
+def _write_text(role: str, original_query: str, task: str, results: Dict[str, str]) -> str:
+    """Escreve em seções paralelas quando o modo permitir (ver sectioned_writer.py), senão em uma chamada."""
+    model = models[SPECIALIST_MODELS[role]]
+    if use_sectioned(results):
+        try:
+            return write_sectioned(model, original_query, task, results)
+        except RunCancelled:
+            raise
+        except Exception as e:
+            logging.warning(f"Escrita seccionada falhou ({e}); usando uma única chamada.")
+    messages = build_messages(role, original_query=original_query, task=task, intermediate_results=results)
+    return model.invoke(messages).content
+
+@measured_specialist
+@memoized_specialist
+def writer_node(state: CollaborativeAgentState) -> Dict[str, Any]:
     """Executa uma sub-tarefa de escrita, utilizando resultados anteriores se disponíveis."""
-    task_description = state.get("current_task_description")
+    task_description = state["current_task"].description
     intermediate_results = state.get("intermediate_results", {})
 
     if not task_description:
         logging.error("Erro: Descrição da tarefa não encontrada ou vazia para o escritor.")
         return {"specialist_result": "Erro: Descrição da tarefa de escrita não encontrada ou vazia. "}
 
-    context = "Contexto de tarefas anteriores:\n"
-    if not intermediate_results:
-        context += "Nenhum resultado de tarefas anteriores disponível. \n"
-    for task_id, result in intermediate_results.items():
-        context += f"'- Resultado da tarefa '{task_id}': {result}\n\n"
-
-    system_message_writer = SystemMessage(
-        content="Você é um agente escritor especialista. Sua tarefa é redigir um texto claro, coeso e bem estruturado com base na descrição da tarefa e no contexto fornecido (resultados de tarefas anteriores, se houver). Siga as instruções da descrição da tarefa"
-    )
-    prompt_content = f"{context}Descrição da Tarefa Atual: \n{task_description}"
-    human_message = HumanMessage(content=prompt_content)
-
     try:
-        response = models["gpt_4o"].invoke([system_message_writer, human_message])
-        return {"specialist_result": response.content}
+        text = _write_text("writer", state.get("original_query", ""), task_description, resolve_results(intermediate_results))
+        # Resultados longos vão para o blob_store; o estado guarda só a referência
+        return {"specialist_result": offload(text)}
+    except RunCancelled:
+        raise
     except Exception as e:
         logging.error(f"Erro no escritor: {e}")
         return {"specialist_result": f"Erro na escrita: {str(e)}"}
@@ -259,18 +412,21 @@ def collect_result_and_advance_node(state: CollaborativeAgentState) -> Dict[str,
     Para este exemplo, vamos assumir que o `specialist_result` é colocado no estado pelo nó especialista
     e este nó apenas o processa.
     """
-    current_task_id = state.get("current_task_id")
+    current_task = state.get("current_task")
     specialist_output = state.get("specialist_result", "Nenhum resultado do especialista encontrado no estado.")
     updated_intermediate_results = state.get("intermediate_results", {}).copy()
-    if current_task_id:
-        updated_intermediate_results[current_task_id] = specialist_output
+    if current_task is not None:
+        updated_intermediate_results[current_task.task_id] = specialist_output
 
     new_idx = state.get("current_task_idx", 0) + 1
 
     return {
         "intermediate_results": updated_intermediate_results,
         "current_task_idx": new_idx,
-        "specialist_ result": None  # Limpa para a próxima iteração
+        "budget_used": add_usage(state.get("budget_used"), state.get("specialist_usage")),
+        "specialist_usage": None,
+        "specialist_cacheable": None,
+        "specialist_result": None  # Limpa para a próxima iteração
     }
 
 def synthesis_node(state: CollaborativeAgentState) -> Dict[str, str | None]:
@@ -278,20 +434,19 @@ def synthesis_node(state: CollaborativeAgentState) -> Dict[str, str | None]:
 
     original_query = state["original_query"]
     intermediate_results = state.get("intermediate_results", {})
+    task = "Sintetize os resultados das sub-tarefas executadas em uma resposta final para a consulta original."
+    skipped_tasks = state.get("skipped_tasks") or []
+    if skipped_tasks:
+        task += f"\nAs tarefas {', '.join(skipped_tasks)} não foram executadas por falta de orçamento; indique as lacunas na resposta."
 
-    context = "Consulta Original do Usuário:\n" + original_query + "\n\nResultados das Sub-tarefas Executadas: \n"
-    if not intermediate_results:
-        context += "Nenhum resultado de sub-tarefas disponível. \n"
-    for task_id, result in intermediate_results.items():
-        context += f"- Resultado da tarefa '{task_id}': {result}\n\n"
-
-    system_message_synthesis = SystemMessage(
-        content="Você é um assistente de IA especialista em sintetizar informações. Sua tarefa é pegar a consulta original do usuario"
-    )
-    human_message = HumanMessage(content=context)
     try:
-        response = models["gpt_4o"].invoke([system_message_synthesis, human_message])
-        return {"final_response": response.content, "error": None}
+        started_at = time.perf_counter()
+        with track_usage() as call_usage:
+            final_response = _write_text("synthesis", original_query, task, resolve_results(intermediate_results))
+        record_task("synthesis", SPECIALIST_MODELS["synthesis"], time.perf_counter() - started_at, call_usage)
+        return {"final_response": final_response, "error": None}
+    except RunCancelled:
+        raise
     except Exception as e:
         logging.error(f"Erro na síntese: {e}")
         return {"final_response": None, "error": f"Erro ao sintetizar resposta: {str(e)}"}
@@ -311,7 +466,11 @@ def should_execute_task_or_synthesize(state: CollaborativeAgentState) -> str:
 
 def specialist_router_node(state: CollaborativeAgentState) -> str:
     """Roteia para o nó especialista correto com base no tipo de tarefa atual."""
-    specialist_type = state.get("current_specialist_type")
+    current_task = state.get("current_task")
+    if current_task is None:
+        # Todas as tarefas restantes foram puladas pelo orçamento
+        return "synthesize_response"
+    specialist_type = current_task.specialist_type
     if specialist_type == "researcher":
         return "researcher"
     elif specialist_type == "writer":
@@ -326,51 +485,58 @@ def error_node(state: CollaborativeAgentState) -> Dict[str, str| None]:
     logging.error(f"Erro no workflow: {error_message}")
     return {"final_response": f"Ocorreu um erro: (error_message)"}
 
-workflow_builder = StateGraph(CollaborativeAgentState)
-workflow_builder.add_node("planner", planner_node)
-workflow_builder.add_node("prepare_next_task", prepare_next_task_node)
-workflow_builder.add_node("researcher", researcher_node)
-workflow_builder.add_node("writer", writer_node)
-workflow_builder.add_node("collect_and_advance" , collect_result_and_advance_node)
-workflow_builder.add_node("synthesize_response", synthesis_node)
-workflow_builder.add_node("error_handler", error_node)
-
-workflow_builder.set_entry_point ("planner")
-
-workflow_builder.add_conditional_edges(
-    "planner",
-    should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
-
-workflow_builder.add_conditional_edges(
-    "prepare_next_task",
-    specialist_router_node,
-    {
-        "researcher": "researcher",
-        "writer": "writer",
-        "error_handler" : "error_handler"
-    }
-)
-
-workflow_builder.add_edge("researcher", "collect_and_advance")
-workflow_builder.add_edge("writer", "collect_and_advance")
-
-workflow_builder.add_conditional_edges(
-    "collect_and_advance",
-    should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
+def build_workflow():
+    """Monta e compila o grafo; chamado uma única vez, no primeiro acesso a collaborative_workflow."""
+    from langgraph.graph import StateGraph, END
+
+    workflow_builder = StateGraph(CollaborativeAgentState)
+    workflow_builder.add_node("planner", instrument("planner", planner_node, CollaborativeAgentState))
+    workflow_builder.add_node("prepare_next_task", instrument("prepare_next_task", prepare_next_task_node, CollaborativeAgentState))
+    workflow_builder.add_node("researcher", instrument("researcher", researcher_node, CollaborativeAgentState))
+    workflow_builder.add_node("writer", instrument("writer", writer_node, CollaborativeAgentState))
+    workflow_builder.add_node("collect_and_advance", instrument("collect_and_advance", collect_result_and_advance_node, CollaborativeAgentState))
+    workflow_builder.add_node("synthesize_response", instrument("synthesize_response", synthesis_node, CollaborativeAgentState))
+    workflow_builder.add_node("error_handler", instrument("error_handler", error_node, CollaborativeAgentState))
+
+    workflow_builder.set_entry_point ("planner")
+
+    workflow_builder.add_conditional_edges(
+        "planner",
+        should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_conditional_edges(
+        "prepare_next_task",
+        specialist_router_node,
+        {
+            "researcher": "researcher",
+            "writer": "writer",
+            "synthesize_response": "synthesize_response",
+            "error_handler" : "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("researcher", "collect_and_advance")
+    workflow_builder.add_edge("writer", "collect_and_advance")
+
+    workflow_builder.add_conditional_edges(
+        "collect_and_advance",
+        should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("synthesize_response", END)
+    workflow_builder.add_edge("error_handler", END)
 
-workflow_builder.add_edge("synthesize_response", END)
-workflow_builder.add_edge("error_handler", END)
+    return workflow_builder.compile()
 
-collaborative_workflow = workflow_builder.compile()
+__getattr__ = lazy_workflow(__name__, "collaborative_workflow", build_workflow)
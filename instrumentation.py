@@ -0,0 +1,17 @@
+"""Ganchos aplicados a todos os nós dos grafos: observabilidade, prazo da execução e canais do estado."""
+from typing import Callable
+
+from agent_state import checked
+from deadline import bounded
+from memory import tracked
+from profiling import profiled
+
+
+def instrument(node_name: str, fn: Callable, state_schema: type | None = None) -> Callable:
+    """
+    Envolve um nó com os ganchos de observabilidade (profiling de CPU e memória) e o prazo da execução.
+    Com state_schema, atualizações com chaves fora do estado levantam UnknownChannelError.
+    """
+    if state_schema is not None:
+        fn = checked(node_name, fn, state_schema)
+    return profiled(node_name, tracked(node_name, bounded(node_name, fn)))
@@ -0,0 +1,401 @@
+"""
+Fila de jobs local (SQLite) para rodar muitos relatórios em segundo plano.
+
+Os jobs ficam em um banco SQLite (JOBQUEUE_DB, padrão jobs.db) e são
+consumidos por N processos worker, cada um rodando o grafo assíncrono
+(ainvoke) com o seu próprio limite de concorrência. Não há broker externo:
+os processos coordenam-se pelo banco.
+
+    - prioridade: jobs com priority maior saem primeiro (empate: mais antigo primeiro)
+    - retries: falhas voltam para a fila com backoff exponencial até max_attempts
+    - visibility timeout: o worker renova o lease do job enquanto roda; se o processo
+      morrer, o lease expira e o job volta a ser entregue a outro worker
+
+Exemplos:
+    python jobqueue.py submit firecollab '{"original_query": "Relatório sobre a Google"}' --priority 5
+    python jobqueue.py submit firecollab --input-file empresas.jsonl
+    python jobqueue.py work --processes 8 --concurrency 4
+    python jobqueue.py status            # totais por status
+    python jobqueue.py status <job_id>
+    python jobqueue.py result <job_id>
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Dict, List
+
+from agent_state import json_default
+from deadline import run_scope
+from usage import track_usage
+
+LANGGRAPH_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "langgraph.json")
+
+DEFAULT_DB = os.getenv("JOBQUEUE_DB", "jobs.db")
+DEFAULT_MAX_ATTEMPTS = 3
+VISIBILITY_TIMEOUT_SECONDS = 120.0
+POLL_SECONDS = 1.0
+RETRY_BACKOFF_SECONDS = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    graph TEXT NOT NULL,
+    input TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    deadline_s REAL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT,
+    token_usage TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, available_at, created_at);
+"""
+
+
+class JobAbandoned(Exception):
+    """O job foi cancelado ou reatribuído enquanto este worker o executava."""
+
+
+def _load_graph(name: str):
+    with open(LANGGRAPH_CONFIG, encoding="utf-8") as f:
+        module_name, attr = json.load(f)["graphs"][name].split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class JobQueue:
+    """Operações sobre o banco da fila; cada chamada abre a sua conexão (seguro entre threads e processos)."""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, graph: str, graph_input: Dict[str, Any], priority: int = 0,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS, deadline_s: float | None = None) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, graph, input, priority, max_attempts, deadline_s, available_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, graph, json.dumps(graph_input, ensure_ascii=False), priority, max_attempts, deadline_s, now, now),
+            )
+        return job_id
+
+    def claim(self, worker: str, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS) -> Dict[str, Any] | None:
+        """Reserva o próximo job disponível (incluindo os de workers que morreram) para este worker."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Leases vencidos: o worker morreu; o job volta para a fila ou falha de vez
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,"
+                    " error = 'lease expirado (worker interrompido)', worker = NULL, lease_until = NULL,"
+                    " finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END"
+                    " WHERE status = 'running' AND lease_until < ?",
+                    (now, now),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ?"
+                    " ORDER BY priority DESC, available_at, created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ?,"
+                    " started_at = ? WHERE id = ?",
+                    (worker, now + visibility_timeout, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["attempts"] += 1
+        job["input"] = json.loads(job["input"])
+        return job
+
+    def heartbeat(self, job_id: str, worker: str, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS) -> bool:
+        """Renova o lease; False se o job não pertence mais a este worker (ex.: foi cancelado)."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + visibility_timeout, job_id, worker),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker: str, result: Any, token_usage: Dict[str, Any] | None = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'success', result = ?, token_usage = ?, error = NULL, finished_at = ?,"
+                " lease_until = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(result, ensure_ascii=False, default=json_default), json.dumps(token_usage or {}), time.time(), job_id, worker),
+            )
+
+    def fail(self, job_id: str, worker: str, error: str) -> str:
+        """Registra a falha; o job volta para a fila com backoff enquanto houver tentativas. Devolve o novo status."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return "lost"
+            if row["attempts"] < row["max_attempts"]:
+                status = "queued"
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, worker = NULL, lease_until = NULL, available_at = ?"
+                    " WHERE id = ?",
+                    (error, now + RETRY_BACKOFF_SECONDS * 2 ** (row["attempts"] - 1), job_id),
+                )
+            else:
+                status = "failed"
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, finished_at = ? WHERE id = ?",
+                    (error, now, job_id),
+                )
+            conn.execute("COMMIT")
+        return status
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela um job na fila ou em execução (o worker desiste no próximo heartbeat)."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, lease_until = NULL"
+                " WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("input", "result", "token_usage"):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class Worker:
+    """Um processo worker: `concurrency` jobs simultâneos, cada um com o grafo assíncrono."""
+
+    def __init__(self, queue: JobQueue, concurrency: int = 4, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS,
+                 poll_interval: float = POLL_SECONDS, max_jobs: int | None = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.max_jobs = max_jobs
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processed = 0
+        self._graphs: Dict[str, Any] = {}
+
+    def _graph(self, name: str):
+        if name not in self._graphs:
+            self._graphs[name] = _load_graph(name)
+        return self._graphs[name]
+
+    async def _heartbeat(self, job: Dict[str, Any], task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            alive = await asyncio.to_thread(self.queue.heartbeat, job["id"], self.worker_id, self.visibility_timeout)
+            if not alive:
+                logging.warning(f"Job {job['id']} cancelado ou reatribuído; interrompendo.")
+                job["abandoned"] = True
+                task.cancel()
+                return
+
+    async def _run_job(self, job: Dict[str, Any]) -> str:
+        """Executa o job e registra o desfecho; devolve o novo status."""
+        graph = self._graph(job["graph"])
+        config = {"configurable": {"run_id": job["id"]}}
+        with track_usage() as job_usage, run_scope(deadline_s=job["deadline_s"]) as scope:
+            run = asyncio.create_task(graph.ainvoke(job["input"], config=config))
+            heartbeat = asyncio.create_task(self._heartbeat(job, run))
+            try:
+                result = await run
+            except asyncio.CancelledError:
+                # Interrompe também as chamadas bloqueantes nas threads dos nós
+                scope.cancel()
+                if job.get("abandoned"):
+                    raise JobAbandoned(job["id"]) from None
+                raise
+            finally:
+                heartbeat.cancel()
+        # Planner que falhou, plano recusado ou error_handler: falha do job, sujeita a novas tentativas
+        if isinstance(result, dict) and result.get("error"):
+            return await asyncio.to_thread(self.queue.fail, job["id"], self.worker_id, str(result["error"]))
+        await asyncio.to_thread(self.queue.complete, job["id"], self.worker_id, result, job_usage)
+        return "success"
+
+    async def _slot(self) -> None:
+        while self.max_jobs is None or self.processed < self.max_jobs:
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id, self.visibility_timeout)
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.processed += 1
+            try:
+                status = await self._run_job(job)
+                if status == "success":
+                    logging.info(f"Job {job['id']} concluído (tentativa {job['attempts']}).")
+                else:
+                    logging.error(f"Job {job['id']} terminou com erro na tentativa {job['attempts']} -> {status}")
+            except JobAbandoned:
+                # O status já foi definido por quem cancelou/reatribuiu o job
+                continue
+            except Exception as e:
+                status = await asyncio.to_thread(self.queue.fail, job["id"], self.worker_id, f"{type(e).__name__}: {e}")
+                logging.error(f"Job {job['id']} falhou na tentativa {job['attempts']}: {e} -> {status}")
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+
+
+def _interrupt(signum, frame):
+    # SIGTERM encerra como Ctrl+C
+    raise KeyboardInterrupt
+
+
+def _worker_main(db: str, concurrency: int, visibility_timeout: float, poll_interval: float) -> None:
+    signal.signal(signal.SIGTERM, _interrupt)
+    logging.basicConfig(level=logging.INFO, format=f"[worker {os.getpid()}] %(levelname)s %(message)s")
+    worker = Worker(JobQueue(db), concurrency=concurrency, visibility_timeout=visibility_timeout, poll_interval=poll_interval)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        # Jobs interrompidos voltam para a fila quando o lease expirar
+        pass
+
+
+def run_workers(db: str, processes: int, concurrency: int, visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS,
+                poll_interval: float = POLL_SECONDS) -> None:
+    """Sobe N processos worker e espera por eles (Ctrl+C ou SIGTERM encerra todos)."""
+    signal.signal(signal.SIGTERM, _interrupt)
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_worker_main, args=(db, concurrency, visibility_timeout, poll_interval), daemon=False)
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+
+def _read_inputs(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    if args.input_file:
+        with open(args.input_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if args.input is None:
+        raise SystemExit("Informe o input em JSON ou --input-file")
+    return [json.loads(args.input)]
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Fila de jobs local (SQLite) para os grafos de langgraph.json")
+    parser.add_argument("--db", default=DEFAULT_DB, help="arquivo SQLite da fila (JOBQUEUE_DB)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="enfileira um ou mais jobs")
+    submit.add_argument("graph")
+    submit.add_argument("input", nargs="?", help="estado inicial em JSON")
+    submit.add_argument("--input-file", help="um estado inicial JSON por linha")
+    submit.add_argument("--priority", type=int, default=0)
+    submit.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    submit.add_argument("--deadline-s", type=float, default=None, help="prazo de cada tentativa")
+
+    status = commands.add_parser("status", help="status de um job ou totais por status")
+    status.add_argument("job_id", nargs="?")
+
+    result = commands.add_parser("result", help="resultado de um job concluído")
+    result.add_argument("job_id")
+
+    cancel = commands.add_parser("cancel", help="cancela um job")
+    cancel.add_argument("job_id")
+
+    work = commands.add_parser("work", help="roda os processos worker")
+    work.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    work.add_argument("--concurrency", type=int, default=4, help="jobs simultâneos por processo")
+    work.add_argument("--visibility-timeout", type=float, default=VISIBILITY_TIMEOUT_SECONDS)
+    work.add_argument("--poll-interval", type=float, default=POLL_SECONDS)
+
+    args = parser.parse_args(argv)
+    queue = JobQueue(args.db)
+
+    if args.command == "submit":
+        with open(LANGGRAPH_CONFIG, encoding="utf-8") as f:
+            if args.graph not in json.load(f)["graphs"]:
+                raise SystemExit(f"Grafo desconhecido: {args.graph}")
+        for graph_input in _read_inputs(args):
+            print(queue.submit(args.graph, graph_input, args.priority, args.max_attempts, args.deadline_s))
+    elif args.command == "status":
+        if args.job_id:
+            job = queue.get(args.job_id)
+            if job is None:
+                raise SystemExit("Job não encontrado")
+            print(json.dumps({k: v for k, v in job.items() if k != "result"}, indent=2, ensure_ascii=False))
+        else:
+            print(json.dumps(queue.counts(), indent=2))
+    elif args.command == "result":
+        job = queue.get(args.job_id)
+        if job is None:
+            raise SystemExit("Job não encontrado")
+        if job["status"] != "success":
+            raise SystemExit(f"Job em status {job['status']}: {job['error']}")
+        print(json.dumps(job["result"], indent=2, ensure_ascii=False))
+    elif args.command == "cancel":
+        print("cancelado" if queue.cancel(args.job_id) else "job não está na fila nem em execução")
+    elif args.command == "work":
+        run_workers(args.db, args.processes, args.concurrency, args.visibility_timeout, args.poll_interval)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
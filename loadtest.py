@@ -0,0 +1,334 @@
+"""
+Gerador de carga concorrente para os grafos de langgraph.json.
+
+Os LLMs e o Firecrawl são substituídos por dublês com latência sorteada de uma
+distribuição configurável, então o teste mede o overhead do próprio processo
+(threads, memória, framework) sem gastar quota.
+
+Exemplos:
+    python loadtest.py firecollab --mode open --rate 20 --duration 60 --output report.json
+    python loadtest.py newscollab --mode closed --concurrency 100 --runs 1000 --llm-latency lognormal:1.5,0.4
+
+Distribuições: fixed:S, uniform:A,B, exponential:MEDIA, lognormal:MEDIANA,SIGMA
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.documents import Document
+
+from memory import MEMORY_ENV, memory_report, rss_mb
+
+LANGGRAPH_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "langgraph.json")
+
+DEFAULT_INPUTS: Dict[str, Dict[str, Any]] = {
+    "mathcollab": {"original_query": "2 + 2 * 3"},
+    "newscollab": {"original_news": "O governo anunciou hoje um novo pacote de medidas econômicas. " * 20},
+    "firecollab": {"original_query": "Gere um relatório completo sobre a empresa Google, incluindo produtos, finanças e concorrentes."},
+}
+
+STANDIN_PLAN = {"plan": [
+    {"task_id": "research_products", "specialist_type": "researcher", "description": "Pesquise os produtos e serviços da empresa"},
+    {"task_id": "research_finance", "specialist_type": "researcher", "description": "Pesquise os resultados financeiros recentes da empresa"},
+    {"task_id": "write_report", "specialist_type": "writer", "description": "Escreva o relatório com base nas pesquisas"},
+]}
+# Respostas da escrita seccionada (ver sectioned_writer.py), para medir o caminho real e não o fallback
+STANDIN_OUTLINE = {"sections": [
+    {"title": "Produtos e serviços", "instructions": "Resuma os produtos", "task_ids": ["research_products"]},
+    {"title": "Finanças", "instructions": "Resuma os resultados financeiros", "task_ids": ["research_finance"]},
+]}
+STANDIN_FRAMING = {"introduction": "Introdução gerada pelo dublê de carga.", "conclusion": "Conclusão gerada pelo dublê de carga."}
+
+
+def parse_distribution(spec: str) -> Callable[[], float]:
+    """Converte 'nome:param1,param2' em uma função que sorteia latências em segundos."""
+    name, _, raw = spec.partition(":")
+    params = [float(p) for p in raw.split(",") if p]
+    if name == "fixed":
+        return lambda: params[0]
+    if name == "uniform":
+        return lambda: random.uniform(params[0], params[1])
+    if name == "exponential":
+        return lambda: random.expovariate(1 / params[0])
+    if name == "lognormal":
+        return lambda: random.lognormvariate(math.log(params[0]), params[1])
+    raise ValueError(f"Distribuição desconhecida: {spec}")
+
+
+class StandInChatModel(BaseChatModel):
+    """Dublê de LLM: dorme a latência sorteada e responde um texto ou o JSON esperado pelo papel."""
+
+    latency: Callable[[], float]
+    output_chars: int = 800
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency())
+        prompt = messages[-1].content
+        if "## Papel\nplanner" in prompt:
+            content = json.dumps(STANDIN_PLAN)
+        elif "## Papel\noutline" in prompt:
+            content = json.dumps(STANDIN_OUTLINE, ensure_ascii=False)
+        elif "## Papel\nconsistency" in prompt:
+            content = json.dumps(STANDIN_FRAMING, ensure_ascii=False)
+        else:
+            content = ("Texto gerado pelo dublê de carga. " * (self.output_chars // 34 + 1))[:self.output_chars]
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def install_standins(llm_latency: Callable[[], float], firecrawl_latency: Callable[[], float]) -> None:
+    """Troca os modelos e o cliente Firecrawl por dublês no processo atual."""
+    import models
+    for limited_model in models.models.values():
+        limited_model.model = StandInChatModel(latency=llm_latency)
+
+    class StandInFirecrawlApp:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def search(self, query, **kwargs):
+            time.sleep(firecrawl_latency())
+            return SimpleNamespace(data=[
+                {"title": f"Resultado {i}", "url": f"https://example.com/{i}", "markdown": "conteúdo " * 50}
+                for i in range(5)
+            ])
+
+    class StandInFireCrawlLoader:
+        def __init__(self, *args, url=None, **kwargs):
+            self.url = url
+
+        def load(self):
+            time.sleep(firecrawl_latency())
+            return [Document(page_content=f"Conteúdo raspado de {self.url}. " * 200)]
+
+    import fire_collab
+    fire_collab.FirecrawlApp = StandInFirecrawlApp
+    fire_collab.FireCrawlLoader = StandInFireCrawlLoader
+
+    # As durações dos dublês não podem entrar no histórico usado pelas estimativas reais
+    import plan_estimator
+    plan_estimator.set_stats_path(os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "plan_stats.jsonl"))
+
+
+def load_graph(name: str):
+    with open(LANGGRAPH_CONFIG, encoding="utf-8") as f:
+        module_name, attr = json.load(f)["graphs"][name].split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class LoadTest:
+    def __init__(self, graph, graph_input: Dict[str, Any], sample_interval: float, distinct_inputs: bool = False):
+        self.graph = graph
+        self.graph_input = graph_input
+        self.distinct_inputs = distinct_inputs
+        self.sample_interval = sample_interval
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.in_flight = 0
+        self.started = 0
+        self.timeline: List[Dict[str, Any]] = []
+        self._t0 = 0.0
+
+    def _next_input(self) -> Dict[str, Any]:
+        if not self.distinct_inputs:
+            return dict(self.graph_input)
+        # Sufixo por execução para que chamadas idênticas não sejam coalescidas (single_flight)
+        return {k: f"{v} #{self.started}" if isinstance(v, str) else v for k, v in self.graph_input.items()}
+
+    async def _one_run(self) -> None:
+        self.started += 1
+        self.in_flight += 1
+        graph_input = self._next_input()
+        start = time.perf_counter()
+        try:
+            result = await self.graph.ainvoke(graph_input)
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+        except Exception as e:
+            key = type(e).__name__
+            self.errors[key] = self.errors.get(key, 0) + 1
+        else:
+            self.latencies.append(time.perf_counter() - start)
+        finally:
+            self.in_flight -= 1
+
+    async def _sampler(self) -> None:
+        while True:
+            self.timeline.append({
+                "t": round(time.perf_counter() - self._t0, 3),
+                "rss_mb": round(rss_mb(), 2),
+                "in_flight": self.in_flight,
+                "completed": len(self.latencies) + sum(self.errors.values()),
+            })
+            await asyncio.sleep(self.sample_interval)
+
+    async def run_open(self, rate: float, duration: float, max_runs: int | None) -> None:
+        """Loop aberto: chegadas de Poisson com a taxa dada, independentes das respostas."""
+        tasks = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline and (max_runs is None or len(tasks) < max_runs):
+            tasks.append(asyncio.create_task(self._one_run()))
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+    async def run_closed(self, concurrency: int, duration: float, max_runs: int | None) -> None:
+        """Loop fechado: `concurrency` usuários que disparam a próxima execução ao terminar a anterior."""
+        deadline = time.perf_counter() + duration
+
+        async def user():
+            while time.perf_counter() < deadline and (max_runs is None or self.started < max_runs):
+                await self._one_run()
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    async def run(self, mode: str, rate: float, concurrency: int, duration: float, max_runs: int | None) -> float:
+        self._t0 = time.perf_counter()
+        sampler = asyncio.create_task(self._sampler())
+        try:
+            if mode == "open":
+                await self.run_open(rate, duration, max_runs)
+            else:
+                await self.run_closed(concurrency, duration, max_runs)
+        finally:
+            sampler.cancel()
+        elapsed = time.perf_counter() - self._t0
+        self.timeline.append({"t": round(elapsed, 3), "rss_mb": round(rss_mb(), 2), "in_flight": 0,
+                              "completed": len(self.latencies) + sum(self.errors.values())})
+        return elapsed
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        completed = len(latencies) + sum(self.errors.values())
+        return {
+            "completed": completed,
+            "succeeded": len(latencies),
+            "errors": self.errors,
+            "error_rate": round(sum(self.errors.values()) / completed, 4) if completed else 0.0,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+            "latency_s": {
+                "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            },
+            "rss_mb": {
+                "start": self.timeline[0]["rss_mb"] if self.timeline else None,
+                "peak": max((s["rss_mb"] for s in self.timeline), default=None),
+                "end": self.timeline[-1]["rss_mb"] if self.timeline else None,
+            },
+            "timeline": self.timeline,
+        }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: List[str] | None = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Teste de carga dos grafos do langgraph.json")
+    parser.add_argument("graph", help="nome do grafo em langgraph.json (ex.: firecollab)")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--rate", type=float, default=10.0, help="chegadas por segundo (loop aberto)")
+    parser.add_argument("--concurrency", type=int, default=10, help="usuários simultâneos (loop fechado)")
+    parser.add_argument("--duration", type=float, default=30.0, help="duração máxima em segundos")
+    parser.add_argument("--runs", type=int, default=None, help="número máximo de execuções")
+    parser.add_argument("--llm-latency", default="lognormal:1.0,0.5")
+    parser.add_argument("--firecrawl-latency", default="lognormal:0.8,0.5")
+    parser.add_argument("--max-threads", type=int, default=None, help="tamanho do executor de threads dos nós síncronos")
+    parser.add_argument("--input", default=None, help="arquivo JSON com o estado inicial")
+    parser.add_argument("--memory", action="store_true", help="inclui a memória por nó (tracemalloc) no relatório")
+    parser.add_argument("--no-rate-limits", action="store_true", help="desliga o rate_limiter para medir só o overhead local")
+    parser.add_argument("--distinct-inputs", action="store_true", help="varia a entrada a cada execução (evita a coalescência)")
+    parser.add_argument("--caches", action="store_true", help="mantém o cache de tarefas e a dedup de notícias entre execuções")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="arquivo do relatório JSON (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        os.environ[MEMORY_ENV] = "1"
+    if not args.caches:
+        # Entradas repetidas seriam respondidas pelos caches entre execuções, sem rodar o grafo
+        os.environ["TASK_CACHE"] = "0"
+        os.environ["NEWS_DEDUP"] = "0"
+    if args.seed is not None:
+        random.seed(args.seed)
+    install_standins(parse_distribution(args.llm_latency), parse_distribution(args.firecrawl_latency))
+    if args.no_rate_limits:
+        import rate_limiter
+        unlimited = {"rate": 1e6, "burst": 1e6, "concurrency": 1e6, "max_concurrency": 1e6}
+        for provider in rate_limiter.PROVIDER_LIMITS:
+            rate_limiter.PROVIDER_LIMITS[provider] = unlimited
+    if args.input:
+        with open(args.input, encoding="utf-8") as f:
+            graph_input = json.load(f)
+    else:
+        graph_input = DEFAULT_INPUTS.get(args.graph, {})
+
+    test = LoadTest(load_graph(args.graph), graph_input, args.sample_interval, args.distinct_inputs)
+
+    async def _run() -> float:
+        if args.max_threads:
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.max_threads))
+        return await test.run(args.mode, args.rate, args.concurrency, args.duration, args.runs)
+
+    elapsed = asyncio.run(_run())
+    report = {
+        "graph": args.graph,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output",)},
+        "environment": {"python": platform.python_version(), "git_revision": _git_revision(), "cpus": os.cpu_count()},
+        **test.report(elapsed),
+    }
+    if args.memory:
+        report["memory_by_node"] = memory_report()
+    if args.caches:
+        from news_dedup import dedup_report
+        report["news_dedup"] = dedup_report()
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Contabilidade de memória por nó: alocações (tracemalloc), tamanho do estado
+após cada passo e pico de memória da execução.
+
+Para uma execução:
+
+    with track_memory() as run_memory:
+        collaborative_workflow.invoke(state)
+    print(run_memory["peak_traced_bytes"], run_memory["nodes"])
+
+Com GRAPH_MEMORY=1 os totais do processo ficam em memory_report().
+O tracemalloc é global ao processo: com execuções concorrentes, os números
+por nó incluem alocações das outras threads e servem como aproximação. Ele fica
+ligado só enquanto houver algum bloco track_memory() ativo (ou com GRAPH_MEMORY);
+se já estava ligado antes do primeiro bloco, continua ligado.
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict
+
+MEMORY_ENV = "GRAPH_MEMORY"
+MAX_SIZEOF_DEPTH = 32
+
+_lock = threading.Lock()
+_process_memory: Dict[str, Dict[str, Any]] = {}
+_run_memory: ContextVar[Dict[str, Any] | None] = ContextVar("run_memory", default=None)
+# Blocos track_memory() ativos no processo e se o primeiro deles ligou o tracemalloc
+_active_scopes = 0
+_started_tracing = False
+
+
+def rss_mb() -> float:
+    """Memória residente atual do processo em MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def deep_sizeof(value: Any, _seen: set | None = None, _depth: int = 0) -> int:
+    """Tamanho aproximado em bytes de um valor e de tudo que ele contém."""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen or _depth > MAX_SIZEOF_DEPTH:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen, _depth + 1) + deep_sizeof(v, seen, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen, _depth + 1) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += deep_sizeof(vars(value), seen, _depth + 1)
+    return size
+
+
+def memory_enabled() -> bool:
+    return _run_memory.get() is not None or os.getenv(MEMORY_ENV, "") not in ("", "0", "false", "off")
+
+
+def _add_node(target: Dict[str, Dict[str, Any]], node: str, values: Dict[str, Any]) -> None:
+    entry = target.setdefault(node, {"calls": 0, "allocated_bytes": 0, "peak_bytes": 0, "state_bytes": 0})
+    entry["calls"] += 1
+    entry["allocated_bytes"] += values["allocated_bytes"]
+    entry["peak_bytes"] = max(entry["peak_bytes"], values["peak_bytes"])
+    entry["state_bytes"] = max(entry["state_bytes"], values["state_bytes"])
+
+
+def _record(node: str, values: Dict[str, Any]) -> None:
+    with _lock:
+        if os.getenv(MEMORY_ENV, "") not in ("", "0", "false", "off"):
+            _add_node(_process_memory, node, values)
+        run_memory = _run_memory.get()
+        if run_memory is not None:
+            _add_node(run_memory["nodes"], node, values)
+            run_memory["steps"].append({"node": node, **values})
+            run_memory["peak_traced_bytes"] = max(run_memory["peak_traced_bytes"], values["traced_peak_bytes"])
+            run_memory["peak_rss_mb"] = max(run_memory["peak_rss_mb"], values["rss_mb"])
+            run_memory["max_state_bytes"] = max(run_memory["max_state_bytes"], values["state_bytes"])
+
+
+def tracked(node_name: str, fn: Callable) -> Callable:
+    """Envolve um nó medindo alocações e o tamanho do estado resultante."""
+
+    def node(state):
+        if not memory_enabled():
+            return fn(state)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn(state)
+        after, peak = tracemalloc.get_traced_memory()
+        # O último bloco de outra execução pode ter desligado o tracemalloc no meio do nó
+        after, peak = max(after, before), max(peak, before)
+        new_state = {**state, **result} if isinstance(result, dict) else state
+        _record(node_name, {
+            "allocated_bytes": after - before,
+            "peak_bytes": max(0, peak - before),
+            "traced_peak_bytes": peak,
+            "state_bytes": deep_sizeof(new_state),
+            "rss_mb": round(rss_mb(), 2),
+        })
+        return result
+
+    node.__name__ = getattr(fn, "__name__", node_name)
+    node.__doc__ = fn.__doc__
+    return node
+
+
+def memory_report() -> Dict[str, Dict[str, Any]]:
+    """Totais do processo por nó (apenas com GRAPH_MEMORY ativo)."""
+    with _lock:
+        return {node: dict(entry) for node, entry in _process_memory.items()}
+
+
+@contextmanager
+def track_memory():
+    """Ativa a instrumentação de memória para as execuções dentro do bloco."""
+    global _active_scopes, _started_tracing
+    run_memory: Dict[str, Any] = {
+        "nodes": {},
+        "steps": [],
+        "peak_traced_bytes": 0,
+        "peak_rss_mb": round(rss_mb(), 2),
+        "max_state_bytes": 0,
+    }
+    with _lock:
+        if _active_scopes == 0:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+        _active_scopes += 1
+    token = _run_memory.set(run_memory)
+    try:
+        yield run_memory
+    finally:
+        _run_memory.reset(token)
+        with _lock:
+            _active_scopes -= 1
+            if _active_scopes == 0 and _started_tracing:
+                _started_tracing = False
+                tracemalloc.stop()
@@ -1,18 +1,30 @@
 from dotenv import load_dotenv
+import importlib
 import os
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+import threading
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+import cassette
+import deadline
+from rate_limiter import call_with_limits, acall_with_limits
+from single_flight import flight, make_key
+from usage import record_usage
 
 _ = load_dotenv() # forcar a execucao
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# (módulo, classe): os SDKs são importados só quando o primeiro modelo do provedor é usado
 _PROVIDER_MAP = {
-    "openai": ChatOpenAI,
-    "google": ChatGoogleGenerativeAI
+    "openai": ("langchain_openai", "ChatOpenAI"),
+    "google": ("langchain_google_genai", "ChatGoogleGenerativeAI")
 }
 
+# Argumento de invoke que define o timeout HTTP de uma chamada, por provedor
+_TIMEOUT_KWARG = {"openai": "timeout"}
+
 MODEL_CONFIGS = [
     {
         "key_name": "gemini_2.5_flash",
@@ -30,25 +42,141 @@ MODEL_CONFIGS = [
         "provider": "openai",
         "model_name": "gpt-4o-2024-08-06",
     },
+    {
+        "key_name": "gpt_4o_mini",
+        "provider": "openai",
+        "model_name": "gpt-4o-mini-2024-07-18",
+    },
 ]
 
 def _create_chat_model(model_name: str, provider: str, temperature: float | None = None):
     if provider not in _PROVIDER_MAP:
         raise ValueError(f"Provedor nao suportado: {provider}. Provedores suportados sao: {list(_PROVIDER_MAP.keys())}")
 
-    model_class = _PROVIDER_MAP[provider]
-    params = {"model": model_name}
+    module_name, class_name = _PROVIDER_MAP[provider]
+    model_class = getattr(importlib.import_module(module_name), class_name)
+    # As novas tentativas em 429 ficam a cargo do rate_limiter, que precisa enxergar os erros
+    params = {"model": model_name, "max_retries": 0}
     if temperature is not None:
         params["temperature"] = temperature
 
     return model_class(**params)
 
+def _message_from_dict(data):
+    return messages_from_dict([data])[0]
+
+class LimitedChatModel:
+    """
+    Encaminha as chamadas do modelo pelo limitador compartilhado do provedor.
+    Chamadas idênticas em andamento são coalescidas (single-flight).
+    O cliente do provedor só é criado na primeira chamada.
+    """
+
+    def __init__(self, provider: str, model_name: str, temperature: float | None = None, model=None):
+        self.provider = provider
+        self.model_name = model_name
+        self.temperature = temperature
+        self._model = model
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = _create_chat_model(self.model_name, self.provider, self.temperature)
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    def _key(self, input, kwargs) -> str:
+        return make_key("llm", self.provider, self.model_name, input, kwargs)
+
+    def _request(self, input, kwargs) -> dict:
+        """Descrição da requisição gravada nos cassetes."""
+        messages = input if isinstance(input, list) else [input]
+        return {
+            "provider": self.provider,
+            "model": self.model_name,
+            "messages": [{"type": getattr(m, "type", "human"), "content": getattr(m, "content", m)} for m in messages],
+            "kwargs": kwargs,
+        }
+
+    def structured_output_kwargs(self, name: str, schema: dict) -> dict:
+        """Argumentos de invoke que pedem ao provedor uma resposta no esquema JSON (vazio se não houver suporte)."""
+        if self.provider == "openai":
+            return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}}
+        if self.provider == "google":
+            return {"generation_config": {"response_mime_type": "application/json"}}
+        return {}
+
+    def _provider_kwargs(self, kwargs):
+        # Timeout da requisição derivado do prazo restante da execução
+        timeout = deadline.call_timeout()
+        if timeout is not None and self.provider in _TIMEOUT_KWARG:
+            return {**kwargs, _TIMEOUT_KWARG[self.provider]: timeout}
+        return kwargs
+
+    def _call_provider(self, input, config, kwargs):
+        return call_with_limits(self.provider, self.model_name, self.model.invoke, input, config, **self._provider_kwargs(kwargs))
+
+    async def _acall_provider(self, input, config, kwargs):
+        return await acall_with_limits(
+            self.provider, self.model_name, self.model.ainvoke, input, config, **self._provider_kwargs(kwargs)
+        )
+
+    def _invoke(self, input, config, kwargs):
+        response = cassette.exchange(
+            "llm", self._key(input, kwargs), lambda: self._call_provider(input, config, kwargs),
+            request=self._request(input, kwargs), encode=message_to_dict, decode=_message_from_dict,
+        )
+        record_usage(response)
+        return response
+
+    async def _ainvoke(self, input, config, kwargs):
+        response = await cassette.aexchange(
+            "llm", self._key(input, kwargs),
+            lambda: self._acall_provider(input, config, kwargs),
+            request=self._request(input, kwargs), encode=message_to_dict, decode=_message_from_dict,
+        )
+        record_usage(response)
+        return response
+
+    def invoke(self, input, config=None, **kwargs):
+        executed = []
+        response = flight.do(self._key(input, kwargs), lambda: executed.append(True) or self._invoke(input, config, kwargs))
+        if not executed:
+            # Seguidor do single-flight: o uso também conta para a execução (e o orçamento) dele
+            record_usage(response, shared=True)
+        return response
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        executed = []
+        response = await flight.ado(
+            self._key(input, kwargs), lambda: executed.append(True) or self._ainvoke(input, config, kwargs)
+        )
+        if not executed:
+            record_usage(response, shared=True)
+        return response
+
+    def batch(self, inputs, config=None, **kwargs):
+        max_workers = (config or {}).get("max_concurrency") or len(inputs) or 1
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda item: self.invoke(item, **kwargs), inputs))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
 models = {}
 
 for config in MODEL_CONFIGS:
-    models[config["key_name"]] = _create_chat_model(
-        model_name=config["model_name"],
+    models[config["key_name"]] = LimitedChatModel(
         provider=config["provider"],
+        model_name=config["model_name"],
         temperature=config.get("temperature")
     )
 
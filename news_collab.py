@@ -1,23 +1,24 @@
 import json
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import StateGraph, END
+from typing import List, Dict, Any
 from langchain_core.messages import HumanMessage, SystemMessage
+from agent_state import TaskLoopState, lazy_workflow, make_plan
+from instrumentation import instrument
+from news_dedup import make_dedup_nodes, route_after_dedup
 
-class NewsAgentState(TypedDict):
+class NewsAgentState(TaskLoopState):
     original_news: str
-    plan: List[Dict[str, str]] | None
-    current_task_idx: int
-    intermediate_results: Dict[str, str]
-    final_response: str | None
-    error: str | None
-    current_task_description: str | None
-    current_specialist_type: str | None
-    current_task_id: str | None
-    specialist_result: str | None
+
+    # Detecção de quase duplicatas (ver news_dedup.py)
+    duplicate_of: str | None
+    duplicate_similarity: float | None
+    news_id: str | None
+    news_signature: List[int] | None
+
+dedup_check_node, dedup_store_node = make_dedup_nodes("newscollab")
 
 def planner_node(state: NewsAgentState) -> Dict[str, Any] :
     news = state["original_news"]
-    plan = [
+    plan = make_plan([
         {
             "task_id": "summarize_news",
             "specialist_type": "summarizer",
@@ -33,7 +34,7 @@ def planner_node(state: NewsAgentState) -> Dict[str, Any] :
             "specialist_type": "questioner",
             "description": "Sugira perguntas para reflexão ou debate baseadas na análise da notícia. Use o resultado da tarefa"
         }
-    ]
+    ])
     return {
         "plan": plan,
         "current_task_idx": 0,
@@ -46,16 +47,10 @@ def prepare_next_task_node(state: NewsAgentState) -> Dict[str, Any]:
     plan = state.get("plan", [])
     current_task_idx = state.get("current_task_idx", 0)
     if not plan or current_task_idx >= len(plan):
-        return {"current_task_id": None, "current_task _description": None, "current_specialist_type": None}
-    current_task = plan[current_task_idx]
-    return {
-        "current_task_id": current_task["task_id"],
-        "current_task_description": current_task["description"],
-        "current_specialist_type": current_task["specialist_type"],
-    }
+        return {"current_task": None}
+    return {"current_task": plan[current_task_idx]}
 
 def summarizer_node(state: NewsAgentState) -> Dict[str, str]:
-    desc = state.get("current_task_description", "")
     news = state.get("original_news", "")
 
     # Aqui, apenas um resumo simples (poderia ser LLM
@@ -84,11 +79,11 @@ def questioner_node(state: NewsAgentState) -> Dict[str, str]:
     return {"specialist_result": "Perguntas para reflexão: " + ", ".join(perguntas)}
 
 def collect_result_and_advance_node(state: NewsAgentState) -> Dict[str, Any]:
-    current_task_id = state.get("current_task_id")
+    current_task = state.get("current_task")
     specialist_output = state.get("specialist_result", "Nenhum resultado do especialista encontrado no estado.")
     updated_intermediate_results = state.get("intermediate_results", {}).copy()
-    if current_task_id:
-        updated_intermediate_results[current_task_id] = specialist_output
+    if current_task:
+        updated_intermediate_results[current_task.task_id] = specialist_output
     new_idx = state.get("current_task_idx", 0) + 1
     return {
         "intermediate_results": updated_intermediate_results,
@@ -116,7 +111,8 @@ def should_execute_task_or_synthesize(state: NewsAgentState) -> str:
         return "synthesize_response"
 
 def specialist_router_node(state: NewsAgentState) -> str:
-    specialist_type = state.get("current_specialist_type")
+    current_task = state.get("current_task")
+    specialist_type = current_task.specialist_type if current_task else None
     if specialist_type == "summarizer":
         return "summarizer"
     elif specialist_type == "analyst":
@@ -131,50 +127,61 @@ def error_node(state: NewsAgentState) -> Dict[str, str | None]:
     return {"final_response": f"Ocorreu um erro: {error_message}"}
 
 # Construção do workflow
-workflow_builder = StateGraph(NewsAgentState)
-workflow_builder.add_node("planner", planner_node)
-workflow_builder.add_node("prepare_next_task", prepare_next_task_node)
-workflow_builder.add_node("summarizer", summarizer_node)
-workflow_builder.add_node("analyst", analyst_node)
-workflow_builder.add_node("questioner", questioner_node)
-workflow_builder.add_node("collect_and_advance", collect_result_and_advance_node)
-workflow_builder.add_node("synthesize_response", synthesis_node)
-workflow_builder.add_node("error_handler", error_node)
-
-workflow_builder.set_entry_point("planner")
-workflow_builder.add_conditional_edges(
-    "planner", should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
-
-workflow_builder.add_conditional_edges(
-    "prepare_next_task", specialist_router_node,
-    {
-        "summarizer": "summarizer",
-        "analyst": "analyst",
-        "questioner": "questioner",
-        "error_handler": "error_handler"
-    }
-)
-
-workflow_builder.add_edge("summarizer", "collect_and_advance")
-workflow_builder.add_edge("analyst", "collect_and_advance")
-workflow_builder.add_edge("questioner", "collect_and_advance")
-workflow_builder.add_conditional_edges(
-    "collect_and_advance",
-    should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
+def build_workflow():
+    """Monta e compila o grafo; chamado uma única vez, no primeiro acesso a news_workflow."""
+    from langgraph.graph import StateGraph, END
+
+    workflow_builder = StateGraph(NewsAgentState)
+    workflow_builder.add_node("dedup_check", instrument("dedup_check", dedup_check_node, NewsAgentState))
+    workflow_builder.add_node("planner", instrument("planner", planner_node, NewsAgentState))
+    workflow_builder.add_node("prepare_next_task", instrument("prepare_next_task", prepare_next_task_node, NewsAgentState))
+    workflow_builder.add_node("summarizer", instrument("summarizer", summarizer_node, NewsAgentState))
+    workflow_builder.add_node("analyst", instrument("analyst", analyst_node, NewsAgentState))
+    workflow_builder.add_node("questioner", instrument("questioner", questioner_node, NewsAgentState))
+    workflow_builder.add_node("collect_and_advance", instrument("collect_and_advance", collect_result_and_advance_node, NewsAgentState))
+    workflow_builder.add_node("synthesize_response", instrument("synthesize_response", synthesis_node, NewsAgentState))
+    workflow_builder.add_node("error_handler", instrument("error_handler", error_node, NewsAgentState))
+    workflow_builder.add_node("dedup_store", instrument("dedup_store", dedup_store_node, NewsAgentState))
+
+    workflow_builder.set_entry_point("dedup_check")
+    # Notícia quase duplicada: a análise guardada já está no estado
+    workflow_builder.add_conditional_edges("dedup_check", route_after_dedup, {"new": "planner", "duplicate": END})
+    workflow_builder.add_conditional_edges(
+        "planner", should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_conditional_edges(
+        "prepare_next_task", specialist_router_node,
+        {
+            "summarizer": "summarizer",
+            "analyst": "analyst",
+            "questioner": "questioner",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("summarizer", "collect_and_advance")
+    workflow_builder.add_edge("analyst", "collect_and_advance")
+    workflow_builder.add_edge("questioner", "collect_and_advance")
+    workflow_builder.add_conditional_edges(
+        "collect_and_advance",
+        should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("synthesize_response", "dedup_store")
+    workflow_builder.add_edge("dedup_store", END)
+    workflow_builder.add_edge("error_handler", END)
 
-workflow_builder.add_edge("synthesize_response", END)
-workflow_builder.add_edge("error_handler", END)
+    return workflow_builder.compile()
 
-news_workflow = workflow_builder.compile()
+__getattr__ = lazy_workflow(__name__, "news_workflow", build_workflow)
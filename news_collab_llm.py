@@ -1,24 +1,42 @@
 import json
-from typing import TypedDict, List, Dict, Any
-from langgraph.graph import StateGraph, END
+from typing import List, Dict, Any
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from agent_state import TaskLoopState, lazy_workflow, make_plan
+from deadline import RunCancelled
 from models import models
+from instrumentation import instrument
+from news_dedup import make_dedup_nodes, route_after_dedup
+from news_triage import triage_node, model_for, record_tier
+import news_collab
 
-class NewsAgentState(TypedDict):
+# Acima deste tamanho (em caracteres) a notícia é resumida em modo map-reduce
+LONG_NEWS_THRESHOLD = 6000
+CHUNK_SIZE = 3000
+MAX_SUMMARY_CONCURRENCY = 4
+REDUCE_FAN_IN = 4
+
+class NewsAgentState(TaskLoopState):
     original_news: str
-    plan: List[Dict[str, str]] | None
-    current_task_idx: int
-    intermediate_results: Dict[str, str]
-    final_response: str | None
-    error: str | None
-    current_task_description: str | None
-    current_specialist_type: str | None
-    current_task_id: str | None
-    specialist_result: str | None
+
+    # Detecção de quase duplicatas (ver news_dedup.py)
+    duplicate_of: str | None
+    duplicate_similarity: float | None
+    news_id: str | None
+    news_signature: List[int] | None
+
+    # Triagem por custo (ver news_triage.py)
+    triage_tier: str | None
+    triage_score: float | None
+    triage_features: Dict[str, Any] | None
+    triage_started_at: float | None
+    tier_latency_s: float | None
+
+dedup_check_node, dedup_store_node = make_dedup_nodes("newscollab_llm")
 
 def planner_node(state: NewsAgentState) -> Dict[str, Any] :
     news = state["original_news"]
-    plan = [
+    plan = make_plan([
         {
             "task_id": "summarize_news",
             "specialist_type": "summarizer",
@@ -34,7 +52,7 @@ def planner_node(state: NewsAgentState) -> Dict[str, Any] :
             "specialist_type": "questioner",
             "description": "Sugira perguntas para reflexão ou debate baseadas na análise da notícia. Use o resultado da tarefa"
         }
-    ]
+    ])
     return {
         "plan": plan,
         "current_task_idx": 0,
@@ -47,24 +65,83 @@ def prepare_next_task_node(state: NewsAgentState) -> Dict[str, Any]:
     plan = state.get("plan", [])
     current_task_idx = state.get("current_task_idx", 0)
     if not plan or current_task_idx >= len(plan):
-        return {"current_task_id": None, "current_task _description": None, "current_specialist_type": None}
-    current_task = plan[current_task_idx]
-    return {
-        "current_task_id": current_task["task_id"],
-        "current_task_description": current_task["description"],
-        "current_specialist_type": current_task["specialist_type"],
-    }
+        return {"current_task": None}
+    return {"current_task": plan[current_task_idx]}
+
+def _split_into_chunks(text: str, chunk_size: int = CHUNK_SIZE) -> List[str]:
+    """Divide o texto em blocos de até chunk_size caracteres respeitando os parágrafos."""
+    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        # Parágrafos maiores que o bloco são quebrados nos espaços
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind(" ", 0, chunk_size)
+            if cut <= 0:
+                cut = chunk_size
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _summarize(prompt: str, model_name: str = "gpt_4o") -> str:
+    response = models[model_name].invoke([HumanMessage(content=prompt)])
+    return response.content.strip()
+
+def _summarize_parallel(prompts: List[str], model_name: str = "gpt_4o") -> List[str]:
+    """Executa os resumos em paralelo com concorrência limitada, mantendo a ordem."""
+    # ContextThreadPoolExecutor mantém o contexto do nó (callbacks, contabilidade de tokens)
+    with ContextThreadPoolExecutor(max_workers=MAX_SUMMARY_CONCURRENCY) as executor:
+        return list(executor.map(lambda prompt: _summarize(prompt, model_name), prompts))
+
+def _map_reduce_summary(news: str, model_name: str = "gpt_4o") -> str:
+    """Resume notícias longas por blocos e combina os resumos de forma hierárquica."""
+    chunks = _split_into_chunks(news)
+    summaries = _summarize_parallel([
+        f"Este é o trecho {i + 1} de {len(chunks)} de uma notícia longa. "
+        f"Resuma os fatos principais deste trecho de forma objetiva:\n{chunk}"
+        for i, chunk in enumerate(chunks)
+    ], model_name)
+
+    while len(summaries) > REDUCE_FAN_IN:
+        groups = [summaries[i:i + REDUCE_FAN_IN] for i in range(0, len(summaries), REDUCE_FAN_IN)]
+        summaries = _summarize_parallel([
+            "Combine os resumos parciais abaixo, na ordem, em um único resumo objetivo:\n"
+            + "\n\n".join(group)
+            for group in groups
+        ], model_name)
+
+    joined = "\n\n".join(f"Parte {i + 1}: {summary}" for i, summary in enumerate(summaries))
+    return _summarize(
+        f"A partir dos resumos parciais abaixo, resuma a notícia completa de forma clara, objetiva e em até 5 linhas: \n{joined}",
+        model_name,
+    )
 
 def summarizer_node(state: NewsAgentState) -> Dict[str, str]:
+    if state.get("triage_tier") == "deterministic":
+        return news_collab.summarizer_node(state)
     news = state.get("original_news", "")
-    prompt = f"Resuma a seguinte notícia de forma clara, objetiva e em até 5 linhas: \n{news}"
     try:
-        response = models["gpt_4o"].invoke([HumanMessage(content=prompt)])
-        return {"specialist_result": response.content.strip()}
+        if len(news) > LONG_NEWS_THRESHOLD:
+            return {"specialist_result": _map_reduce_summary(news, model_for(state))}
+        prompt = f"Resuma a seguinte notícia de forma clara, objetiva e em até 5 linhas: \n{news}"
+        return {"specialist_result": _summarize(prompt, model_for(state))}
+    except RunCancelled:
+        raise
     except Exception as e:
         return {"specialist_result": f"Erro ao resumir: {e}"}
 
 def analyst_node(state: NewsAgentState) -> Dict[str, str]:
+    if state.get("triage_tier") == "deterministic":
+        return news_collab.analyst_node(state)
     prev_results = state.get("intermediate_results", {})
     resumo = prev_results.get("summarize_news", "sem resumo")
     prompt = (
@@ -72,12 +149,16 @@ def analyst_node(state: NewsAgentState) -> Dict[str, str]:
         f"Analise o seguinte resumo de notícia, destacando pontos importantes, possíveis vieses e impacto social/político. \n"
     )
     try:
-        response = models["gpt_4o"].invoke([HumanMessage(content=prompt)])
+        response = models[model_for(state)].invoke([HumanMessage(content=prompt)])
         return {"specialist_result": response.content.strip()}
+    except RunCancelled:
+        raise
     except Exception as e:
         return {"specialist_result": f"Erro na análise: {e}"}
 
 def questioner_node(state: NewsAgentState) -> Dict[str, str]:
+    if state.get("triage_tier") == "deterministic":
+        return news_collab.questioner_node(state)
     prev_results = state.get("intermediate_results", {})
     analise = prev_results.get("analyze_news", "sem análise")
     prompt = (
@@ -85,17 +166,19 @@ def questioner_node(state: NewsAgentState) -> Dict[str, str]:
         f"Análise: {analise}"
     )
     try:
-        response = models["gpt_4o"].invoke([HumanMessage(content=prompt)])
+        response = models[model_for(state)].invoke([HumanMessage(content=prompt)])
         return {"specialist_result": response.content.strip()}
+    except RunCancelled:
+        raise
     except Exception as e:
         return {"specialist_result": f"Erro ao sugerir perguntas: {e}"}
 
 def collect_result_and_advance_node(state: NewsAgentState) -> Dict[str, Any]:
-    current_task_id = state.get("current_task_id")
+    current_task = state.get("current_task")
     specialist_output = state.get("specialist_result", "Nenhum resultado do especialista encontrado no estado.")
     updated_intermediate_results = state.get("intermediate_results", {}).copy()
-    if current_task_id:
-        updated_intermediate_results[current_task_id] = specialist_output
+    if current_task:
+        updated_intermediate_results[current_task.task_id] = specialist_output
     new_idx = state.get("current_task_idx", 0) + 1
     return {
         "intermediate_results": updated_intermediate_results,
@@ -109,7 +192,7 @@ def synthesis_node(state: NewsAgentState) -> Dict[str, str | None]:
     resposta = f"Notícia original: {original_news}\n"
     for task_id, result in intermediate_results.items():
         resposta += f"- {task_id}: {result}\n"
-    return {"final_response": resposta, "error": None}
+    return {"final_response": resposta, "error": None, "tier_latency_s": record_tier(state)}
 
 def should_execute_task_or_synthesize(state: NewsAgentState) -> str:
     if state.get("error"):
@@ -123,7 +206,8 @@ def should_execute_task_or_synthesize(state: NewsAgentState) -> str:
         return "synthesize_response"
 
 def specialist_router_node(state: NewsAgentState) -> str:
-    specialist_type = state.get("current_specialist_type")
+    current_task = state.get("current_task")
+    specialist_type = current_task.specialist_type if current_task else None
     if specialist_type == "summarizer":
         return "summarizer"
     elif specialist_type == "analyst":
@@ -138,50 +222,63 @@ def error_node(state: NewsAgentState) -> Dict[str, str | None]:
     return {"final_response": f"Ocorreu um erro: {error_message}"}
 
 # Construção do workflow
-workflow_builder = StateGraph(NewsAgentState)
-workflow_builder.add_node("planner", planner_node)
-workflow_builder.add_node("prepare_next_task", prepare_next_task_node)
-workflow_builder.add_node("summarizer", summarizer_node)
-workflow_builder.add_node("analyst", analyst_node)
-workflow_builder.add_node("questioner", questioner_node)
-workflow_builder.add_node("collect_and_advance", collect_result_and_advance_node)
-workflow_builder.add_node("synthesize_response", synthesis_node)
-workflow_builder.add_node("error_handler", error_node)
-
-workflow_builder.set_entry_point("planner")
-workflow_builder.add_conditional_edges(
-    "planner", should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
-
-workflow_builder.add_conditional_edges(
-    "prepare_next_task", specialist_router_node,
-    {
-        "summarizer": "summarizer",
-        "analyst": "analyst",
-        "questioner": "questioner",
-        "error_handler": "error_handler"
-    }
-)
-
-workflow_builder.add_edge("summarizer", "collect_and_advance")
-workflow_builder.add_edge("analyst", "collect_and_advance")
-workflow_builder.add_edge("questioner", "collect_and_advance")
-workflow_builder.add_conditional_edges(
-    "collect_and_advance",
-    should_execute_task_or_synthesize,
-    {
-        "prepare_next_task": "prepare_next_task",
-        "synthesize_response": "synthesize_response",
-        "error_handler": "error_handler"
-    }
-)
+def build_workflow():
+    """Monta e compila o grafo; chamado uma única vez, no primeiro acesso a news_workflow."""
+    from langgraph.graph import StateGraph, END
+
+    workflow_builder = StateGraph(NewsAgentState)
+    workflow_builder.add_node("dedup_check", instrument("dedup_check", dedup_check_node, NewsAgentState))
+    workflow_builder.add_node("triage", instrument("triage", triage_node, NewsAgentState))
+    workflow_builder.add_node("planner", instrument("planner", planner_node, NewsAgentState))
+    workflow_builder.add_node("prepare_next_task", instrument("prepare_next_task", prepare_next_task_node, NewsAgentState))
+    workflow_builder.add_node("summarizer", instrument("summarizer", summarizer_node, NewsAgentState))
+    workflow_builder.add_node("analyst", instrument("analyst", analyst_node, NewsAgentState))
+    workflow_builder.add_node("questioner", instrument("questioner", questioner_node, NewsAgentState))
+    workflow_builder.add_node("collect_and_advance", instrument("collect_and_advance", collect_result_and_advance_node, NewsAgentState))
+    workflow_builder.add_node("synthesize_response", instrument("synthesize_response", synthesis_node, NewsAgentState))
+    workflow_builder.add_node("error_handler", instrument("error_handler", error_node, NewsAgentState))
+    workflow_builder.add_node("dedup_store", instrument("dedup_store", dedup_store_node, NewsAgentState))
+
+    workflow_builder.set_entry_point("dedup_check")
+    # Notícia quase duplicada: a análise guardada já está no estado
+    workflow_builder.add_conditional_edges("dedup_check", route_after_dedup, {"new": "triage", "duplicate": END})
+    workflow_builder.add_edge("triage", "planner")
+    workflow_builder.add_conditional_edges(
+        "planner", should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_conditional_edges(
+        "prepare_next_task", specialist_router_node,
+        {
+            "summarizer": "summarizer",
+            "analyst": "analyst",
+            "questioner": "questioner",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("summarizer", "collect_and_advance")
+    workflow_builder.add_edge("analyst", "collect_and_advance")
+    workflow_builder.add_edge("questioner", "collect_and_advance")
+    workflow_builder.add_conditional_edges(
+        "collect_and_advance",
+        should_execute_task_or_synthesize,
+        {
+            "prepare_next_task": "prepare_next_task",
+            "synthesize_response": "synthesize_response",
+            "error_handler": "error_handler"
+        }
+    )
+
+    workflow_builder.add_edge("synthesize_response", "dedup_store")
+    workflow_builder.add_edge("dedup_store", END)
+    workflow_builder.add_edge("error_handler", END)
 
-workflow_builder.add_edge("synthesize_response", END)
-workflow_builder.add_edge("error_handler", END)
+    return workflow_builder.compile()
 
-news_workflow = workflow_builder.compile()
+__getattr__ = lazy_workflow(__name__, "news_workflow", build_workflow)
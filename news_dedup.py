@@ -0,0 +1,211 @@
+"""
+Detecção de notícias quase duplicadas (shingles + MinHash + LSH) na entrada do news_workflow.
+
+Cada notícia analisada vira uma assinatura MinHash dos seus shingles de palavras,
+indexada por bandas (LSH). Uma notícia nova cuja similaridade de Jaccard estimada
+com uma já analisada passe de NEWS_DEDUP_THRESHOLD recebe a análise guardada e o
+id da original (duplicate_of), sem rodar a cadeia resumo/análise/perguntas.
+
+O índice fica em memória e é persistido como log JSON Lines em
+NEWS_DEDUP_DIR/<índice>.jsonl (uma linha por notícia), recarregado na abertura.
+NEWS_DEDUP=0 desativa a detecção; por execução use
+config={"configurable": {"dedup": False}}. Taxas de dedup: dedup_report().
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.runnables.config import ensure_config
+
+NEWS_DEDUP_ENV = "NEWS_DEDUP"
+NEWS_DEDUP_DIR = os.getenv("NEWS_DEDUP_DIR", ".news_dedup")
+SIMILARITY_THRESHOLD = float(os.getenv("NEWS_DEDUP_THRESHOLD", "0.8"))
+SHINGLE_SIZE = 5
+# 16 bandas x 8 linhas: pares com Jaccard ~0.7 ou mais quase sempre caem no mesmo bucket
+NUM_BANDS = 16
+ROWS_PER_BAND = 8
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Permutações fixas: assinaturas continuam comparáveis entre processos e reinícios
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE_PRIME - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME,
+    )
+    for i in range(NUM_PERM)
+]
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def dedup_enabled() -> bool:
+    configured = ensure_config().get("configurable", {}).get("dedup")
+    if configured is not None:
+        return bool(configured)
+    return os.getenv(NEWS_DEDUP_ENV, "1") not in ("", "0", "false", "off")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Conjunto de shingles de `size` palavras do texto normalizado."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_set: set) -> List[int]:
+    """Assinatura MinHash com NUM_PERM permutações."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "big")
+        for shingle in shingle_set
+    ]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Jaccard estimado a partir de duas assinaturas."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def _band_keys(signature: List[int]) -> List[str]:
+    return [
+        f"{band}:" + ",".join(map(str, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(NUM_BANDS)
+    ]
+
+
+class NearDuplicateIndex:
+    """Índice LSH de notícias já analisadas, persistido em log append-only."""
+
+    def __init__(self, path: str, threshold: float = SIMILARITY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[str, List[str]] = defaultdict(list)
+        self.stats = {"checked": 0, "duplicates": 0, "stored": 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._index(json.loads(line))
+                except ValueError:
+                    # Linha incompleta de um processo interrompido
+                    continue
+
+    def _index(self, doc: Dict[str, Any]) -> None:
+        self._docs[doc["id"]] = doc
+        for key in _band_keys(doc["signature"]):
+            self._buckets[key].append(doc["id"])
+
+    def find(self, signature: List[int]) -> Tuple[Dict[str, Any], float] | None:
+        """Notícia indexada mais parecida acima do limiar, com a similaridade estimada."""
+        with self._lock:
+            candidates = {doc_id for key in _band_keys(signature) for doc_id in self._buckets.get(key, ())}
+            best = None
+            for doc_id in candidates:
+                doc = self._docs[doc_id]
+                score = similarity(signature, doc["signature"])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (doc, score)
+            return best
+
+    def check(self, text: str) -> Tuple[List[int], Tuple[Dict[str, Any], float] | None]:
+        """Assinatura da notícia e a duplicata encontrada (ou None); atualiza as estatísticas."""
+        signature = minhash(shingles(text))
+        match = self.find(signature)
+        with self._lock:
+            self.stats["checked"] += 1
+            if match is not None:
+                self.stats["duplicates"] += 1
+        return signature, match
+
+    def add(self, signature: List[int], analysis: Dict[str, Any], doc_id: str | None = None) -> str:
+        doc = {"id": doc_id or str(uuid.uuid4()), "signature": signature, "analysis": analysis, "created_at": time.time()}
+        line = json.dumps(doc, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._index(doc)
+            self.stats["stored"] += 1
+        return doc["id"]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            checked = self.stats["checked"]
+            return {
+                **self.stats,
+                "indexed": len(self._docs),
+                "dedup_rate": round(self.stats["duplicates"] / checked, 4) if checked else 0.0,
+            }
+
+
+_indexes: Dict[str, NearDuplicateIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(name: str) -> NearDuplicateIndex:
+    """Índice do processo para um grafo (cada grafo guarda a sua própria análise)."""
+    with _indexes_lock:
+        if name not in _indexes:
+            _indexes[name] = NearDuplicateIndex(os.path.join(NEWS_DEDUP_DIR, f"{name}.jsonl"))
+        return _indexes[name]
+
+
+def dedup_report() -> Dict[str, Dict[str, Any]]:
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    return {name: index.report() for name, index in indexes.items()}
+
+
+def make_dedup_nodes(index_name: str):
+    """
+    Nós de entrada e saída do grafo: dedup_check responde duplicatas com a análise
+    guardada (duplicate_of aponta a original); dedup_store indexa as análises novas.
+    """
+
+    def dedup_check_node(state: Dict[str, Any]) -> Dict[str, Any]:
+        if not dedup_enabled():
+            return {"duplicate_of": None}
+        signature, match = get_index(index_name).check(state.get("original_news", ""))
+        if match is None:
+            return {"duplicate_of": None, "news_signature": signature}
+        doc, score = match
+        return {
+            **doc["analysis"],
+            "duplicate_of": doc["id"],
+            "duplicate_similarity": round(score, 3),
+            "news_signature": None,
+        }
+
+    def dedup_store_node(state: Dict[str, Any]) -> Dict[str, Any]:
+        signature = state.get("news_signature")
+        results = state.get("intermediate_results") or {}
+        # Sem assinatura (dedup desligado) ou com erro em alguma etapa: nada a guardar
+        if not signature or state.get("error") or any(str(r).startswith("Erro") for r in results.values()):
+            return {}
+        news_id = get_index(index_name).add(signature, {
+            "final_response": state.get("final_response"),
+            "intermediate_results": results,
+        })
+        return {"news_id": news_id, "news_signature": None}
+
+    return dedup_check_node, dedup_store_node
+
+
+def route_after_dedup(state: Dict[str, Any]) -> str:
+    return "duplicate" if state.get("duplicate_of") else "new"
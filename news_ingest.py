@@ -0,0 +1,413 @@
+"""
+Ingestão contínua de notícias para o news_workflow.
+
+Fontes:
+    dir:<pasta>              arquivos .txt/.json novos na pasta (um por notícia)
+    jsonl:<arquivo>          linhas acrescentadas a um arquivo JSON Lines (tail)
+    socket:<host>:<porta>    conexões TCP com uma notícia por linha (texto ou JSON)
+
+Linhas/arquivos JSON usam o campo "original_news" (ou "text"); o restante segue
+para a saída como metadado.
+
+Pipeline: fonte -> fila limitada -> N workers (graph.ainvoke) -> fila limitada -> saída.
+Quando a análise fica para trás as filas enchem e a fonte para de ler (backpressure;
+no socket, o TCP segura o remetente). Os offsets só são gravados depois que a saída
+escreveu todos os registros anteriores, então um reinício retoma de onde parou
+(pelo menos uma vez; o socket não tem como reenviar). Métricas de lag e vazão são
+logadas a cada --metrics-interval segundos e, opcionalmente, gravadas em --metrics-file.
+
+Na fonte dir:, um arquivo só é lido depois que tamanho e mtime ficam estáveis por
+--settle-seconds; arquivos ocultos (.nome) são ignorados. Quem grava deve usar um
+nome temporário oculto ou com outra extensão e renomear ao terminar.
+
+Exemplos:
+    python news_ingest.py jsonl:feed.jsonl --output analises.jsonl
+    python news_ingest.py dir:entrada/ --workers 8 --queue-size 32
+    python news_ingest.py socket:127.0.0.1:9009 --graph newscollab
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+LANGGRAPH_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "langgraph.json")
+
+DEFAULT_GRAPH = "news_collab_llm:news_workflow"
+DEFAULT_OFFSETS_FILE = ".news_ingest_offsets.json"
+POLL_SECONDS = 0.5
+TEXT_SUFFIXES = (".txt", ".json")
+# Segundos sem mudança de tamanho/mtime antes de ler um arquivo da fonte dir:
+FILE_SETTLE_SECONDS = 2.0
+# Latências mais recentes usadas nos percentis das métricas
+LATENCY_WINDOW = 1000
+
+
+def load_graph(spec: str):
+    """Nome de langgraph.json (ex.: newscollab) ou módulo:atributo."""
+    if ":" not in spec:
+        with open(LANGGRAPH_CONFIG, encoding="utf-8") as f:
+            spec = json.load(f)["graphs"][spec]
+    module_name, attr = spec.split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def parse_payload(raw: str) -> Dict[str, Any] | None:
+    """Converte texto ou JSON em {"original_news": ..., "metadata": {...}}; None se vazio."""
+    raw = raw.strip()
+    if not raw:
+        return None
+    if raw.startswith("{"):
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict):
+            news = data.pop("original_news", None) or data.pop("text", None)
+            return {"original_news": news, "metadata": data} if news else None
+    return {"original_news": raw, "metadata": {}}
+
+
+class Record:
+    """Uma notícia lida da fonte, com a posição (offset) a gravar depois de processada."""
+
+    __slots__ = ("seq", "offset", "payload", "ingested_at", "result", "error")
+
+    def __init__(self, seq: int, offset: Any, payload: Dict[str, Any]):
+        self.seq = seq
+        self.offset = offset
+        self.payload = payload
+        self.ingested_at = time.time()
+        self.result: Dict[str, Any] | None = None
+        self.error: str | None = None
+
+
+class OffsetStore:
+    """Offsets por fonte em um arquivo JSON (escrita atômica)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.offsets: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            self.offsets = {}
+
+    def get(self, key: str) -> Any:
+        return self.offsets.get(key)
+
+    def commit(self, key: str, offset: Any) -> None:
+        self.offsets[key] = offset
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.offsets, f)
+        os.replace(tmp_path, self.path)
+
+
+class JsonlSource:
+    """Acompanha um arquivo JSON Lines; o offset é a posição em bytes após a última linha."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = f"jsonl:{os.path.abspath(path)}"
+
+    async def records(self, start: Any) -> AsyncIterator[Tuple[Any, Dict[str, Any] | None]]:
+        position = int(start or 0)
+        while not os.path.exists(self.path):
+            await asyncio.sleep(POLL_SECONDS)
+        with open(self.path, "rb") as f:
+            if position > os.fstat(f.fileno()).st_size:
+                # Arquivo truncado/rotacionado: recomeça do início
+                position = 0
+            f.seek(position)
+            pending = b""
+            while True:
+                chunk = f.readline()
+                if not chunk:
+                    await asyncio.sleep(POLL_SECONDS)
+                    continue
+                pending += chunk
+                if not pending.endswith(b"\n"):
+                    # Linha ainda sendo escrita
+                    continue
+                position += len(pending)
+                line, pending = pending.decode("utf-8", errors="replace"), b""
+                yield position, parse_payload(line)
+
+    def lag(self, committed: Any) -> Dict[str, Any]:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return {}
+        return {"lag_bytes": max(0, size - int(committed or 0))}
+
+
+class DirectorySource:
+    """
+    Arquivos novos em uma pasta, em ordem de chegada; o offset é o último (ctime_ns, nome).
+    O ctime muda quando o arquivo entra na pasta (mv, cp -p, rsync -a preservam o mtime
+    antigo, mas não o ctime), então um arquivo movido para cá nunca fica atrás do offset.
+    """
+
+    def __init__(self, path: str, settle_seconds: float = FILE_SETTLE_SECONDS):
+        self.path = path
+        self.key = f"dir:{os.path.abspath(path)}"
+        self.settle_seconds = settle_seconds
+        # nome -> ((tamanho, mtime_ns, ctime_ns), quando foi visto assim pela primeira vez)
+        self._observed: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def _scan(self, after: Any) -> List[Tuple[int, str, int, int]]:
+        watermark = tuple(after) if after else (0, "")
+        entries = []
+        for name in os.listdir(self.path):
+            if name.startswith(".") or not name.endswith(TEXT_SUFFIXES):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            if (stat.st_ctime_ns, name) > watermark:
+                entries.append((stat.st_ctime_ns, name, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries)
+
+    def _pending(self, after: Any) -> List[Tuple[int, str]]:
+        """Arquivos prontos para leitura: só o prefixo estável, para o watermark não pular nenhum."""
+        now = time.monotonic()
+        observed, ready, settling = {}, [], False
+        for ctime_ns, name, size, mtime_ns in self._scan(after):
+            signature = (size, mtime_ns, ctime_ns)
+            previous = self._observed.get(name)
+            first_seen = previous[1] if previous and previous[0] == signature else now
+            observed[name] = (signature, first_seen)
+            if now - first_seen < self.settle_seconds:
+                settling = True
+            if not settling:
+                ready.append((ctime_ns, name))
+        self._observed = observed
+        return ready
+
+    async def records(self, start: Any) -> AsyncIterator[Tuple[Any, Dict[str, Any] | None]]:
+        watermark = tuple(start) if start else None
+        os.makedirs(self.path, exist_ok=True)
+        while True:
+            pending = self._pending(watermark)
+            if not pending:
+                await asyncio.sleep(POLL_SECONDS)
+                continue
+            for ctime_ns, name in pending:
+                try:
+                    with open(os.path.join(self.path, name), encoding="utf-8", errors="replace") as f:
+                        payload = parse_payload(f.read())
+                except OSError:
+                    payload = None
+                watermark = (ctime_ns, name)
+                yield list(watermark), payload
+
+    def lag(self, committed: Any) -> Dict[str, Any]:
+        return {"lag_files": len(self._scan(committed))}
+
+
+class SocketSource:
+    """Servidor TCP: uma notícia por linha. Sem reenvio, então não há offset a retomar."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.key = f"socket:{host}:{port}"
+        self._lines: asyncio.Queue | None = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                # Fila cheia: para de ler e o TCP segura o remetente
+                await self._lines.put(line.decode("utf-8", errors="replace"))
+        finally:
+            writer.close()
+
+    async def records(self, start: Any) -> AsyncIterator[Tuple[Any, Dict[str, Any] | None]]:
+        self._lines = asyncio.Queue(maxsize=1)
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        logging.info(f"Aguardando notícias em {self.host}:{self.port}")
+        async with server:
+            received = 0
+            while True:
+                line = await self._lines.get()
+                received += 1
+                yield received, parse_payload(line)
+
+    def lag(self, committed: Any) -> Dict[str, Any]:
+        return {}
+
+
+def make_source(spec: str, settle_seconds: float = FILE_SETTLE_SECONDS):
+    kind, _, target = spec.partition(":")
+    if kind == "jsonl":
+        return JsonlSource(target)
+    if kind == "dir":
+        return DirectorySource(target, settle_seconds)
+    if kind == "socket":
+        host, _, port = target.rpartition(":")
+        return SocketSource(host or "127.0.0.1", int(port))
+    raise ValueError(f"Fonte inválida: {spec}. Use dir:, jsonl: ou socket:")
+
+
+class IngestPipeline:
+    """Fonte -> análise (N workers) -> saída, com filas limitadas e offsets confirmados em ordem."""
+
+    def __init__(self, source, graph, output: str | None, offsets: OffsetStore, workers: int = 4,
+                 queue_size: int = 16, metrics_interval: float = 10.0, metrics_file: str | None = None):
+        self.source = source
+        self.graph = graph
+        self.output = output
+        self.offsets = offsets
+        self.workers = workers
+        self.metrics_interval = metrics_interval
+        self.metrics_file = metrics_file
+        self.analysis_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.output_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.counters = {"ingested": 0, "skipped": 0, "processed": 0, "failed": 0, "committed": 0}
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._seq = 0
+        self._next_commit = 1
+        self._done: Dict[int, Record] = {}
+        self._started_at = time.time()
+        self._last_report = (self._started_at, 0)
+
+    async def _ingest(self) -> None:
+        async for offset, payload in self.source.records(self.offsets.get(self.source.key)):
+            self._seq += 1
+            record = Record(self._seq, offset, payload)
+            if payload is None:
+                # Entrada vazia/ inválida: não vai ao grafo, mas o offset avança
+                self.counters["skipped"] += 1
+                await self.output_queue.put(record)
+                continue
+            self.counters["ingested"] += 1
+            # Bloqueia quando a análise está atrasada (backpressure até a fonte)
+            await self.analysis_queue.put(record)
+
+    async def _analyze(self) -> None:
+        while True:
+            record = await self.analysis_queue.get()
+            try:
+                record.result = await self.graph.ainvoke({"original_news": record.payload["original_news"]})
+                self.counters["processed"] += 1
+            except Exception as e:
+                logging.error(f"Falha ao analisar o registro {record.seq}: {e}")
+                record.error = f"{type(e).__name__}: {e}"
+                self.counters["failed"] += 1
+            finally:
+                self.analysis_queue.task_done()
+            self.latencies.append(time.time() - record.ingested_at)
+            await self.output_queue.put(record)
+
+    def _write(self, out, record: Record) -> None:
+        if record.payload is None:
+            return
+        result = record.result or {}
+        out.write(json.dumps({
+            "source": self.source.key,
+            "offset": record.offset,
+            "metadata": record.payload["metadata"],
+            "final_response": result.get("final_response"),
+            "duplicate_of": result.get("duplicate_of"),
+            "tier": result.get("triage_tier"),
+            "error": record.error or result.get("error"),
+        }, ensure_ascii=False, default=str) + "\n")
+
+    async def _sink(self) -> None:
+        out = open(self.output, "a", encoding="utf-8") if self.output else sys.stdout
+        try:
+            while True:
+                record = await self.output_queue.get()
+                self._write(out, record)
+                out.flush()
+                # Confirma apenas o prefixo contíguo: um registro lento segura os offsets seguintes
+                self._done[record.seq] = record
+                committed = None
+                while self._next_commit in self._done:
+                    committed = self._done.pop(self._next_commit)
+                    self._next_commit += 1
+                if committed is not None:
+                    self.offsets.commit(self.source.key, committed.offset)
+                    self.counters["committed"] = committed.seq
+                self.output_queue.task_done()
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        last_at, last_processed = self._last_report
+        done = self.counters["processed"] + self.counters["failed"]
+        recent = sorted(self.latencies)
+        self._last_report = (now, done)
+        return {
+            **self.counters,
+            "analysis_queue": self.analysis_queue.qsize(),
+            "output_queue": self.output_queue.qsize(),
+            "in_flight_records": self._seq - self.counters["committed"],
+            "throughput_per_s": round((done - last_processed) / max(now - last_at, 1e-9), 3),
+            "avg_throughput_per_s": round(done / max(now - self._started_at, 1e-9), 3),
+            "latency_p50_s": round(recent[len(recent) // 2], 3) if recent else None,
+            "latency_p95_s": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else None,
+            **self.source.lag(self.offsets.get(self.source.key)),
+        }
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            metrics = self.metrics()
+            logging.info("métricas " + json.dumps(metrics))
+            if self.metrics_file:
+                with open(self.metrics_file, "w", encoding="utf-8") as f:
+                    json.dump({"at": time.time(), **metrics}, f, indent=2)
+
+    async def run(self) -> None:
+        tasks = [asyncio.create_task(self._sink()), asyncio.create_task(self._report())]
+        tasks += [asyncio.create_task(self._analyze()) for _ in range(self.workers)]
+        ingest = asyncio.create_task(self._ingest())
+        try:
+            # As fontes são infinitas: termina só por erro ou Ctrl+C
+            await asyncio.gather(ingest, *tasks)
+        finally:
+            for task in [ingest, *tasks]:
+                task.cancel()
+            await asyncio.gather(ingest, *tasks, return_exceptions=True)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Ingestão contínua de notícias para o news_workflow")
+    parser.add_argument("source", help="dir:<pasta> | jsonl:<arquivo> | socket:<host>:<porta>")
+    parser.add_argument("--graph", default=DEFAULT_GRAPH, help="nome em langgraph.json ou módulo:atributo")
+    parser.add_argument("--output", default=None, help="arquivo JSON Lines de saída (padrão: stdout)")
+    parser.add_argument("--offsets", default=DEFAULT_OFFSETS_FILE, help="arquivo com os offsets confirmados")
+    parser.add_argument("--workers", type=int, default=4, help="análises simultâneas")
+    parser.add_argument("--queue-size", type=int, default=16, help="capacidade de cada fila interna")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    parser.add_argument("--settle-seconds", type=float, default=FILE_SETTLE_SECONDS,
+                        help="fonte dir: espera o arquivo ficar este tempo sem mudar antes de lê-lo")
+    parser.add_argument("--metrics-file", default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    pipeline = IngestPipeline(
+        make_source(args.source, args.settle_seconds), load_graph(args.graph), args.output, OffsetStore(args.offsets),
+        workers=args.workers, queue_size=args.queue_size,
+        metrics_interval=args.metrics_interval, metrics_file=args.metrics_file,
+    )
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        logging.info("Ingestão interrompida; offsets confirmados até o registro %s", pipeline.counters["committed"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
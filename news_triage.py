@@ -0,0 +1,193 @@
+"""
+Triagem de notícias por custo no news_collab_llm.
+
+Antes do planner, cada notícia é classificada só com atributos locais (tamanho,
+idioma, densidade de palavras-chave, números, tamanho das frases) por uma
+regressão logística pequena. O escore escolhe um de três níveis:
+
+    deterministic   nós baratos do news_collab (sem LLM): avisos curtos e itens quase vazios
+    fast            NEWS_TRIAGE_FAST_MODEL (padrão gpt_4o_mini)
+    full            gpt_4o, como antes
+
+Por execução: config={"configurable": {"news_tier": "full"}} força um nível;
+NEWS_TRIAGE=0 manda tudo para full. Pesos e limiares podem ser trocados por um
+JSON em NEWS_TRIAGE_MODEL (mesmas chaves de DEFAULT_CLASSIFIER). Contagens e
+latência por nível: triage_report().
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+from langchain_core.runnables.config import ensure_config
+
+NEWS_TRIAGE_ENV = "NEWS_TRIAGE"
+TIERS = ("deterministic", "fast", "full")
+TIER_MODELS = {
+    "fast": os.getenv("NEWS_TRIAGE_FAST_MODEL", "gpt_4o_mini"),
+    "full": "gpt_4o",
+}
+# Abaixo disso não há o que analisar, qualquer que seja o escore
+MIN_WORDS = 25
+# Latências mais recentes usadas nos percentis de cada nível
+LATENCY_WINDOW = 1000
+
+# O tamanho pesa pouco (um artigo longo de rotina continua em fast); quem leva ao
+# modelo completo é a densidade de temas sensíveis
+DEFAULT_CLASSIFIER = {
+    "bias": -2.7,
+    "weights": {
+        "log_words": 0.3,
+        "keyword_density": 25.0,
+        "number_density": 3.0,
+        "avg_sentence_words": 0.03,
+    },
+    # escore < deterministic_below -> deterministic; escore >= full_from -> full
+    "deterministic_below": 0.3,
+    "full_from": 0.75,
+}
+
+_STOPWORDS = {
+    "pt": {"de", "que", "não", "uma", "para", "com", "os", "as", "no", "na", "do", "da", "dos", "das", "em", "por", "foi", "ao", "mais", "também"},
+    "en": {"the", "of", "and", "to", "in", "is", "that", "for", "on", "with", "was", "by", "are", "it", "this", "from"},
+    "es": {"el", "los", "las", "del", "que", "para", "con", "por", "una", "fue", "en", "más", "pero", "está", "como"},
+}
+# Temas em que vieses e impacto pesam mais na análise
+_KEYWORDS = {
+    "governo", "presidente", "ministro", "ministério", "congresso", "senado", "câmara", "stf", "tribunal",
+    "eleição", "eleições", "lei", "projeto", "reforma", "economia", "inflação", "juros", "mercado",
+    "orçamento", "imposto", "impostos", "crise", "guerra", "conflito", "saúde", "vacina", "polícia",
+    "investigação", "denúncia", "corrupção", "partido", "oposição", "decisão", "acordo", "sanções",
+    "government", "president", "election", "court", "economy", "inflation", "war", "policy",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SENTENCE = re.compile(r"[.!?]+(?:\s|$)")
+_NUMBER = re.compile(r"\d")
+
+
+def triage_enabled() -> bool:
+    return os.getenv(NEWS_TRIAGE_ENV, "1") not in ("", "0", "false", "off")
+
+
+def _load_classifier() -> Dict[str, Any]:
+    path = os.getenv("NEWS_TRIAGE_MODEL")
+    if not path:
+        return DEFAULT_CLASSIFIER
+    with open(path, encoding="utf-8") as f:
+        return {**DEFAULT_CLASSIFIER, **json.load(f)}
+
+
+CLASSIFIER = _load_classifier()
+
+
+def detect_language(words: List[str]) -> str:
+    """Idioma com mais stopwords entre pt/en/es; 'unknown' se nenhuma aparece."""
+    hits = {lang: sum(1 for word in words if word in stopwords) for lang, stopwords in _STOPWORDS.items()}
+    lang, count = max(hits.items(), key=lambda item: item[1])
+    return lang if count else "unknown"
+
+
+def features(text: str) -> Dict[str, Any]:
+    words = _WORD.findall(text.lower())
+    sentences = max(1, len(_SENTENCE.findall(text)))
+    count = len(words)
+    return {
+        "chars": len(text),
+        "words": count,
+        "language": detect_language(words),
+        "log_words": math.log(count) if count else 0.0,
+        "keyword_density": sum(1 for word in words if word in _KEYWORDS) / count if count else 0.0,
+        "number_density": sum(1 for word in words if _NUMBER.search(word)) / count if count else 0.0,
+        "avg_sentence_words": count / sentences,
+    }
+
+
+def score(feats: Dict[str, Any], classifier: Dict[str, Any] = CLASSIFIER) -> float:
+    """Probabilidade de a notícia precisar do modelo completo."""
+    z = classifier["bias"] + sum(weight * feats[name] for name, weight in classifier["weights"].items())
+    return 1 / (1 + math.exp(-z))
+
+
+def classify(text: str) -> Dict[str, Any]:
+    feats = features(text)
+    probability = score(feats)
+    if feats["words"] < MIN_WORDS or feats["language"] == "unknown" or probability < CLASSIFIER["deterministic_below"]:
+        tier = "deterministic"
+    elif probability >= CLASSIFIER["full_from"]:
+        tier = "full"
+    else:
+        tier = "fast"
+    return {"tier": tier, "score": round(probability, 3), "features": feats}
+
+
+class TriageStats:
+    """Contagem e latência (da triagem à síntese) por nível; percentis sobre as últimas LATENCY_WINDOW."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, List[float]] = {tier: [0, 0.0] for tier in TIERS}
+        self._latencies: Dict[str, deque] = {tier: deque(maxlen=LATENCY_WINDOW) for tier in TIERS}
+
+    def record(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(tier, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            self._latencies.setdefault(tier, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            totals = {tier: tuple(values) for tier, values in self._totals.items()}
+            latencies = {tier: sorted(values) for tier, values in self._latencies.items()}
+        report = {}
+        for tier, values in latencies.items():
+            count, total_seconds = totals[tier]
+            report[tier] = {
+                "count": count,
+                "avg_s": round(total_seconds / count, 3) if count else None,
+                "p50_s": round(values[len(values) // 2], 3) if values else None,
+                "p95_s": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3) if values else None,
+            }
+        return report
+
+
+_stats = TriageStats()
+
+
+def record_tier(state: Dict[str, Any]) -> float | None:
+    """Registra a latência da execução no nível escolhido; devolve os segundos."""
+    started_at = state.get("triage_started_at")
+    if not started_at or not state.get("triage_tier"):
+        return None
+    seconds = time.time() - started_at
+    _stats.record(state["triage_tier"], seconds)
+    return round(seconds, 3)
+
+
+def triage_report() -> Dict[str, Dict[str, Any]]:
+    return _stats.report()
+
+
+def triage_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    started_at = time.time()
+    forced = ensure_config().get("configurable", {}).get("news_tier")
+    if forced in TIERS:
+        return {"triage_tier": forced, "triage_score": None, "triage_features": None, "triage_started_at": started_at}
+    if not triage_enabled():
+        return {"triage_tier": "full", "triage_score": None, "triage_features": None, "triage_started_at": started_at}
+    result = classify(state.get("original_news", ""))
+    return {
+        "triage_tier": result["tier"],
+        "triage_score": result["score"],
+        "triage_features": result["features"],
+        "triage_started_at": started_at,
+    }
+
+
+def model_for(state: Dict[str, Any]) -> str:
+    """Chave em models.models para o nível da execução (full se não houve triagem)."""
+    return TIER_MODELS.get(state.get("triage_tier") or "full", TIER_MODELS["full"])
@@ -0,0 +1,273 @@
+"""
+Estimativa de tempo, tokens e custo de um plano do fire_collab antes de executá-lo.
+
+Cada tarefa executada (e cada síntese) grava uma linha no histórico
+PLAN_STATS_PATH (JSON Lines): tipo de especialista, modelo, segundos, tokens de
+entrada/saída, chamadas ao Firecrawl e se veio do cache de tarefas. A estimativa
+de um plano usa, por (specialist_type, modelo), a mediana e o p90 das últimas
+HISTORY_WINDOW execuções; sem histórico, os custos padrão de budget.py.
+Execuções que não medem o provedor real ficam fora do histórico: replay de
+cassete, chamadas sem tokens (seguidores do single-flight) e os dublês do
+loadtest, que gravam em um arquivo temporário (set_stats_path).
+
+    tempo   tarefas independentes (pesquisas seguidas) rodam em ondas de
+            `parallelism`; escritores esperam as anteriores. Padrão 1, o executor
+            sequencial atual (PLAN_PARALLELISM muda)
+    cache   cada tarefa pesa a taxa histórica de acertos do cache de tarefas
+    custo   tokens x PRICES_PER_MTOKEN do modelo + Firecrawl x FIRECRAWL_COST_PER_CALL
+
+Admissão: PLAN_MAX_SECONDS / PLAN_MAX_COST_USD, ou
+config={"configurable": {"admission": {"max_seconds": ..., "max_cost_usd": ...}}};
+admission_error() devolve o motivo da recusa (ou None). Resumo do histórico:
+
+    python plan_estimator.py
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List
+
+from langchain_core.runnables.config import ensure_config
+
+from agent_state import TaskSpec
+from budget import DEFAULT_TASK_COST, SYNTHESIS_RESERVE
+import cassette
+import task_cache
+
+PLAN_STATS_PATH = os.getenv("PLAN_STATS_PATH", ".plan_stats.jsonl")
+HISTORY_WINDOW = 200
+DEFAULT_PARALLELISM = int(os.getenv("PLAN_PARALLELISM", "1"))
+# Especialistas que não dependem dos resultados anteriores e podem rodar juntos
+INDEPENDENT_SPECIALISTS = {"researcher"}
+# Fração dos tokens que é de entrada, quando só há o total
+DEFAULT_INPUT_SHARE = 0.8
+CACHE_HIT_SECONDS = 0.05
+
+# US$ por milhão de tokens: (entrada, entrada em cache, saída)
+PRICES_PER_MTOKEN = {
+    "gpt_4o": (2.50, 1.25, 10.00),
+    "gpt_4o_mini": (0.15, 0.075, 0.60),
+    "o4": (1.10, 0.275, 4.40),
+    "gemini_2.5_flash": (0.15, 0.0375, 0.60),
+}
+FIRECRAWL_COST_PER_CALL = float(os.getenv("FIRECRAWL_COST_PER_CALL", "0.001"))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class PlanStats:
+    """Histórico de execuções por (specialist_type, modelo), em memória e em log append-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=HISTORY_WINDOW))
+        self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._records[(record["specialist_type"], record["model"])].append(record)
+
+    def record(self, specialist_type: str, model: str, seconds: float, usage: Dict[str, Dict[str, int]],
+               firecrawl_calls: int = 0, cache_hit: bool = False) -> None:
+        record = {
+            "specialist_type": specialist_type,
+            "model": model,
+            "seconds": round(seconds, 3),
+            "input_tokens": sum(entry["input_tokens"] for entry in usage.values()),
+            "cached_input_tokens": sum(entry["cached_input_tokens"] for entry in usage.values()),
+            "output_tokens": sum(entry["output_tokens"] for entry in usage.values()),
+            "firecrawl_calls": firecrawl_calls,
+            "cache_hit": cache_hit,
+            "at": time.time(),
+        }
+        with self._lock:
+            self._load()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._records[(specialist_type, model)].append(record)
+
+    def profile(self, specialist_type: str, model: str) -> Dict[str, Any]:
+        """Custo típico de uma tarefa (sem acerto de cache) e a taxa de acertos do cache."""
+        with self._lock:
+            self._load()
+            records = list(self._records.get((specialist_type, model), ()))
+            if not records:
+                # Mesmo tipo com outro modelo ainda diz algo sobre tempo e tokens
+                records = [r for (kind, _), values in self._records.items() if kind == specialist_type for r in values]
+        executed = [r for r in records if not r["cache_hit"]]
+        hit_rate = (len(records) - len(executed)) / len(records) if records else 0.0
+        if not executed:
+            default = DEFAULT_TASK_COST.get(specialist_type) or {
+                "seconds": SYNTHESIS_RESERVE["seconds"], "tokens": SYNTHESIS_RESERVE["tokens"], "firecrawl_calls": 0,
+            }
+            return {
+                "seconds": default["seconds"],
+                "seconds_p90": default["seconds"] * 1.5,
+                "input_tokens": default["tokens"] * DEFAULT_INPUT_SHARE,
+                "cached_input_tokens": 0.0,
+                "output_tokens": default["tokens"] * (1 - DEFAULT_INPUT_SHARE),
+                "firecrawl_calls": default["firecrawl_calls"],
+                "cache_hit_rate": hit_rate,
+                "samples": 0,
+            }
+        mean = lambda key: sum(r[key] for r in executed) / len(executed)
+        seconds = [r["seconds"] for r in executed]
+        return {
+            "seconds": _percentile(seconds, 0.5),
+            "seconds_p90": _percentile(seconds, 0.9),
+            "input_tokens": mean("input_tokens"),
+            "cached_input_tokens": mean("cached_input_tokens"),
+            "output_tokens": mean("output_tokens"),
+            "firecrawl_calls": mean("firecrawl_calls"),
+            "cache_hit_rate": hit_rate,
+            "samples": len(executed),
+        }
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            keys = list(self._records)
+        return {f"{kind}/{model}": self.profile(kind, model) for kind, model in keys}
+
+
+_stats = PlanStats(PLAN_STATS_PATH)
+
+
+def set_stats_path(path: str) -> None:
+    """Troca o arquivo do histórico do processo (ex.: o loadtest grava em um arquivo temporário)."""
+    global _stats
+    _stats = PlanStats(path)
+
+
+def record_task(specialist_type: str, model: str, seconds: float, usage: Dict[str, Dict[str, int]],
+                firecrawl_calls: int = 0, cache_hit: bool = False) -> None:
+    """Grava a execução de uma tarefa no histórico; falhas de escrita só são ignoradas."""
+    active_cassette = cassette.active()
+    if active_cassette is not None and active_cassette.mode == "replay":
+        # Latência e tokens do replay não são os do provedor
+        return
+    if not cache_hit and not any(entry["input_tokens"] + entry["output_tokens"] for entry in usage.values()):
+        # Resposta compartilhada pelo single-flight (ou sem LLM): não diz quanto a tarefa custa
+        return
+    try:
+        _stats.record(specialist_type, model, seconds, usage, firecrawl_calls, cache_hit)
+    except OSError:
+        pass
+
+
+def _cost(model: str, input_tokens: float, cached_input_tokens: float, output_tokens: float, firecrawl_calls: float) -> float:
+    price_input, price_cached, price_output = PRICES_PER_MTOKEN.get(model, PRICES_PER_MTOKEN["gpt_4o"])
+    uncached = max(input_tokens - cached_input_tokens, 0)
+    tokens_cost = (uncached * price_input + cached_input_tokens * price_cached + output_tokens * price_output) / 1_000_000
+    return tokens_cost + firecrawl_calls * FIRECRAWL_COST_PER_CALL
+
+
+def _task_estimate(task_id: str, specialist_type: str, model: str) -> Dict[str, Any]:
+    profile = _stats.profile(specialist_type, model)
+    # Valor esperado: com probabilidade hit_rate a tarefa sai do cache, quase de graça
+    miss = 1 - profile["cache_hit_rate"] if task_cache.cache_enabled() else 1.0
+    return {
+        "task_id": task_id,
+        "specialist_type": specialist_type,
+        "model": model,
+        "seconds": miss * profile["seconds"] + (1 - miss) * CACHE_HIT_SECONDS,
+        "seconds_p90": miss * profile["seconds_p90"] + (1 - miss) * CACHE_HIT_SECONDS,
+        "tokens": miss * (profile["input_tokens"] + profile["output_tokens"]),
+        "firecrawl_calls": miss * profile["firecrawl_calls"],
+        "cost_usd": miss * _cost(model, profile["input_tokens"], profile["cached_input_tokens"],
+                                 profile["output_tokens"], profile["firecrawl_calls"]),
+        "cache_hit_rate": round(1 - miss, 3),
+        "samples": profile["samples"],
+    }
+
+
+def _wall_time(tasks: List[Dict[str, Any]], key: str, parallelism: int) -> float:
+    """Tarefas independentes seguidas formam uma onda; escritores são barreiras."""
+    total, wave = 0.0, []
+
+    def flush():
+        if wave:
+            # Limite inferior de um escalonamento em `parallelism` filas
+            total_wave = max(max(wave), sum(wave) / parallelism)
+            wave.clear()
+            return total_wave
+        return 0.0
+
+    for task in tasks:
+        if task["specialist_type"] in INDEPENDENT_SPECIALISTS:
+            wave.append(task[key])
+        else:
+            total += flush() + task[key]
+    return total + flush()
+
+
+def estimate_plan(plan: List[TaskSpec], models_by_specialist: Dict[str, str],
+                  parallelism: int | None = None) -> Dict[str, Any]:
+    """Estimativa do plano, incluindo a síntese (que sempre roda)."""
+    parallelism = max(1, parallelism or DEFAULT_PARALLELISM)
+    default_model = models_by_specialist.get("synthesis", "gpt_4o")
+    tasks = [
+        _task_estimate(task.task_id, task.specialist_type,
+                       models_by_specialist.get(task.specialist_type, default_model))
+        for task in plan
+    ]
+    synthesis = _task_estimate("synthesis", "synthesis", default_model)
+    timeline = tasks + [synthesis]
+    return {
+        "seconds": round(_wall_time(timeline, "seconds", parallelism), 1),
+        "seconds_p90": round(_wall_time(timeline, "seconds_p90", parallelism), 1),
+        "tokens": int(sum(t["tokens"] for t in timeline)),
+        "firecrawl_calls": round(sum(t["firecrawl_calls"] for t in timeline), 1),
+        "cost_usd": round(sum(t["cost_usd"] for t in timeline), 4),
+        "parallelism": parallelism,
+        "samples": min(t["samples"] for t in timeline),
+        "tasks": [
+            {**t, "seconds": round(t["seconds"], 1), "seconds_p90": round(t["seconds_p90"], 1),
+             "tokens": int(t["tokens"]), "cost_usd": round(t["cost_usd"], 4)}
+            for t in timeline
+        ],
+    }
+
+
+def admission_limits() -> Dict[str, float]:
+    configured = ensure_config().get("configurable", {}).get("admission") or {}
+    return {
+        "max_seconds": float(configured.get("max_seconds", os.getenv("PLAN_MAX_SECONDS", "0"))),
+        "max_cost_usd": float(configured.get("max_cost_usd", os.getenv("PLAN_MAX_COST_USD", "0"))),
+    }
+
+
+def admission_error(estimate: Dict[str, Any], limits: Dict[str, float] | None = None) -> str | None:
+    """Motivo para recusar o plano, ou None; limites 0 ficam desativados."""
+    limits = limits or admission_limits()
+    if limits["max_seconds"] and estimate["seconds"] > limits["max_seconds"]:
+        return f"tempo estimado {estimate['seconds']}s acima do limite de {limits['max_seconds']:g}s"
+    if limits["max_cost_usd"] and estimate["cost_usd"] > limits["max_cost_usd"]:
+        return f"custo estimado US$ {estimate['cost_usd']} acima do limite de US$ {limits['max_cost_usd']:g}"
+    return None
+
+
+if __name__ == "__main__":
+    summary = _stats.summary()
+    if not summary:
+        print(f"Sem histórico em {PLAN_STATS_PATH}.")
+    for key, profile in sorted(summary.items()):
+        print(f"{key:32s} amostras={profile['samples']:4d}  p50={profile['seconds']:.1f}s  "
+              f"p90={profile['seconds_p90']:.1f}s  tokens={profile['input_tokens'] + profile['output_tokens']:.0f}  "
+              f"cache={profile['cache_hit_rate']:.0%}")
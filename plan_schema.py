@@ -0,0 +1,240 @@
+"""
+Esquema do plano do fire_collab e reparo local da resposta do planner.
+
+O planner pede saída estruturada ao provedor (PLAN_JSON_SCHEMA, ver
+models.LimitedChatModel.structured_output_kwargs). Quando o provedor não garante
+o formato, parse_plan conserta localmente, sem nova chamada ao LLM, os erros mais
+comuns: cercas de markdown, texto em volta do JSON, vírgulas sobrando, aspas
+tipográficas, True/False/None do Python, colchetes não fechados, chaves com
+caracteres a mais ("specialist_type*", "description:") ou sinônimos ("type", "id",
+"tasks"), quebras de linha cruas dentro das descrições. O resultado é validado pelos
+modelos pydantic abaixo, tarefa por tarefa: uma tarefa inválida é descartada com aviso
+no log e o plano só falha se nenhuma sobrar. Uma resposta truncada perde as tarefas
+incompletas: parse_plan também avisa no log quando isso acontece.
+"""
+import ast
+import json
+import logging
+import re
+from typing import Any, Dict, List, Literal, Tuple
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+SPECIALIST_TYPES = ("researcher", "writer")
+PRIORITIES = ("high", "medium", "low")
+MAX_PLAN_TASKS = 12
+
+# Formato pedido ao provedor (modo estrito exige todos os campos e nenhum extra)
+PLAN_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "task_id": {"type": "string"},
+                    "specialist_type": {"type": "string", "enum": list(SPECIALIST_TYPES)},
+                    "description": {"type": "string"},
+                    "priority": {"type": "string", "enum": list(PRIORITIES)},
+                },
+                "required": ["task_id", "specialist_type", "description", "priority"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["plan"],
+    "additionalProperties": False,
+}
+
+_KEY_ALIASES = {
+    "task_id": "task_id", "taskid": "task_id", "id": "task_id",
+    "specialist_type": "specialist_type", "specialisttype": "specialist_type", "specialist": "specialist_type",
+    "type": "specialist_type", "agent": "specialist_type", "role": "specialist_type",
+    "description": "description", "desc": "description", "task": "description", "descricao": "description",
+    "priority": "priority", "prioridade": "priority",
+}
+_PLAN_KEYS = ("plan", "tasks", "steps", "plano", "tarefas")
+
+
+class PlanTask(BaseModel):
+    task_id: str
+    specialist_type: Literal["researcher", "writer"]
+    description: str
+    priority: Literal["high", "medium", "low"] = "medium"
+
+    @field_validator("specialist_type", mode="before")
+    @classmethod
+    def _lower(cls, value: Any) -> Any:
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def _known_priority(cls, value: Any) -> Any:
+        # Prioridade é só uma dica para o orçamento: valor estranho vira o padrão
+        value = value.strip().lower() if isinstance(value, str) else value
+        return value if value in PRIORITIES else "medium"
+
+    @field_validator("task_id", "description")
+    @classmethod
+    def _not_blank(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("campo vazio")
+        return value
+
+
+class Plan(BaseModel):
+    plan: List[PlanTask]
+
+    @field_validator("plan")
+    @classmethod
+    def _size(cls, tasks: List[PlanTask]) -> List[PlanTask]:
+        if not tasks:
+            raise ValueError("plano sem tarefas")
+        if len(tasks) > MAX_PLAN_TASKS:
+            raise ValueError(f"plano com mais de {MAX_PLAN_TASKS} tarefas")
+        return tasks
+
+
+def _json_start(text: str) -> str:
+    """Texto a partir do primeiro { ou [, sem cercas de markdown."""
+    text = re.sub(r"```(?:json)?", "", text).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text
+
+
+def _extract_json(text: str) -> str:
+    """Trecho entre o primeiro { ou [ e o último } ou ], sem cercas de markdown."""
+    text = _json_start(text)
+    end = max(text.rfind("}"), text.rfind("]"))
+    return text[:end + 1] if end > 0 else text
+
+
+def _unclosed(text: str) -> Tuple[List[str], bool]:
+    """Colchetes/chaves ainda abertos no fim do texto e se ele termina dentro de uma string."""
+    stack, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    return stack, in_string
+
+
+def _close_brackets(text: str) -> str:
+    """Fecha strings, colchetes e chaves deixados abertos (resposta truncada)."""
+    stack, in_string = _unclosed(text)
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def is_truncated(text: str) -> bool:
+    """A resposta acaba com o JSON ainda aberto (ex.: limite de tokens de saída)."""
+    stack, in_string = _unclosed(_json_start(text))
+    return bool(stack) or in_string
+
+
+# Literais de string JSON ou Python; o resto do texto é código
+_STRING_LITERAL = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')")
+
+
+def _pythonize(text: str) -> str:
+    """true/false/null -> True/False/None só fora das strings (descrições ficam intactas)."""
+    parts = _STRING_LITERAL.split(text)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\btrue\b", "True", re.sub(r"\bfalse\b", "False", re.sub(r"\bnull\b", "None", parts[i])))
+    return "".join(parts)
+
+
+def repair_json(text: str) -> Any:
+    """Tenta json.loads em versões cada vez mais consertadas do texto; levanta ValueError se nada servir."""
+    candidate = _extract_json(text)
+    candidate = candidate.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    attempts = [candidate]
+    # Vírgula antes de } ou ]
+    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    attempts.append(candidate)
+    candidate = _close_brackets(candidate)
+    attempts.append(re.sub(r",\s*([}\]])", r"\1", candidate))
+    for attempt in attempts:
+        try:
+            # strict=False aceita quebras de linha e tabs crus dentro das strings
+            return json.loads(attempt, strict=False)
+        except ValueError:
+            continue
+    # Aspas simples e True/False/None: literal do Python
+    try:
+        return ast.literal_eval(_pythonize(attempts[-1]))
+    except (ValueError, SyntaxError) as e:
+        raise ValueError(f"resposta do planner não é JSON: {e}") from e
+
+
+def _normalize_key(key: Any) -> str:
+    cleaned = re.sub(r"[^a-z_]", "", str(key).lower().replace(" ", "_").replace("-", "_"))
+    return _KEY_ALIASES.get(cleaned) or _KEY_ALIASES.get(cleaned.replace("_", ""), cleaned)
+
+
+def normalize_plan(data: Any) -> Dict[str, Any]:
+    """Leva formatos próximos ao esperado para {"plan": [{task_id, specialist_type, description, priority}]}."""
+    if isinstance(data, list):
+        data = {"plan": data}
+    if not isinstance(data, dict):
+        raise ValueError("resposta do planner não é um objeto JSON")
+    tasks = next((data[key] for key in data if _normalize_key(key) in _PLAN_KEYS), None)
+    if not isinstance(tasks, list):
+        raise ValueError('resposta do planner sem a lista "plan"')
+    normalized, seen_ids = [], set()
+    for index, task in enumerate(tasks, start=1):
+        if not isinstance(task, dict):
+            continue
+        task = {_normalize_key(key): value for key, value in task.items()}
+        task_id = str(task.get("task_id") or f"task_{index}")
+        # IDs repetidos sobrescreveriam resultados intermediários
+        while task_id in seen_ids:
+            task_id = f"{task_id}_{index}"
+        seen_ids.add(task_id)
+        normalized.append({**task, "task_id": task_id})
+    return {"plan": normalized}
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors())
+
+
+def parse_plan(text: str) -> List[Dict[str, str]]:
+    """Plano validado a partir da resposta do planner; levanta ValueError com o motivo."""
+    truncated = False
+    try:
+        data = json.loads(text, strict=False)
+    except ValueError:
+        data = repair_json(text)
+        truncated = is_truncated(text)
+    valid, problems = [], []
+    for task in normalize_plan(data)["plan"]:
+        try:
+            valid.append(PlanTask.model_validate(task))
+        except ValidationError as e:
+            problems.append(f"{task['task_id']}: {_describe(e)}")
+    if problems and valid:
+        # Uma tarefa malformada não derruba o plano inteiro, como as truncadas
+        logging.warning(f"Plano do planner com tarefa(s) inválida(s) descartada(s): {'; '.join(problems)}")
+    try:
+        plan = Plan(plan=valid)
+    except ValidationError as e:
+        raise ValueError(f"plano inválido ({'; '.join(problems + [_describe(e)])})") from e
+    if truncated:
+        # O reparo fecha o JSON no último ponto válido: a tarefa que estava sendo escrita (e as seguintes) se perdem
+        logging.warning(
+            f"Resposta do planner truncada: plano reparado com {len(plan.plan)} tarefa(s) "
+            f"({', '.join(task.task_id for task in plan.plan)}); as tarefas incompletas foram descartadas."
+        )
+    return [task.model_dump() for task in plan.plan]
@@ -0,0 +1,174 @@
+"""
+Profiling de CPU por nó dos grafos, sob demanda.
+
+Ativação:
+    GRAPH_PROFILE=sample    amostragem das pilhas da thread do nó (padrão ao ativar com "1")
+    GRAPH_PROFILE=cprofile  profiler determinístico (cProfile)
+    ou por execução: config={"configurable": {"profile": "sample"}}
+
+Para cada execução são gravados em GRAPH_PROFILE_DIR/<run_id>/:
+    <seq>-<nó>.prof ou .txt   perfil de cada chamada de nó
+    flamegraph.folded          pilhas colapsadas (flamegraph.pl, speedscope, inferno)
+
+O run_id vem de configurable["run_id"] / configurable["thread_id"]; sem eles,
+as chamadas vão para o diretório "default". Desativado, o custo é uma consulta
+ao ambiente e ao config por chamada de nó.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict
+
+from langchain_core.runnables import RunnableConfig
+
+PROFILE_ENV = "GRAPH_PROFILE"
+PROFILE_DIR = os.getenv("GRAPH_PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.getenv("GRAPH_PROFILE_INTERVAL", "0.005"))
+MAX_STACK_DEPTH = 128
+MAX_TRACKED_RUNS = 256
+
+_lock = threading.Lock()
+_folded: Dict[str, Counter] = {}
+_sequence: Dict[str, int] = {}
+
+
+def profile_mode(config: RunnableConfig | None) -> str | None:
+    """Modo de profiling ativo para a chamada ('sample', 'cprofile') ou None."""
+    mode = (config or {}).get("configurable", {}).get("profile") or os.getenv(PROFILE_ENV)
+    if not mode or mode in ("0", "false", "off"):
+        return None
+    if mode is True or mode in ("1", "true", "on"):
+        return "sample"
+    return mode
+
+
+def _run_id(config: RunnableConfig | None) -> str:
+    configurable = (config or {}).get("configurable", {})
+    return str(configurable.get("run_id") or configurable.get("thread_id") or "default")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler:
+    """Amostra periodicamente a pilha de uma thread abaixo de um frame de referência."""
+
+    def __init__(self, thread_id: int, root_code, interval: float):
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.root_code and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _pstats_to_folded(stats: pstats.Stats) -> Counter:
+    """Converte um perfil determinístico em pilhas colapsadas (microssegundos de tempo próprio)."""
+    raw = stats.stats
+    callees: Dict[Any, Dict[Any, tuple]] = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, {})[func] = caller_stats
+    folded: Counter = Counter()
+
+    def label(func) -> str:
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    def walk(func, path, fraction: float) -> None:
+        _, _, tottime, cumtime, _ = raw[func]
+        path = path + (label(func),)
+        folded[path] += int(tottime * fraction * 1e6)
+        for callee, (_, _, _, callee_cum) in callees.get(func, {}).items():
+            if label(callee) in path or not cumtime:
+                continue
+            total_cum = raw[callee][3] or 1e-12
+            walk(callee, path, fraction * min(1.0, callee_cum / total_cum))
+
+    roots = [func for func, entry in raw.items() if not entry[4]]
+    for root in roots:
+        walk(root, (), 1.0)
+    return Counter({path: value for path, value in folded.items() if value > 0})
+
+
+def _write_profile(run_id: str, node_name: str, mode: str, profile_data: Any, folded: Counter) -> None:
+    run_dir = os.path.join(PROFILE_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    with _lock:
+        if run_id not in _folded and len(_folded) >= MAX_TRACKED_RUNS:
+            # Esquece a execução mais antiga (o arquivo .folded já está em disco)
+            oldest = next(iter(_folded))
+            _folded.pop(oldest)
+            _sequence.pop(oldest, None)
+        seq = _sequence[run_id] = _sequence.get(run_id, 0) + 1
+        run_folded = _folded.setdefault(run_id, Counter())
+        for stack, value in folded.items():
+            run_folded[(node_name,) + stack] += value
+        lines = [f"{';'.join(stack)} {value}" for stack, value in sorted(run_folded.items())]
+        with open(os.path.join(run_dir, "flamegraph.folded"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    base = os.path.join(run_dir, f"{seq:03d}-{node_name}")
+    if mode == "cprofile":
+        profile_data.dump_stats(base + ".prof")
+    else:
+        own = Counter()
+        for stack, count in folded.items():
+            own[stack[-1]] += count
+        total = sum(folded.values())
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"# {node_name}: {total} amostras a cada {SAMPLE_INTERVAL * 1000:.1f} ms\n")
+            for frame, count in own.most_common(50):
+                f.write(f"{count:6d} {100 * count / total:5.1f}%  {frame}\n")
+
+
+def profiled(node_name: str, fn: Callable) -> Callable:
+    """Envolve um nó para ser perfilado quando o profiling estiver ativo."""
+
+    def node(state, config: RunnableConfig):
+        mode = profile_mode(config)
+        if mode is None:
+            return fn(state)
+
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            result = profiler.runcall(fn, state)
+            profile_data = profiler
+            folded = _pstats_to_folded(pstats.Stats(profiler))
+        else:
+            with _StackSampler(threading.get_ident(), node.__code__, SAMPLE_INTERVAL) as sampler:
+                result = fn(state)
+            profile_data = sampler
+            folded = sampler.samples
+        try:
+            _write_profile(_run_id(config), node_name, mode, profile_data, folded)
+        except OSError as e:
+            logging.error(f"Não foi possível gravar o perfil do nó {node_name}: {e}")
+        return result
+
+    node.__name__ = getattr(fn, "__name__", node_name)
+    node.__doc__ = fn.__doc__
+    return node
@@ -0,0 +1,181 @@
+"""
+Expansão de consultas e fusão de resultados para o researcher do fire_collab.
+
+Descrições de tarefa longas, em português, rendem buscas fracas quando enviadas
+inteiras ao Firecrawl. expand_queries gera até MAX_QUERY_VARIANTS variantes:
+
+    local   (padrão) a descrição sem o verbo de instrução, as palavras-chave e
+            uma versão ancorada nos nomes próprios da tarefa/consulta; sem LLM
+    llm     uma chamada ao modelo rápido (QUERY_EXPANSION_MODEL); volta ao modo
+            local se a chamada falhar
+    off     só a descrição
+
+As buscas rodam em paralelo e as listas são combinadas por reciprocal rank fusion
+(fuse_results), com URLs normalizadas para remover duplicatas.
+Modo: RESEARCH_QUERY_EXPANSION ou config={"configurable": {"query_expansion": ...}}.
+"""
+import logging
+import os
+import re
+from typing import Any, Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables.config import ensure_config
+
+QUERY_EXPANSION_ENV = "RESEARCH_QUERY_EXPANSION"
+QUERY_EXPANSION_MODES = ("local", "llm", "off")
+QUERY_EXPANSION_MODEL = os.getenv("QUERY_EXPANSION_MODEL", "gpt_4o_mini")
+MAX_QUERY_VARIANTS = 3
+MAX_QUERY_CHARS = 200
+MAX_KEYWORDS = 6
+# Constante usual do RRF: reduz o peso das primeiras posições de cada lista
+RRF_K = 60
+
+_STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das", "em", "no", "na", "nos", "nas",
+    "para", "por", "pelo", "pela", "com", "sem", "sobre", "entre", "e", "ou", "que", "se", "sua", "seu", "suas", "seus",
+    "como", "mais", "mas", "ao", "aos", "à", "às", "é", "são", "ser", "foi", "este", "esta", "isso", "essa", "esse",
+    "the", "of", "and", "to", "in", "for", "on", "with",
+}
+# Verbos de instrução do planner: não ajudam a busca
+_INSTRUCTION_WORDS = {
+    "pesquise", "pesquisar", "busque", "buscar", "encontre", "encontrar", "liste", "listar", "descreva", "descrever",
+    "identifique", "identificar", "analise", "analisar", "levante", "levantar", "colete", "coletar", "investigue",
+    "investigar", "explique", "explicar", "resuma", "resumir", "informações", "informação", "dados", "detalhes",
+    "principais", "relacionados", "relacionadas", "incluindo", "também", "empresa", "tarefa",
+}
+_WORD = re.compile(r"[\wÀ-ÿ][\wÀ-ÿ.&-]*", re.UNICODE)
+# Só utm_ é prefixo; o resto é nome exato (ref não pode levar reference, refid, refresh)
+_TRACKING_PREFIXES = ("utm_",)
+_TRACKING_PARAMS = {"gclid", "fbclid", "ref"}
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def expansion_mode() -> str:
+    mode = ensure_config().get("configurable", {}).get("query_expansion") or os.getenv(QUERY_EXPANSION_ENV, "local")
+    return mode if mode in QUERY_EXPANSION_MODES else "local"
+
+
+def _truncate(text: str, limit: int = MAX_QUERY_CHARS) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit]
+
+
+def keywords(text: str) -> List[str]:
+    """Palavras de conteúdo na ordem em que aparecem, sem repetição."""
+    seen, result = set(), []
+    for word in _WORD.findall(text):
+        lower = word.lower().strip(".-")
+        if len(lower) < 3 or lower in _STOPWORDS or lower in _INSTRUCTION_WORDS or lower in seen:
+            continue
+        seen.add(lower)
+        result.append(word.strip(".-"))
+    return result
+
+
+def proper_nouns(text: str) -> List[str]:
+    """Palavras com inicial maiúscula fora do começo das frases (nomes de empresas, produtos, pessoas)."""
+    nouns, seen = [], set()
+    for sentence in re.split(r"[.!?:\n]+", text):
+        for word in _WORD.findall(sentence)[1:]:
+            word = word.strip(".-")
+            if word[:1].isupper() and word.lower() not in _STOPWORDS and word.lower() not in seen:
+                seen.add(word.lower())
+                nouns.append(word)
+    return nouns
+
+
+def _strip_instruction(description: str) -> str:
+    words = description.split()
+    while words and words[0].lower().strip(",:") in _INSTRUCTION_WORDS | _STOPWORDS:
+        words.pop(0)
+    return " ".join(words) or description
+
+
+def _dedup_queries(queries: List[str]) -> List[str]:
+    seen, result = set(), []
+    for query in queries:
+        key = " ".join(sorted(query.lower().split()))
+        if query and key not in seen:
+            seen.add(key)
+            result.append(query)
+    return result[:MAX_QUERY_VARIANTS]
+
+
+def local_variants(description: str, original_query: str | None = None) -> List[str]:
+    words = keywords(description)
+    entities = proper_nouns(f"{description}\n{original_query or ''}")
+    anchored = entities[:2] + [word for word in words if word not in entities][:3]
+    return _dedup_queries([
+        _truncate(_strip_instruction(description)),
+        " ".join(words[:MAX_KEYWORDS]),
+        " ".join(anchored),
+    ])
+
+
+def _llm_variants(description: str, original_query: str | None) -> List[str]:
+    from models import models
+
+    prompt = (
+        f"Gere {MAX_QUERY_VARIANTS} consultas curtas e diferentes entre si para um buscador web, "
+        "uma por linha, sem numeração nem comentários, que ajudem a cumprir a tarefa abaixo.\n"
+        f"Consulta original do usuário: {original_query or ''}\nTarefa: {description}"
+    )
+    response = models[QUERY_EXPANSION_MODEL].invoke([HumanMessage(content=prompt)])
+    # Só o marcador de lista no início; números do fim ("receita 2024") fazem parte da consulta
+    lines = [_LIST_MARKER.sub("", line).strip().strip("\"'") for line in response.content.splitlines()]
+    return [_truncate(line) for line in lines if line]
+
+
+def expand_queries(description: str, original_query: str | None = None) -> List[str]:
+    """Consultas de busca para a tarefa; a primeira é sempre a descrição (sem o verbo de instrução)."""
+    mode = expansion_mode()
+    base = _truncate(_strip_instruction(description))
+    if mode == "off":
+        return [base]
+    if mode == "llm":
+        try:
+            return _dedup_queries([base] + _llm_variants(description, original_query))
+        except Exception as e:
+            logging.warning(f"Expansão de consultas por LLM falhou ({e}); usando palavras-chave locais.")
+    return local_variants(description, original_query)
+
+
+def _is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in _TRACKING_PARAMS or key.startswith(_TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """Chave de deduplicação: sem www, fragmento, barra final e parâmetros de rastreamento."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not _is_tracking_param(key)
+    ])
+    return urlunsplit((parts.scheme.lower() or "https", host, parts.path.rstrip("/"), query, ""))
+
+
+def fuse_results(result_lists: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion: soma 1/(k + posição) de cada URL nas listas, sem duplicatas."""
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        seen_in_list = set()
+        for rank, item in enumerate(results, start=1):
+            if not item.get("url"):
+                continue
+            key = normalize_url(item["url"])
+            if key in seen_in_list:
+                continue
+            seen_in_list.add(key)
+            entry = fused.setdefault(key, {**item, "rrf_score": 0.0, "matched_queries": 0})
+            entry["rrf_score"] += 1 / (k + rank)
+            entry["matched_queries"] += 1
+            if not entry.get("description") and item.get("description"):
+                entry["description"] = item["description"]
+    return sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)
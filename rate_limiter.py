@@ -0,0 +1,261 @@
+"""
+Limitador de taxa compartilhado pelo processo, por provedor e por modelo/endpoint.
+
+Cada chave (provedor, modelo) ou ("firecrawl", endpoint) tem um token bucket
+(requisições por segundo) e um limite de concorrência ajustado no estilo AIMD:
+sobe aos poucos enquanto as chamadas vão bem e cai pela metade a cada 429.
+Latência alta só segura a subida: chamadas de um mesmo modelo variam muito de
+tamanho (planner x síntese), então ela não serve de sinal para cortar.
+Serve tanto para threads quanto para asyncio.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+
+import deadline
+
+# Limites iniciais por provedor: rps do bucket e concorrência (inicial/máxima)
+PROVIDER_LIMITS: Dict[str, Dict[str, float]] = {
+    "openai": {"rate": 8.0, "burst": 8, "concurrency": 8, "max_concurrency": 32},
+    "google": {"rate": 4.0, "burst": 4, "concurrency": 4, "max_concurrency": 16},
+    # burst/concorrência 3: as variantes de consulta de um pesquisador saem juntas (ver query_expansion.py)
+    "firecrawl": {"rate": 2.0, "burst": 3, "concurrency": 3, "max_concurrency": 8},
+}
+DEFAULT_LIMITS = {"rate": 2.0, "burst": 2, "concurrency": 2, "max_concurrency": 8}
+
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+# Latência acima de LATENCY_TOLERANCE x a latência típica (média móvel exponencial) não aumenta o limite
+LATENCY_TOLERANCE = 3.0
+LATENCY_EWMA_ALPHA = 0.1
+_POLL_SECONDS = 0.05
+
+
+class RateLimitError(Exception):
+    """O provedor continuou respondendo 429 após todas as tentativas."""
+
+
+_RATE_LIMIT_TYPES = ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """
+    Identifica respostas 429 / quota esgotada dos SDKs da OpenAI, Google e Firecrawl
+    pelo status HTTP ou pelo tipo da exceção (também nas exceções encadeadas), nunca pelo texto.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+        # google.api_core guarda o status HTTP em .code
+        code = getattr(exc, "code", None)
+        if status == 429 or (isinstance(code, int) and code == 429):
+            return True
+        if type(exc).__name__ in _RATE_LIMIT_TYPES:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class AdaptiveLimiter:
+    """Token bucket + limite de concorrência AIMD para uma chave de provedor."""
+
+    def __init__(self, name: str, rate: float, burst: float, concurrency: float, max_concurrency: float):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.limit = float(concurrency)
+        self.max_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self.typical_latency: float | None = None
+        self._blocked_until = 0.0
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _try_acquire(self) -> float:
+        """Reserva token e vaga de concorrência; devolve 0 ou quantos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self.in_flight >= int(self.limit):
+                return _POLL_SECONDS
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self) -> None:
+        # A espera é interrompida se a execução for cancelada ou o prazo vencer
+        while (wait := self._try_acquire()) > 0:
+            deadline.sleep(wait)
+
+    async def aacquire(self) -> None:
+        while (wait := self._try_acquire()) > 0:
+            # Como acquire: a espera termina se a execução for cancelada ou o prazo vencer
+            deadline.check()
+            await asyncio.sleep(wait if deadline.current_scope() is None else min(wait, _POLL_SECONDS))
+
+    def release(self, latency: float | None = None, throttled: bool = False, retry_after: float | None = None) -> None:
+        """Libera a vaga e ajusta os limites com base no resultado da chamada."""
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                # Multiplicative decrease: corta concorrência e taxa e pausa a chave
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+                self.rate = max(self.max_rate / 16, self.rate / 2)
+                pause = retry_after if retry_after is not None else BACKOFF_BASE_SECONDS
+                self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+                logging.warning(f"Limite atingido em {self.name}: concorrência={self.limit:.1f} taxa={self.rate:.2f}/s")
+                return
+            if latency is None:
+                return
+            slow = self.typical_latency is not None and latency > self.typical_latency * LATENCY_TOLERANCE
+            if self.typical_latency is None:
+                self.typical_latency = latency
+            else:
+                self.typical_latency += LATENCY_EWMA_ALPHA * (latency - self.typical_latency)
+            if not slow:
+                # Additive increase: cerca de +1 a cada `limit` chamadas bem-sucedidas
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+            }
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(provider: str, key: str) -> AdaptiveLimiter:
+    """Retorna o limitador do processo para (provedor, modelo/endpoint)."""
+    with _registry_lock:
+        limiter = _limiters.get((provider, key))
+        if limiter is None:
+            limits = PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS)
+            limiter = AdaptiveLimiter(f"{provider}:{key}", **limits)
+            _limiters[(provider, key)] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {f"{provider}:{key}": limiter.stats() for (provider, key), limiter in limiters.items()}
+
+
+def _retry_after(exc: BaseException, attempt: int) -> float:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return BACKOFF_BASE_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+def _attempt(limiter: AdaptiveLimiter, attempt: int, claim: threading.Lock, fn: Callable, args, kwargs) -> Any:
+    """Roda fn na vaga reservada e só a libera quando fn termina, mesmo que o chamador já tenha desistido."""
+    if not claim.acquire(blocking=False):
+        # O chamador desistiu antes de a chamada começar e já devolveu a vaga
+        return None
+    start = time.monotonic()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if is_rate_limit_error(e):
+            limiter.release(throttled=True, retry_after=_retry_after(e, attempt))
+        else:
+            limiter.release()
+        raise
+    except BaseException:
+        limiter.release()
+        raise
+    limiter.release(latency=time.monotonic() - start)
+    return result
+
+
+async def _aattempt(limiter: AdaptiveLimiter, attempt: int, claim: threading.Lock, fn: Callable, args, kwargs) -> Any:
+    if not claim.acquire(blocking=False):
+        return None
+    start = time.monotonic()
+    try:
+        result = await fn(*args, **kwargs)
+    except Exception as e:
+        if is_rate_limit_error(e):
+            limiter.release(throttled=True, retry_after=_retry_after(e, attempt))
+        else:
+            limiter.release()
+        raise
+    except BaseException:
+        # Inclui asyncio.CancelledError
+        limiter.release()
+        raise
+    limiter.release(latency=time.monotonic() - start)
+    return result
+
+
+def _abandon(limiter: AdaptiveLimiter, claim: threading.Lock) -> None:
+    # Se a chamada não chegou a começar, a vaga volta agora; senão _attempt a devolve quando ela terminar
+    if claim.acquire(blocking=False):
+        limiter.release()
+
+
+def call_with_limits(provider: str, key: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Executa fn respeitando o limitador da chave, com novas tentativas em caso de 429.
+    A chamada respeita o prazo e o cancelamento da execução atual (ver deadline.py); uma
+    chamada abandonada continua ocupando a vaga até terminar de fato.
+    """
+    limiter = get_limiter(provider, key)
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        claim = threading.Lock()
+        try:
+            return deadline.call(_attempt, limiter, attempt, claim, fn, args, kwargs)
+        except Exception as e:
+            _abandon(limiter, claim)
+            if not is_rate_limit_error(e):
+                raise
+            if attempt == MAX_RETRIES:
+                raise RateLimitError(f"{provider}:{key} continua limitado após {MAX_RETRIES} tentativas: {e}") from e
+        except BaseException:
+            _abandon(limiter, claim)
+            raise
+
+
+async def acall_with_limits(provider: str, key: str, fn: Callable, *args, **kwargs) -> Any:
+    """Versão asyncio de call_with_limits; fn deve retornar um awaitable."""
+    limiter = get_limiter(provider, key)
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.aacquire()
+        claim = threading.Lock()
+        try:
+            return await deadline.acall(_aattempt, limiter, attempt, claim, fn, args, kwargs)
+        except Exception as e:
+            _abandon(limiter, claim)
+            if not is_rate_limit_error(e):
+                raise
+            if attempt == MAX_RETRIES:
+                raise RateLimitError(f"{provider}:{key} continua limitado após {MAX_RETRIES} tentativas: {e}") from e
+        except BaseException:
+            _abandon(limiter, claim)
+            raise
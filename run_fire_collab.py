@@ -1,4 +1,9 @@
+import json
+import os
+from contextlib import nullcontext
+
 from fire_collab import collaborative_workflow
+from memory import MEMORY_ENV, track_memory
 
 def main():
     # Estado inicial com a consulta do usuário
@@ -9,17 +14,21 @@ def main():
         "current_task_idx": 0,
         "final_response": None,
         "error": None,
-        "current_task_description": None,
-        "current_specialist_type": None,
-        "current_task_id": None,
+        "current_task": None,
         "specialist_result": None
     }
 
     # executa workflow
-    result = collaborative_workflow.invoke(initial_state)
+    with track_memory() if os.getenv(MEMORY_ENV) else nullcontext() as run_memory:
+        result = collaborative_workflow.invoke(initial_state)
 
     # Acessa a resposta final
     print(result["final_response"])
 
+    if run_memory is not None:
+        summary = {k: v for k, v in run_memory.items() if k != "steps"}
+        print("\n=== Memória por nó ===")
+        print(json.dumps(summary, indent=2))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
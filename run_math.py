@@ -12,9 +12,7 @@ def main():
         intermediate_results={},
         final_response=None,
         error=None,
-        current_task_description=None,
-        current_specialist_type=None,
-        current_task_id=None,
+        current_task=None,
         specialist_result=None
     )
     # Executa o workflow
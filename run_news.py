@@ -12,9 +12,7 @@ def main():
         intermediate_results={},
         final_response=None,
         error=None,
-        current_task_description=None,
-        current_specialist_type=None,
-        current_task_id=None,
+        current_task=None,
         specialist_result=None
     )
 
@@ -22,6 +20,8 @@ def main():
     result = news_workflow.invoke(state)
     print("\n=== Resposta Final ===")
     print(result.get("final_response", "Nenhuma resposta gerada."))
+    if result.get("triage_tier"):
+        print(f"\n(nível: {result['triage_tier']}, {result.get('tier_latency_s')}s)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Escrita seccionada de relatórios longos do fire_collab.
+
+A geração de tokens de saída domina a latência de um relatório escrito em uma
+única chamada. No modo seccionado:
+
+    1. outline      uma chamada curta divide o relatório em seções e indica os
+                    resultados de tarefas que cada seção usa
+    2. seções       cada seção é escrita em paralelo, só com os seus resultados
+    3. consistência uma chamada curta escreve introdução e conclusão a partir dos
+                    títulos e inícios das seções; o corpo é costurado sem reescrita.
+                    Se ela falhar, as seções já escritas seguem sem introdução/conclusão
+
+Modo por execução: config={"configurable": {"writing_mode": "single" | "sectioned" | "auto"}}
+ou a variável REPORT_WRITING_MODE (padrão auto: seccionado a partir de
+SECTIONED_MIN_RESULTS resultados).
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor, ensure_config
+
+import deadline
+from prompts import build_messages
+
+WRITING_MODE_ENV = "REPORT_WRITING_MODE"
+WRITING_MODES = ("single", "sectioned", "auto")
+SECTIONED_MIN_RESULTS = 2
+MAX_SECTIONS = 8
+MAX_SECTION_CONCURRENCY = 8
+# Caracteres de cada seção mostrados ao passo de consistência
+SECTION_PREVIEW_CHARS = 400
+
+
+def writing_mode() -> str:
+    mode = ensure_config().get("configurable", {}).get("writing_mode") or os.getenv(WRITING_MODE_ENV, "auto")
+    return mode if mode in WRITING_MODES else "auto"
+
+
+def use_sectioned(intermediate_results: Dict[str, Any] | None) -> bool:
+    mode = writing_mode()
+    if mode == "auto":
+        return len(intermediate_results or {}) >= SECTIONED_MIN_RESULTS
+    return mode == "sectioned"
+
+
+def _parse_json(text: str) -> Dict[str, Any]:
+    # Alguns modelos envolvem o JSON em ```json ... ```
+    cleaned = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    return json.loads(cleaned)
+
+
+def _outline(model, original_query: str, task: str, results: Dict[str, str]) -> List[Dict[str, Any]]:
+    response = model.invoke(build_messages(
+        "outline",
+        original_query=original_query,
+        task=f"Divida em no máximo {MAX_SECTIONS} seções o texto pedido a seguir: {task}",
+        intermediate_results=results,
+    ))
+    sections = _parse_json(response.content).get("sections", [])
+    valid = [
+        section for section in sections
+        if isinstance(section, dict) and section.get("title")
+    ][:MAX_SECTIONS]
+    if not valid:
+        raise ValueError("outline sem seções")
+    return valid
+
+
+def _write_section(model, original_query: str, section: Dict[str, Any], results: Dict[str, str]) -> str:
+    task_ids = [task_id for task_id in section.get("task_ids") or [] if task_id in results]
+    # Seção sem resultados indicados recebe todos, para não escrever às cegas
+    relevant = {task_id: results[task_id] for task_id in task_ids} or results
+    response = model.invoke(build_messages(
+        "section_writer",
+        original_query=original_query,
+        task=f"Escreva a seção \"{section['title']}\" do relatório. {section.get('instructions', '')}".strip(),
+        intermediate_results=relevant,
+    ))
+    return response.content
+
+
+def _consistency(model, original_query: str, sections: List[Dict[str, Any]], bodies: List[str]) -> Dict[str, str]:
+    previews = "\n\n".join(
+        f"### {section['title']}\n{body[:SECTION_PREVIEW_CHARS]}" for section, body in zip(sections, bodies)
+    )
+    response = model.invoke(build_messages(
+        "consistency",
+        original_query=original_query,
+        task="Escreva a introdução e a conclusão do relatório.",
+        call_context=f"## Seções do relatório\n{previews}",
+    ))
+    try:
+        parsed = _parse_json(response.content)
+    except ValueError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        logging.warning("Passo de consistência não retornou JSON; relatório segue sem introdução/conclusão.")
+        return {}
+    return {key: parsed.get(key, "") for key in ("introduction", "conclusion")}
+
+
+def write_sectioned(model, original_query: str, task: str, results: Dict[str, str]) -> str:
+    """Escreve o texto pedido em task por seções paralelas; levanta exceção se o outline falhar."""
+    sections = _outline(model, original_query, task, results)
+    # ContextThreadPoolExecutor mantém o contexto do nó (callbacks, contabilidade de tokens, prazo)
+    with ContextThreadPoolExecutor(max_workers=min(len(sections), MAX_SECTION_CONCURRENCY)) as executor:
+        bodies = list(executor.map(lambda section: _write_section(model, original_query, section, results), sections))
+
+    try:
+        framing = _consistency(model, original_query, sections, bodies)
+    except (deadline.DeadlineExceeded, deadline.RunCancelled):
+        raise
+    except Exception as e:
+        # As seções já estão escritas: não vale reescrever tudo em uma chamada
+        logging.warning(f"Passo de consistência falhou ({e}); relatório segue sem introdução/conclusão.")
+        framing = {}
+    parts = [framing["introduction"]] if framing.get("introduction") else []
+    parts += [f"## {section['title']}\n\n{body.strip()}" for section, body in zip(sections, bodies)]
+    if framing.get("conclusion"):
+        parts.append(f"## Conclusão\n\n{framing['conclusion']}")
+    return "\n\n".join(parts)
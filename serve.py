@@ -0,0 +1,375 @@
+"""
+Servidor HTTP (ASGI) para os grafos declarados em langgraph.json.
+
+Cada grafo tem uma fila limitada de execuções e um número fixo de workers.
+Quando a fila enche, novas execuções são recusadas com 429 (backpressure).
+
+Rotas:
+    POST /graphs/{graph}/runs       cria uma execução ({"input": {...}, "track_memory": false, "deadline_s": 120,
+                                    "admission": {"max_seconds": 90, "max_cost_usd": 0.5}})
+    GET  /runs/{run_id}             status e resultado
+    GET  /runs/{run_id}/stream      progresso e tokens via SSE
+    POST /runs/{run_id}/cancel      cancela a execução (inclusive as chamadas em andamento)
+    GET  /health                    status do serviço
+    GET  /metrics                   profundidade das filas e execuções em andamento
+
+Uso:
+    python serve.py  (ou uvicorn serve:app)
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, Dict, List
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from agent_state import json_default
+from deadline import RunScope, run_scope
+from memory import track_memory
+from news_dedup import dedup_report
+from news_triage import triage_report
+from usage import track_usage, usage_report
+
+LANGGRAPH_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "langgraph.json")
+
+MAX_QUEUE_SIZE = int(os.getenv("SERVE_MAX_QUEUE", "32"))
+WORKERS_PER_GRAPH = int(os.getenv("SERVE_WORKERS_PER_GRAPH", "4"))
+MAX_FINISHED_RUNS = int(os.getenv("SERVE_MAX_FINISHED_RUNS", "1000"))
+# Prazo padrão de uma execução em segundos, contado a partir da criação (0 = sem prazo)
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("SERVE_DEFAULT_DEADLINE_S", "0"))
+RETRY_AFTER_SECONDS = 5
+
+FINISHED_STATUSES = ("success", "error", "cancelled")
+
+
+def _load_graph_specs() -> Dict[str, str]:
+    with open(LANGGRAPH_CONFIG, encoding="utf-8") as f:
+        return json.load(f)["graphs"]
+
+
+def _to_jsonable(value: Any) -> Any:
+    return json.loads(json.dumps(value, default=json_default))
+
+
+class Run:
+    """Uma execução de grafo com seu histórico de eventos para o streaming."""
+
+    def __init__(self, graph_name: str, graph_input: Dict[str, Any], track_memory: bool = False,
+                 deadline_s: float | None = None, admission: Dict[str, float] | None = None):
+        self.run_id = str(uuid.uuid4())
+        self.graph_name = graph_name
+        self.input = graph_input
+        self.track_memory = track_memory
+        # Limites de tempo/custo estimados para aceitar o plano (ver plan_estimator.py)
+        self.admission = admission
+        self.status = "queued"
+        self.result: Dict[str, Any] | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        # O tempo na fila também conta para o prazo
+        self.deadline = self.created_at + deadline_s if deadline_s else None
+        self.scope: RunScope | None = None
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self.usage: Dict[str, Any] = {}
+        self.memory: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Condition()
+
+    async def emit(self, event: str, data: Any) -> None:
+        async with self._changed:
+            self.events.append({"event": event, "data": data})
+            self._changed.notify_all()
+
+    async def finish(self, status: str, result: Dict[str, Any] | None = None, error: str | None = None) -> None:
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        await self.emit("end", self.summary())
+
+    async def subscribe(self):
+        """Reproduz os eventos já emitidos e segue os novos até o fim da execução."""
+        idx = 0
+        while True:
+            async with self._changed:
+                while idx >= len(self.events) and self.status not in FINISHED_STATUSES:
+                    await self._changed.wait()
+                pending = self.events[idx:]
+            for item in pending:
+                yield item
+            idx += len(pending)
+            if self.status in FINISHED_STATUSES and idx >= len(self.events):
+                return
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "graph": self.graph_name,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "deadline": self.deadline,
+            "token_usage": self.usage,
+            "memory": {k: v for k, v in self.memory.items() if k != "steps"},
+        }
+
+
+class GraphRunner:
+    """Fila limitada e workers de um grafo."""
+
+    def __init__(self, name: str, spec: str, max_queue: int = MAX_QUEUE_SIZE, workers: int = WORKERS_PER_GRAPH):
+        self.name = name
+        self.spec = spec
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.num_workers = workers
+        self.in_flight = 0
+        self.counters = {"accepted": 0, "rejected": 0, "success": 0, "error": 0, "cancelled": 0}
+        self._graph = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            module_name, attr = self.spec.split(":")
+            self._graph = getattr(importlib.import_module(module_name), attr)
+        return self._graph
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    def submit(self, run: Run) -> bool:
+        """Enfileira a execução; retorna False quando a fila está cheia."""
+        try:
+            self.queue.put_nowait(run)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            return False
+        self.counters["accepted"] += 1
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            run = await self.queue.get()
+            try:
+                if run.status == "cancelled":
+                    continue
+                self.in_flight += 1
+                run.task = asyncio.create_task(self._execute(run))
+                try:
+                    await run.task
+                except asyncio.CancelledError:
+                    # Cancelamento da execução pelo cliente não derruba o worker
+                    if not run.task.cancelled():
+                        run.task.cancel()
+                        raise
+                finally:
+                    self.in_flight -= 1
+            finally:
+                self.queue.task_done()
+
+    async def _execute(self, run: Run) -> None:
+        run.status = "running"
+        run.started_at = time.time()
+        await run.emit("start", {"run_id": run.run_id, "graph": run.graph_name})
+        try:
+            # Os contextvars seguem para as threads dos nós: uso de tokens e memória desta execução
+            # O escopo de prazo/cancelamento também segue para as threads dos nós
+            memory_scope = track_memory() if run.track_memory else nullcontext({})
+            with track_usage() as run.usage, memory_scope as run.memory, run_scope(deadline=run.deadline) as run.scope:
+                state = await self._stream(run)
+        except asyncio.CancelledError:
+            # Interrompe as chamadas bloqueantes que ainda estão nas threads dos nós
+            if run.scope is not None:
+                run.scope.cancel()
+            self.counters["cancelled"] += 1
+            await run.finish("cancelled")
+            raise
+        except Exception as e:
+            logging.error(f"Erro na execução {run.run_id} do grafo {run.graph_name}: {e}")
+            self.counters["error"] += 1
+            await run.finish("error", error=str(e))
+        else:
+            self.counters["success"] += 1
+            await run.finish("success", result=_to_jsonable(state))
+
+    async def _stream(self, run: Run) -> Dict[str, Any]:
+        state: Dict[str, Any] = dict(run.input)
+        async for mode, chunk in self.graph.astream(
+            run.input,
+            config={"configurable": {"run_id": run.run_id, "admission": run.admission}},
+            stream_mode=["values", "updates", "messages"],
+        ):
+            if mode == "values":
+                state = chunk
+            elif mode == "updates":
+                for node, update in chunk.items():
+                    await run.emit("progress", {"node": node, "update": _to_jsonable(update)})
+            elif mode == "messages":
+                message, metadata = chunk
+                if message.content:
+                    await run.emit("token", {"node": metadata.get("langgraph_node"), "content": message.content})
+        return state
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "in_flight": self.in_flight,
+            "workers": self.num_workers,
+            **self.counters,
+        }
+
+
+runners: Dict[str, GraphRunner] = {}
+runs: "OrderedDict[str, Run]" = OrderedDict()
+
+
+def _remember(run: Run) -> None:
+    runs[run.run_id] = run
+    # Descarta as execuções finalizadas mais antigas; as em andamento não contam nem bloqueiam
+    finished = [run_id for run_id, item in runs.items() if item.status in FINISHED_STATUSES]
+    for run_id in finished[:max(0, len(finished) - MAX_FINISHED_RUNS)]:
+        runs.pop(run_id)
+
+
+async def create_run(request: Request) -> JSONResponse:
+    graph_name = request.path_params["graph"]
+    runner = runners.get(graph_name)
+    if runner is None:
+        return JSONResponse({"error": f"Grafo desconhecido: {graph_name}"}, status_code=404)
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse({"error": "Corpo da requisição não é um JSON válido"}, status_code=400)
+    graph_input = body.get("input") if isinstance(body, dict) else None
+    if not isinstance(graph_input, dict):
+        return JSONResponse({"error": "Campo 'input' ausente ou inválido"}, status_code=400)
+
+    deadline_s = body.get("deadline_s", DEFAULT_DEADLINE_SECONDS)
+    # bool é subclasse de int: "deadline_s": true não pode virar 1 segundo
+    if deadline_s is not None and (
+        isinstance(deadline_s, bool) or not isinstance(deadline_s, (int, float)) or deadline_s < 0
+    ):
+        return JSONResponse({"error": "Campo 'deadline_s' inválido"}, status_code=400)
+
+    admission = body.get("admission")
+    if admission is not None and (
+        not isinstance(admission, dict)
+        or not all(isinstance(admission.get(key, 0), (int, float)) for key in ("max_seconds", "max_cost_usd"))
+    ):
+        return JSONResponse({"error": "Campo 'admission' inválido"}, status_code=400)
+
+    run = Run(graph_name, graph_input, track_memory=bool(body.get("track_memory")), deadline_s=deadline_s,
+              admission=admission)
+    if not runner.submit(run):
+        return JSONResponse(
+            {"error": "Fila cheia, tente novamente mais tarde", "queue_depth": runner.queue.qsize()},
+            status_code=429,
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    _remember(run)
+    return JSONResponse({"run_id": run.run_id, "status": run.status}, status_code=202)
+
+
+async def get_run(request: Request) -> JSONResponse:
+    run = runs.get(request.path_params["run_id"])
+    if run is None:
+        return JSONResponse({"error": "Execução não encontrada"}, status_code=404)
+    return JSONResponse(run.summary())
+
+
+async def stream_run(request: Request) -> StreamingResponse | JSONResponse:
+    run = runs.get(request.path_params["run_id"])
+    if run is None:
+        return JSONResponse({"error": "Execução não encontrada"}, status_code=404)
+
+    async def event_source():
+        async for item in run.subscribe():
+            yield f"event: {item['event']}\ndata: {json.dumps(item['data'], default=str)}\n\n"
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def cancel_run(request: Request) -> JSONResponse:
+    run = runs.get(request.path_params["run_id"])
+    if run is None:
+        return JSONResponse({"error": "Execução não encontrada"}, status_code=404)
+    if run.status == "queued":
+        runners[run.graph_name].counters["cancelled"] += 1
+        await run.finish("cancelled")
+    elif run.status == "running" and run.task is not None:
+        if run.scope is not None:
+            run.scope.cancel()
+        run.task.cancel()
+    return JSONResponse({"run_id": run.run_id, "status": run.status})
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "status": "ok",
+        "graphs": {
+            name: {"queue_depth": runner.queue.qsize(), "in_flight": runner.in_flight}
+            for name, runner in runners.items()
+        },
+    })
+
+
+async def metrics(request: Request) -> JSONResponse:
+    return JSONResponse({
+        "graphs": {name: runner.metrics() for name, runner in runners.items()},
+        "runs_tracked": len(runs),
+        "token_usage": usage_report(),
+        "news_dedup": dedup_report(),
+        "news_triage": triage_report(),
+    })
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    for name, spec in _load_graph_specs().items():
+        runners[name] = GraphRunner(name, spec)
+        runners[name].start()
+    yield
+    for runner in runners.values():
+        await runner.stop()
+    runners.clear()
+
+
+app = Starlette(
+    routes=[
+        Route("/graphs/{graph}/runs", create_run, methods=["POST"]),
+        Route("/runs/{run_id}", get_run, methods=["GET"]),
+        Route("/runs/{run_id}/stream", stream_run, methods=["GET"]),
+        Route("/runs/{run_id}/cancel", cancel_run, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=os.getenv("SERVE_HOST", "0.0.0.0"), port=int(os.getenv("SERVE_PORT", "8000")))
@@ -0,0 +1,130 @@
+"""
+Coalescência de chamadas idênticas em andamento (single-flight).
+
+Enquanto uma chamada com a mesma chave estiver em execução, os demais
+chamadores esperam por ela e recebem o mesmo resultado (ou a mesma exceção),
+em vez de repetir a requisição ao LLM ou ao Firecrawl.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import deadline
+
+
+def make_key(*parts: Any) -> str:
+    """Gera uma chave estável (como a de um cache) a partir das partes da chamada."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=_key_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _key_default(value: Any) -> Any:
+    # Mensagens do langchain: o tipo e o conteúdo definem a requisição
+    if hasattr(value, "type") and hasattr(value, "content"):
+        return {"type": value.type, "content": value.content}
+    return repr(value)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes com a mesma chave, em threads e em asyncio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], _AsyncCall] = {}
+        self.stats = {"executed": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Executa fn uma única vez por chave entre as threads concorrentes."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    self.stats["shared"] += 1
+                    leader = False
+                else:
+                    call = self._calls[key] = _Call()
+                    self.stats["executed"] += 1
+                    leader = True
+
+            if leader:
+                break
+            # O seguidor também respeita o prazo/cancelamento da própria execução
+            deadline.wait_event(call.done)
+            if isinstance(call.error, (deadline.RunCancelled, deadline.DeadlineExceeded)):
+                # O líder desistiu por causa da execução dele: tenta de novo
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Versão asyncio de do. A chamada compartilhada roda em uma task própria:
+        um chamador cancelado deixa de esperar sem afetar os outros, e a task só
+        é cancelada quando todos os chamadores desistem.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            call = self._async_calls.get(loop_key)
+            if call is None:
+                call = self._async_calls[loop_key] = _AsyncCall(asyncio.ensure_future(fn()))
+                call.task.add_done_callback(lambda _: self._forget(loop_key, call))
+                self.stats["executed"] += 1
+            else:
+                self.stats["shared"] += 1
+            call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0 and not call.task.done()
+                if abandoned and self._async_calls.get(loop_key) is call:
+                    # Novos chamadores passam a iniciar uma chamada nova
+                    del self._async_calls[loop_key]
+            if abandoned:
+                call.task.cancel()
+            raise
+
+    def _forget(self, loop_key: Tuple[int, str], call: _AsyncCall) -> None:
+        with self._lock:
+            if self._async_calls.get(loop_key) is call:
+                del self._async_calls[loop_key]
+        # Evita o aviso de "exception was never retrieved" quando todos desistiram
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+
+flight = SingleFlight()
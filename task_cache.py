@@ -0,0 +1,103 @@
+"""
+Memoização das tarefas do plano do fire_collab entre execuções.
+
+A chave de uma tarefa combina o tipo de especialista, a descrição normalizada,
+o hash dos resultados intermediários que ela consome, a consulta original
+normalizada, o modelo, o modo de expansão de consultas e a versão dos prompts.
+Reexecutar um relatório reaproveita as tarefas cujas entradas não mudaram e só
+executa as demais; a mesma descrição genérica sob outra consulta não reaproveita.
+
+Os resultados ficam em TASK_CACHE_DIR/<2 primeiros hex>/<chave>.json; textos
+longos continuam no blob_store e a entrada guarda apenas a referência.
+TASK_CACHE=0 desativa o cache; por execução use
+config={"configurable": {"task_cache": False}}.
+"""
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from langchain_core.runnables.config import ensure_config
+
+import blob_store
+from single_flight import make_key
+
+TASK_CACHE_ENV = "TASK_CACHE"
+TASK_CACHE_DIR = os.getenv("TASK_CACHE_DIR", ".task_cache")
+# Pesquisas envelhecem: entradas mais antigas que isso são ignoradas
+TASK_CACHE_TTL_SECONDS = float(os.getenv("TASK_CACHE_TTL_S", str(3 * 24 * 3600)))
+
+
+def cache_enabled() -> bool:
+    """O configurable "task_cache" da execução tem precedência sobre TASK_CACHE."""
+    configured = ensure_config().get("configurable", {}).get("task_cache")
+    if configured is not None:
+        return bool(configured)
+    return os.getenv(TASK_CACHE_ENV, "1") not in ("", "0", "false", "off")
+
+
+def normalize_description(description: str) -> str:
+    return " ".join((description or "").lower().split())
+
+
+def task_key(specialist_type: str, description: str, consumed_results: Dict[str, Any] | None, *extra: Any) -> str:
+    """Chave da tarefa; os resultados consumidos entram pelo hash (refs do blob_store já são hashes)."""
+    results_hash = make_key(consumed_results or {})
+    return make_key("task", specialist_type, normalize_description(description), results_hash, *extra)
+
+
+def _path(key: str) -> str:
+    return os.path.join(TASK_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def get(key: str) -> Any | None:
+    """Resultado memoizado da tarefa, ou None se ausente, expirado ou com blob removido."""
+    try:
+        with open(_path(key), encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if TASK_CACHE_TTL_SECONDS and time.time() - entry.get("created_at", 0) > TASK_CACHE_TTL_SECONDS:
+        return None
+    result = entry.get("result")
+    if blob_store.is_ref(result) and not blob_store.exists(result):
+        return None
+    return result
+
+
+def put(key: str, result: Any, **metadata: Any) -> None:
+    """Grava o resultado da tarefa (escrita atômica)."""
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"result": result, "created_at": time.time(), **metadata}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def prune(older_than_seconds: float | None = None) -> int:
+    """Remove entradas mais antigas que older_than_seconds (padrão: o TTL); devolve quantas saíram."""
+    limit = TASK_CACHE_TTL_SECONDS if older_than_seconds is None else older_than_seconds
+    cutoff = time.time() - limit
+    removed = 0
+    if not os.path.isdir(TASK_CACHE_DIR):
+        return 0
+    for root, _, files in os.walk(TASK_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
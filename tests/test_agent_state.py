@@ -0,0 +1,40 @@
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, StateGraph
+
+import pytest
+
+from agent_state import TaskLoopState, TaskSpec
+
+
+def _graph(checkpointer):
+    def planner(state):
+        return {
+            "plan": [TaskSpec("t1", "researcher", "pesquisar", "high"), TaskSpec("t2", "writer", "escrever")],
+            "current_task": TaskSpec("t1", "researcher", "pesquisar", "high"),
+        }
+
+    builder = StateGraph(TaskLoopState)
+    builder.add_node("planner", planner)
+    builder.set_entry_point("planner")
+    builder.add_edge("planner", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _assert_round_trip(checkpointer):
+    config = {"configurable": {"thread_id": "t"}}
+    _graph(checkpointer).invoke({"current_task_idx": 0}, config)
+    # Grafo novo sobre o mesmo checkpointer: o estado vem só do que foi serializado
+    state = _graph(checkpointer).get_state(config).values
+    assert state["current_task"] == TaskSpec("t1", "researcher", "pesquisar", "high")
+    assert all(isinstance(task, TaskSpec) for task in state["plan"])
+    assert state["plan"][1].priority == "medium"
+
+
+def test_task_spec_round_trips_through_memory_saver():
+    _assert_round_trip(MemorySaver())
+
+
+def test_task_spec_round_trips_through_sqlite_saver():
+    sqlite = pytest.importorskip("langgraph.checkpoint.sqlite")
+    with sqlite.SqliteSaver.from_conn_string(":memory:") as checkpointer:
+        _assert_round_trip(checkpointer)
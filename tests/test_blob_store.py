@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import blob_store
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path))
+    blob_store._read.cache_clear()
+    yield tmp_path
+    blob_store._read.cache_clear()
+
+
+def test_resolve_after_prune_returns_error_text():
+    ref = blob_store.put("x" * 5000)
+    assert blob_store.resolve(ref) == "x" * 5000
+    assert blob_store.prune(-1) == 1
+    assert blob_store.resolve(ref).startswith("Erro")
+
+
+def test_failed_write_leaves_no_temporary_file(blob_dir, monkeypatch):
+    def fail(src, dst):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(blob_store.os, "replace", fail)
+    with pytest.raises(OSError):
+        blob_store.put("y" * 5000)
+    assert [name for _, _, files in os.walk(blob_dir) for name in files] == []
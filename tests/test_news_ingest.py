@@ -0,0 +1,39 @@
+import os
+import time
+
+from news_ingest import DirectorySource
+
+
+def _write(path, text, age_seconds=0.0):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    if age_seconds:
+        old = time.time() - age_seconds
+        os.utime(path, (old, old))
+
+
+def test_file_moved_in_with_old_mtime_is_not_skipped(tmp_path):
+    inbox, staging = tmp_path / "inbox", tmp_path / "staging"
+    inbox.mkdir()
+    staging.mkdir()
+    source = DirectorySource(str(inbox), settle_seconds=0)
+
+    _write(inbox / "a.txt", "primeira notícia")
+    pending = source._pending(None)
+    assert [name for _, name in pending] == ["a.txt"]
+    watermark = list(pending[-1])
+
+    # mv de uma pasta de preparação preserva o mtime antigo (como cp -p e rsync -a)
+    _write(staging / "b.txt", "notícia preparada antes", age_seconds=3600)
+    os.replace(staging / "b.txt", inbox / "b.txt")
+
+    assert [name for _, name in source._pending(watermark)] == ["b.txt"]
+
+
+def test_file_still_being_written_waits_for_settle(tmp_path):
+    source = DirectorySource(str(tmp_path), settle_seconds=60)
+    _write(tmp_path / "a.txt", "parte 1")
+    _write(tmp_path / ".tmp.txt", "oculto")
+
+    assert source._pending(None) == []
+    assert source.lag(None) == {"lag_files": 1}
@@ -0,0 +1,28 @@
+from news_triage import classify
+
+NOTICE = (
+    "Aviso: a rua central ficará fechada amanhã pela manhã para obras de manutenção na rede de água. "
+    "O trânsito será desviado pela avenida lateral e o comércio funciona normalmente durante o dia."
+)
+ROUTINE = (
+    "O time da casa venceu o clássico de domingo com dois gols no segundo tempo e a torcida lotou "
+    "o estádio para comemorar a vitória. "
+) * 40
+POLICY = (
+    "O governo e o presidente enviaram ao congresso o projeto de reforma do imposto, e o senado discute "
+    "a decisão do ministro sobre o orçamento e os juros. A oposição denuncia corrupção e pede investigação "
+    "no tribunal, enquanto o mercado reage à crise e à inflação. "
+) * 2
+
+
+def test_short_notice_is_deterministic():
+    assert classify(NOTICE)["tier"] == "deterministic"
+
+
+def test_long_routine_article_stays_fast():
+    # Só o tamanho não deve levar ao modelo completo
+    assert classify(ROUTINE)["tier"] == "fast"
+
+
+def test_policy_heavy_article_goes_full():
+    assert classify(POLICY)["tier"] == "full"
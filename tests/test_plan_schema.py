@@ -0,0 +1,29 @@
+import logging
+
+import pytest
+
+from plan_schema import parse_plan
+
+
+def test_raw_newlines_inside_descriptions_are_accepted():
+    text = '{"plan": [{"task_id": "t1", "specialist_type": "researcher", "description": "linha 1\nlinha 2\tfim", "priority": "high"}]}'
+    plan = parse_plan(text)
+    assert plan[0]["description"] == "linha 1\nlinha 2\tfim"
+
+
+def test_invalid_task_is_dropped_with_warning(caplog):
+    text = """{"plan": [
+        {"task_id": "t1", "specialist_type": "researcher", "description": "pesquisar", "priority": "high"},
+        {"task_id": "t2", "specialist_type": "designer", "description": "desenhar", "priority": "low"},
+        {"task_id": "t3", "specialist_type": "writer", "description": "escrever", "priority": "medium"}
+    ]}"""
+    with caplog.at_level(logging.WARNING):
+        plan = parse_plan(text)
+    assert [task["task_id"] for task in plan] == ["t1", "t3"]
+    assert "t2" in caplog.text
+
+
+def test_plan_without_valid_tasks_fails():
+    text = '{"plan": [{"task_id": "t1", "specialist_type": "designer", "description": "desenhar"}]}'
+    with pytest.raises(ValueError, match="plano inválido"):
+        parse_plan(text)
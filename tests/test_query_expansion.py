@@ -0,0 +1,16 @@
+from query_expansion import normalize_url
+
+
+def test_tracking_params_are_removed():
+    url = "https://www.example.com/a/?utm_source=x&UTM_Medium=y&gclid=1&fbclid=2&ref=home&id=7"
+    assert normalize_url(url) == "https://example.com/a?id=7"
+
+
+def test_params_that_only_start_like_ref_are_kept():
+    url = "https://example.com/doc?reference=abc&refid=9&refresh=1"
+    assert normalize_url(url) == url
+
+
+def test_gclid_and_fbclid_match_exactly():
+    url = "https://example.com/?gclid_extra=1&fbclidx=2"
+    assert normalize_url(url) == "https://example.com?gclid_extra=1&fbclidx=2"
@@ -0,0 +1,87 @@
+"""
+Contabilidade de tokens por nó, incluindo os tokens de entrada servidos
+pelo cache de prompt do provedor (usage_metadata.input_token_details.cache_read).
+
+Uma resposta compartilhada pelo single-flight conta para cada execução que a
+recebeu (track_usage e orçamento), marcada em shared_calls; nos totais do processo
+os tokens entram uma vez só, pois o provedor cobrou uma chamada.
+
+Os totais do processo ficam em usage_report(); para uma execução específica use:
+
+    with track_usage() as run_usage:
+        collaborative_workflow.invoke(state)
+    print(run_usage)
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict
+
+from langchain_core.runnables.config import ensure_config
+
+_FIELDS = ("calls", "shared_calls", "input_tokens", "cached_input_tokens", "output_tokens")
+
+_lock = threading.Lock()
+_process_usage: Dict[str, Dict[str, int]] = {}
+# Pilha de acumuladores ativos: blocos track_usage() podem ser aninhados
+_run_usage: ContextVar[tuple] = ContextVar("run_usage", default=())
+
+
+def current_node() -> str:
+    """Nome do nó do LangGraph em execução (ou 'unknown' fora de um grafo)."""
+    return ensure_config().get("metadata", {}).get("langgraph_node", "unknown")
+
+
+def _add(target: Dict[str, Dict[str, int]], node: str, values: Dict[str, int]) -> None:
+    entry = target.setdefault(node, dict.fromkeys(_FIELDS, 0))
+    for field, value in values.items():
+        entry[field] += value
+
+
+def record_usage(response: Any, node: str | None = None, shared: bool = False) -> Dict[str, int]:
+    """Registra o uso de tokens informado pelo provedor para o nó atual (shared: resposta de outro chamador)."""
+    metadata = getattr(response, "usage_metadata", None) or {}
+    details = metadata.get("input_token_details") or {}
+    values = {
+        "calls": 1,
+        "shared_calls": int(shared),
+        "input_tokens": metadata.get("input_tokens", 0) or 0,
+        "cached_input_tokens": details.get("cache_read", 0) or 0,
+        "output_tokens": metadata.get("output_tokens", 0) or 0,
+    }
+    node = node or current_node()
+    with _lock:
+        _add(_process_usage, node, {"shared_calls": 1} if shared else values)
+        for run_usage in _run_usage.get():
+            _add(run_usage, node, values)
+    return values
+
+
+def _with_ratio(usage: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, Any]]:
+    report = {}
+    for node, entry in usage.items():
+        ratio = entry["cached_input_tokens"] / entry["input_tokens"] if entry["input_tokens"] else 0.0
+        report[node] = {**entry, "cache_hit_ratio": round(ratio, 3)}
+    return report
+
+
+def usage_report() -> Dict[str, Dict[str, Any]]:
+    """Totais do processo por nó, com a fração de tokens de entrada vinda do cache."""
+    with _lock:
+        return _with_ratio({node: dict(entry) for node, entry in _process_usage.items()})
+
+
+@contextmanager
+def track_usage():
+    """Acumula o uso de tokens por nó das chamadas feitas dentro do bloco."""
+    run_usage: Dict[str, Dict[str, int]] = {}
+    token = _run_usage.set(_run_usage.get() + (run_usage,))
+    try:
+        yield run_usage
+    finally:
+        _run_usage.reset(token)
+
+
+def total_tokens(usage: Dict[str, Dict[str, int]]) -> int:
+    """Soma de tokens de entrada e saída de um acumulador de track_usage()."""
+    return sum(entry["input_tokens"] + entry["output_tokens"] for entry in usage.values())